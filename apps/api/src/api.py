@@ -1,4 +1,8 @@
+import asyncio
+import importlib
 import os
+import sys
+import types
 
 
 os.environ['ENABLED_EXTENSIONS'] = ','.join(
@@ -10,4 +14,98 @@ os.environ['ENABLED_EXTENSIONS'] = ','.join(
     ]
 )
 
-from stac_fastapi.pgstac.app import handler  # noqa: F401, E402
+# Each Lambda execution environment handles one request at a time, so one connection per pool is enough. Larger pools
+# would hold idle connections open against the database's connection limit for every instance as the API scales out.
+os.environ.setdefault('DB_MIN_CONN_SIZE', '1')
+os.environ.setdefault('DB_MAX_CONN_SIZE', '1')
+
+
+def defer_import(module_name: str, function_name: str) -> None:
+    """Replace a module with a placeholder whose function imports the real module on first call.
+
+    Importing pygeofilter's CQL2 text parser builds its grammar and imports dateparser, which accounts for a large
+    share of the cold start time, but the parser is only used by the Filter extension, which we do not enable.
+    """
+    placeholder = types.ModuleType(module_name)
+
+    def deferred_function(*args, **kwargs):
+        if sys.modules.get(module_name) is placeholder:
+            del sys.modules[module_name]
+        return getattr(importlib.import_module(module_name), function_name)(*args, **kwargs)
+
+    setattr(placeholder, function_name, deferred_function)
+    sys.modules[module_name] = placeholder
+
+
+defer_import('pygeofilter.parsers.cql2_text', 'parse')
+
+import asyncpg  # noqa: E402
+from mangum import Mangum  # noqa: E402
+from stac_fastapi.pgstac.app import app  # noqa: E402
+from stac_fastapi.pgstac.db import con_init, get_connection  # noqa: E402
+
+import coherence_series  # noqa: E402
+from response_cache import ResponseCache, ResponseCacheMiddleware  # noqa: E402
+from tile_search import TileSearchMiddleware  # noqa: E402
+
+
+# Changes whenever a row of the collections table is created or updated. The load helpers in asf_stac_util.pgstac
+# update the rows of the collections they load items into or delete items from; items changed by any other means are
+# only seen once the cached responses expire.
+DATABASE_VERSION_QUERY = 'SELECT max(xmin::text::bigint)::text FROM collections'
+
+
+async def create_pool(connection_string: str) -> asyncpg.Pool:
+    """Create a connection pool as stac-fastapi does, but without the session state that pins RDS Proxy connections.
+
+    asyncpg's statement cache creates a named prepared statement for each query, and stac-fastapi sends search_path as
+    a startup parameter, either of which pins each client connection to its own database connection when connecting
+    through an RDS Proxy. Without the cache, asyncpg uses unnamed prepared statements, and search_path is set for the
+    whole database by configure-database-roles.sql instead.
+    """
+    settings = app.state.settings
+    return await asyncpg.create_pool(
+        connection_string,
+        min_size=settings.db_min_conn_size,
+        max_size=settings.db_max_conn_size,
+        max_queries=settings.db_max_queries,
+        max_inactive_connection_lifetime=settings.db_max_inactive_conn_lifetime,
+        init=con_init,
+        statement_cache_size=0,
+    )
+
+
+async def connect_to_db() -> None:
+    app.state.readpool = await create_pool(app.state.settings.reader_connection_string)
+    # The API does not enable the Transaction extension, so it never writes, and a separate write pool would only hold a
+    # second idle connection open for every Lambda instance
+    app.state.writepool = app.state.readpool
+    app.state.get_connection = get_connection
+
+
+async def get_database_version() -> str:
+    async with app.state.readpool.acquire() as connection:
+        return await connection.fetchval(DATABASE_VERSION_QUERY)
+
+
+app.include_router(coherence_series.router)
+
+# By default, Mangum runs the app's startup and shutdown events for every invocation, which opens and closes the
+# database connection pools for every request. Instead, open them once during the Lambda init phase and reuse them
+# for every invocation handled by this execution environment.
+asyncio.get_event_loop().run_until_complete(connect_to_db())
+
+response_cache = ResponseCache(
+    max_entries=int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 1000)),
+    ttl=float(os.environ.get('RESPONSE_CACHE_TTL', 300)),
+)
+# Searches are rewritten as tile lookups inside the cache, so that responses are cached by the client's original request
+cached_app = ResponseCacheMiddleware(
+    TileSearchMiddleware(app),
+    response_cache,
+    max_age=int(os.environ.get('RESPONSE_CACHE_MAX_AGE', 60)),
+    get_version=get_database_version,
+    version_check_interval=float(os.environ.get('RESPONSE_CACHE_VERSION_CHECK_INTERVAL', 60)),
+)
+
+handler = Mangum(cached_app, lifespan='off')
@@ -0,0 +1,103 @@
+"""An API route that returns the full seasonal series of coherence items for one tile in a single, grouped response.
+
+Clients would otherwise page through /search and regroup the items themselves. The items are fetched with one pgstac
+search on the `tile` property, which is indexed as a queryable of the collection.
+"""
+
+import json
+import math
+import re
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Request
+
+from asf_stac_util import tiles
+
+
+COLLECTION_ID = 'sentinel-1-global-coherence'
+
+TILE_PATTERN = re.compile(r'^[NS][0-9]{2}[EW][0-9]{3}$')
+
+# More than the number of items per tile, which is at most 4 seasons x 2 polarizations x 10 products + 2 static items
+SEARCH_LIMIT = 1000
+
+router = APIRouter()
+
+
+def tile_from_point(lon: float, lat: float) -> str:
+    """Return the name of the coherence tile containing a point.
+
+    Points on a boundary belong to the tile to their north and east, except on the east and north edges of the grid.
+    """
+    if not (-180 <= lon <= 180 and -90 <= lat <= 90):
+        raise ValueError(f'Point ({lon}, {lat}) is outside of the valid range of longitudes and latitudes')
+    return tiles.coherence_tile(min(math.floor(lat), 89), min(math.floor(lon), 179))
+
+
+def group_series(tile: str, stac_items: list[dict]) -> dict:
+    """Group the coherence items of a tile by season, polarization, and product type.
+
+    Items without a season (e.g. the incidence angle and layover/shadow mask) are grouped by product type only.
+    """
+    series = {'tile': tile, 'static': {}, 'seasons': {}}
+    for stac_item in sorted(stac_items, key=lambda stac_item: stac_item['id']):
+        properties = stac_item['properties']
+        product = {'id': stac_item['id'], 'href': stac_item['assets']['data']['href']}
+
+        if 'season' not in properties:
+            series['static'][properties['sar:product_type']] = product
+            continue
+
+        season = series['seasons'].setdefault(
+            properties['season'],
+            {
+                'datetime': properties['datetime'],
+                'start_datetime': properties['start_datetime'],
+                'end_datetime': properties['end_datetime'],
+                'polarizations': {},
+            },
+        )
+        for polarization in properties['sar:polarizations']:
+            season['polarizations'].setdefault(polarization, {})[properties['sar:product_type']] = product
+    return series
+
+
+async def search_tile(request: Request, tile: str) -> list[dict]:
+    search = {
+        'collections': [COLLECTION_ID],
+        'query': {'tile': {'eq': tile}},
+        'fields': {'include': ['id', 'properties', 'assets.data.href'], 'exclude': ['geometry', 'links']},
+        'limit': SEARCH_LIMIT,
+    }
+    async with request.app.state.readpool.acquire() as connection:
+        item_collection = await connection.fetchval('SELECT * FROM search($1::text::jsonb)', json.dumps(search))
+    return item_collection.get('features') or []
+
+
+@router.get(f'/collections/{COLLECTION_ID}/series')
+async def get_coherence_series(
+    request: Request, tile: Optional[str] = None, lon: Optional[float] = None, lat: Optional[float] = None
+) -> dict:
+    """Return every coherence item for a tile, given either by name (`tile=N01E005`) or by a point in it
+    (`lon=5.5&lat=0.5`), grouped by season, polarization, and product type.
+    """
+    if tile is None:
+        if lon is None or lat is None:
+            raise HTTPException(status_code=400, detail='Either tile or both lon and lat must be given')
+        try:
+            tile = tile_from_point(lon, lat)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    elif not TILE_PATTERN.match(tile):
+        raise HTTPException(status_code=400, detail=f'Invalid tile name: {tile}')
+
+    stac_items = await search_tile(request, tile)
+    if not stac_items:
+        raise HTTPException(status_code=404, detail=f'No coherence items found for tile {tile}')
+
+    series = group_series(tile, stac_items)
+    series['links'] = [
+        {'rel': 'self', 'href': str(request.url), 'type': 'application/json'},
+        {'rel': 'collection', 'href': f'{request.base_url}collections/{COLLECTION_ID}', 'type': 'application/json'},
+    ]
+    return series
@@ -0,0 +1,250 @@
+"""An in-process cache of API responses, so that repeated requests do not each make a round trip to the database.
+
+Responses are cached per Lambda execution environment, keyed on the normalized request, for up to `ttl` seconds and
+evicted in least recently used order. The whole cache is cleared when the database version (see `get_version`)
+changes, e.g. after a collection is reloaded. Responses carry an ETag and a Cache-Control header so that CloudFront
+and clients can revalidate them with If-None-Match.
+"""
+
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from typing import Optional
+from urllib.parse import parse_qsl
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Request headers that change the response body or headers, e.g. the base URL of links or the content encoding
+KEY_HEADERS = [
+    b'host',
+    b'origin',
+    b'accept-encoding',
+    b'forwarded',
+    b'x-forwarded-host',
+    b'x-forwarded-port',
+    b'x-forwarded-prefix',
+    b'x-forwarded-proto',
+]
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    status: int
+    headers: list[tuple[bytes, bytes]]
+    body: bytes
+    etag: bytes
+    expires: float
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = 1000, ttl: float = 300.0, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[tuple, CachedResponse] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def get(self, key: tuple) -> Optional[CachedResponse]:
+        response = self._entries.get(key)
+        if response is not None and response.expires <= self.clock():
+            del self._entries[key]
+            response = None
+
+        if response is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return response
+
+    def put(self, key: tuple, status: int, headers: list[tuple[bytes, bytes]], body: bytes) -> CachedResponse:
+        response = CachedResponse(status, headers, body, make_etag(body), self.clock() + self.ttl)
+        self._entries[key] = response
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return response
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+def make_etag(body: bytes) -> bytes:
+    return b'"' + hashlib.blake2b(body, digest_size=16).hexdigest().encode() + b'"'
+
+
+def etag_matches(etag: bytes, if_none_match: bytes) -> bool:
+    tags = [tag.strip().removeprefix(b'W/') for tag in if_none_match.split(b',')]
+    return b'*' in tags or etag in tags
+
+
+def request_key(scope: dict, body: bytes) -> Optional[tuple]:
+    """Return a key identifying the response to a request, or None if the request body is not valid JSON.
+
+    Query parameters are sorted and JSON bodies are re-serialized with sorted keys, so that equivalent requests share a
+    cache entry.
+    """
+    if body:
+        try:
+            body = json.dumps(json.loads(body), sort_keys=True, separators=(',', ':')).encode()
+        except ValueError:
+            return None
+    headers = dict(scope['headers'])
+    return (
+        scope['method'],
+        scope.get('scheme', 'http'),
+        scope.get('root_path', ''),
+        scope['path'],
+        tuple(sorted(parse_qsl(scope['query_string'].decode('latin-1'), keep_blank_values=True))),
+        body,
+        tuple(headers.get(name, b'') for name in KEY_HEADERS),
+    )
+
+
+class ResponseCacheMiddleware:
+    """ASGI middleware that serves GET requests and POST /search requests from a ResponseCache.
+
+    If get_version is given, it is awaited at most once every version_check_interval seconds, and the cache is cleared
+    whenever the version it returns changes. Responses larger than max_body_size bytes are not cached.
+    """
+
+    def __init__(
+        self,
+        app,
+        cache: ResponseCache,
+        max_age: int = 60,
+        get_version: Optional[Callable[[], Awaitable[str]]] = None,
+        version_check_interval: float = 10.0,
+        max_body_size: int = 1024 * 1024,
+        stats_interval: int = 1000,
+    ):
+        self.app = app
+        self.cache = cache
+        self.cache_control = f'public, max-age={max_age}'.encode()
+        self.get_version = get_version
+        self.version_check_interval = version_check_interval
+        self.max_body_size = max_body_size
+        self.stats_interval = stats_interval
+        self._version: Optional[str] = None
+        self._next_version_check = float('-inf')
+
+    async def __call__(self, scope, receive, send):
+        if not is_cacheable_request(scope):
+            await self.app(scope, receive, send)
+            return
+
+        body = await read_body(receive) if scope['method'] == 'POST' else b''
+        key = request_key(scope, body)
+        if key is None:
+            await self.app(scope, replay_body(body), send)
+            return
+
+        await self.check_version()
+        response = self.cache.get(key)
+        self.log_stats()
+        if response is not None:
+            await self.send_response(scope, send, response, b'HIT')
+            return
+
+        status, headers, response_body = await call_app(self.app, scope, replay_body(body))
+        if status == 200 and len(response_body) <= self.max_body_size:
+            response = self.cache.put(key, status, headers, response_body)
+            await self.send_response(scope, send, response, b'MISS')
+        else:
+            await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+            await send({'type': 'http.response.body', 'body': response_body})
+
+    async def check_version(self) -> None:
+        if self.get_version is None or self.cache.clock() < self._next_version_check:
+            return
+        self._next_version_check = self.cache.clock() + self.version_check_interval
+
+        version = await self.get_version()
+        if self._version is not None and version != self._version:
+            logger.info(f'Database version changed from {self._version} to {version}; clearing the response cache')
+            self.cache.clear()
+        self._version = version
+
+    async def send_response(self, scope: dict, send, response: CachedResponse, cache_status: bytes) -> None:
+        extra_headers = [(b'etag', response.etag), (b'x-cache', cache_status)]
+        if not any(name.lower() == b'cache-control' for name, _ in response.headers):
+            extra_headers.append((b'cache-control', self.cache_control))
+
+        if_none_match = dict(scope['headers']).get(b'if-none-match')
+        if if_none_match is not None and etag_matches(response.etag, if_none_match):
+            vary = [(name, value) for name, value in response.headers if name.lower() == b'vary']
+            await send({'type': 'http.response.start', 'status': 304, 'headers': vary + extra_headers})
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+
+        await send(
+            {'type': 'http.response.start', 'status': response.status, 'headers': response.headers + extra_headers}
+        )
+        await send({'type': 'http.response.body', 'body': response.body})
+
+    def log_stats(self) -> None:
+        lookups = self.cache.hits + self.cache.misses
+        if lookups % self.stats_interval == 0:
+            logger.info(
+                f'Response cache: {self.cache.hits} hits, {self.cache.misses} misses '
+                f'({self.cache.hit_rate:.1%} hit rate), {len(self.cache)}/{self.cache.max_entries} entries'
+            )
+
+
+def is_cacheable_request(scope: dict) -> bool:
+    if scope['type'] != 'http':
+        return False
+    return scope['method'] == 'GET' or (scope['method'] == 'POST' and scope['path'].rstrip('/').endswith('/search'))
+
+
+async def read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body', False):
+            return b''.join(chunks)
+
+
+def replay_body(body: bytes):
+    sent = False
+
+    async def receive():
+        nonlocal sent
+        if sent:
+            return {'type': 'http.disconnect'}
+        sent = True
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    return receive
+
+
+async def call_app(app, scope: dict, receive) -> tuple[int, list[tuple[bytes, bytes]], bytes]:
+    """Call an ASGI app and return the status, headers, and body of its response."""
+    response = {'status': 500, 'headers': []}
+    chunks = []
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+            response['headers'] = list(message.get('headers', []))
+        elif message['type'] == 'http.response.body':
+            chunks.append(message.get('body', b''))
+
+    await app(scope, receive, send)
+    return response['status'], response['headers'], b''.join(chunks)
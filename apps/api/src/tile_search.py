@@ -0,0 +1,243 @@
+"""Rewrite point and small bbox searches on our gridded collections as lookups of the candidate tiles.
+
+Both collections are grids of 1x1 degree tiles, so the items that intersect a small bbox can be found from the tile
+names alone: coherence items by their indexed `tile` property, and HAND items by their IDs. These equality lookups are
+much cheaper for pgstac than a PostGIS intersection with every item geometry. The self, next, and previous links of the
+response are then restored to the client's original bbox or intersects, so that following them repeats the same search.
+The pgstac app compresses its responses with brotli or gzip, so the response is decompressed to restore its links and
+then compressed again with the same encoding.
+
+Candidate tiles are found by testing the exact item bounds against the bbox, including tiles that only touch it, so
+the rewritten search returns the same items as the original. HAND items are shifted half a pixel up and to the left of
+their tile, so their bounds are computed by asf_stac_util.tiles.hand_bounds, as they are when the items are created.
+"""
+
+import gzip
+import json
+import math
+from collections.abc import Iterator
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import brotli
+
+from asf_stac_util import tiles
+from coherence_series import COLLECTION_ID as COHERENCE_COLLECTION_ID
+from response_cache import call_app, read_body, replay_body
+
+
+HAND_COLLECTION_ID = 'glo-30-hand'
+
+# Searches covering more tiles than this are left as spatial intersections
+MAX_TILES = 16
+
+# Links of a search response that repeat the search's parameters
+SEARCH_LINK_RELS = ['self', 'next', 'prev', 'previous']
+
+# The (decompress, compress) functions of the content encodings applied by the pgstac app's BrotliMiddleware
+CONTENT_ENCODINGS = {
+    b'br': (brotli.decompress, brotli.compress),
+    b'gzip': (gzip.decompress, gzip.compress),
+}
+
+
+def boxes_intersect(a: tuple[float, float, float, float], b: tuple[float, float, float, float]) -> bool:
+    """Return whether two (min_x, min_y, max_x, max_y) boxes intersect, including touching at an edge or corner."""
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+def cells(bbox: tuple[float, float, float, float], margin: float = 0.0) -> Iterator[tuple[int, int]]:
+    """Yield the (latitude, longitude) of the lower left corner of each 1x1 degree cell within margin of bbox."""
+    min_x, min_y, max_x, max_y = bbox
+    for lat in range(max(math.ceil(min_y - margin) - 1, -90), min(math.floor(max_y + margin), 89) + 1):
+        for lon in range(max(math.ceil(min_x - margin) - 1, -180), min(math.floor(max_x + margin), 179) + 1):
+            yield lat, lon
+
+
+def coherence_tiles(bbox: tuple[float, float, float, float]) -> list[str]:
+    return [
+        tiles.coherence_tile(lat, lon)
+        for lat, lon in cells(bbox)
+        if boxes_intersect((lon, lat, lon + 1, lat + 1), bbox)
+    ]
+
+
+def hand_item_ids(bbox: tuple[float, float, float, float]) -> list[str]:
+    # HAND tiles extend up to 5 arcseconds beyond their cell, so also check the neighboring cells
+    return [
+        tiles.hand_item_id(lat, lon)
+        for lat, lon in cells(bbox, margin=0.01)
+        if boxes_intersect(tiles.hand_bounds(lat, lon), bbox)
+    ]
+
+
+def search_bbox(search: dict) -> Optional[tuple[float, float, float, float]]:
+    """Return the bbox of a search, or of its intersects geometry if that is a point."""
+    if 'bbox' in search and 'intersects' not in search:
+        bbox = search['bbox']
+        if len(bbox) == 4 and bbox[0] <= bbox[2] and bbox[1] <= bbox[3]:
+            return tuple(float(value) for value in bbox)
+    if 'intersects' in search and 'bbox' not in search:
+        geometry = search['intersects']
+        if isinstance(geometry, dict) and geometry.get('type') == 'Point':
+            lon, lat = geometry['coordinates'][:2]
+            return float(lon), float(lat), float(lon), float(lat)
+    return None
+
+
+def get_tile_lookup(search: dict) -> Optional[dict]:
+    """Return the search parameters that replace the bbox or intersects of a search, or None to leave it unchanged.
+
+    Only searches of a single one of our collections, without an ids list or filter, are rewritten.
+    """
+    collections = search.get('collections') or []
+    if len(collections) != 1 or 'ids' in search or 'filter' in search:
+        return None
+    bbox = search_bbox(search)
+    if bbox is None:
+        return None
+
+    if collections[0] == COHERENCE_COLLECTION_ID:
+        query = search.get('query') or {}
+        if 'tile' in query:
+            return None
+        tiles = coherence_tiles(bbox)
+        if not tiles or len(tiles) > MAX_TILES:
+            return None
+        return {'query': {**query, 'tile': {'in': tiles}}}
+
+    if collections[0] == HAND_COLLECTION_ID:
+        item_ids = hand_item_ids(bbox)
+        if not item_ids or len(item_ids) > MAX_TILES:
+            return None
+        return {'ids': item_ids}
+
+    return None
+
+
+def rewrite_body(body: bytes) -> Optional[bytes]:
+    try:
+        search = json.loads(body)
+    except ValueError:
+        return None
+    if not isinstance(search, dict) or (lookup := get_tile_lookup(search)) is None:
+        return None
+    search = {key: value for key, value in search.items() if key not in ('bbox', 'intersects')}
+    return json.dumps({**search, **lookup}).encode()
+
+
+def rewrite_query_string(query_string: bytes) -> Optional[bytes]:
+    params = dict(parse_qsl(query_string.decode('latin-1'), keep_blank_values=True))
+    try:
+        search = {
+            key: value
+            for key, value in {
+                'collections': params['collections'].split(',') if 'collections' in params else None,
+                'bbox': [float(value) for value in params['bbox'].split(',')] if 'bbox' in params else None,
+                'intersects': json.loads(params['intersects']) if 'intersects' in params else None,
+                'query': json.loads(params['query']) if 'query' in params else None,
+                'ids': params.get('ids'),
+                'filter': params.get('filter'),
+            }.items()
+            if value is not None
+        }
+    except ValueError:
+        return None
+    if (lookup := get_tile_lookup(search)) is None:
+        return None
+
+    params = {key: value for key, value in params.items() if key not in ('bbox', 'intersects')}
+    if 'ids' in lookup:
+        params['ids'] = ','.join(lookup['ids'])
+    else:
+        params['query'] = json.dumps(lookup['query'])
+    return urlencode(params).encode('latin-1')
+
+
+def restore_get_link(href: str, query_string: bytes) -> str:
+    """Replace the query parameters of a link with those of the original request, keeping the link's paging token."""
+    url = urlsplit(href)
+    token = dict(parse_qsl(url.query, keep_blank_values=True)).get('token')
+    params = [(key, value) for key, value in parse_qsl(query_string.decode('latin-1'), keep_blank_values=True)]
+    if token is not None:
+        params = [(key, value) for key, value in params if key != 'token'] + [('token', token)]
+    return urlunsplit(url._replace(query=urlencode(params)))
+
+
+def restore_post_link_body(link_body: dict, search: dict) -> dict:
+    """Replace a link's body with the original search, keeping the link's paging token."""
+    if 'token' in link_body:
+        return {**search, 'token': link_body['token']}
+    return search
+
+
+def restore_links(body: bytes, query_string: Optional[bytes] = None, search: Optional[dict] = None) -> bytes:
+    """Restore the original GET query_string or POST search in the links of a rewritten search's response body."""
+    try:
+        response = json.loads(body)
+    except ValueError:
+        return body
+    if not isinstance(response, dict) or not isinstance(response.get('links'), list):
+        return body
+    for link in response['links']:
+        if link.get('rel') not in SEARCH_LINK_RELS:
+            continue
+        if query_string is not None and 'href' in link:
+            link['href'] = restore_get_link(link['href'], query_string)
+        if search is not None and isinstance(link.get('body'), dict):
+            link['body'] = restore_post_link_body(link['body'], search)
+    return json.dumps(response).encode()
+
+
+def with_content_length(headers: list[tuple[bytes, bytes]], length: int) -> list[tuple[bytes, bytes]]:
+    headers = [(name, value) for name, value in headers if name.lower() != b'content-length']
+    return [*headers, (b'content-length', str(length).encode())]
+
+
+async def send_restored_response(app, scope: dict, receive, send, **original) -> None:
+    """Call app with a rewritten search and send its response, with the original search restored in its links."""
+    status, headers, body = await call_app(app, scope, receive)
+    encoding = dict(headers).get(b'content-encoding', b'identity')
+    if status == 200 and encoding == b'identity':
+        body = restore_links(body, **original)
+        headers = with_content_length(headers, len(body))
+    elif status == 200 and encoding in CONTENT_ENCODINGS:
+        decompress, compress = CONTENT_ENCODINGS[encoding]
+        body = compress(restore_links(decompress(body), **original))
+        headers = with_content_length(headers, len(body))
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+class TileSearchMiddleware:
+    """ASGI middleware that rewrites eligible GET and POST /search requests before they reach the pgstac app."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['path'].rstrip('/') != '/search':
+            await self.app(scope, receive, send)
+            return
+
+        if scope['method'] == 'GET':
+            query_string = rewrite_query_string(scope['query_string'])
+            if query_string is None:
+                await self.app(scope, receive, send)
+                return
+            rewritten_scope = {**scope, 'query_string': query_string}
+            await send_restored_response(self.app, rewritten_scope, receive, send, query_string=scope['query_string'])
+
+        elif scope['method'] == 'POST':
+            body = await read_body(receive)
+            rewritten_body = rewrite_body(body)
+            if rewritten_body is None:
+                await self.app(scope, replay_body(body), send)
+                return
+            rewritten_scope = {**scope, 'headers': with_content_length(scope['headers'], len(rewritten_body))}
+            await send_restored_response(
+                self.app, rewritten_scope, replay_body(rewritten_body), send, search=json.loads(body)
+            )
+
+        else:
+            await self.app(scope, receive, send)
@@ -0,0 +1,100 @@
+"""Measure the cold start latency of the API Lambda handler.
+
+Each run starts a fresh Python process, which imports apps/api/src/api.py (including opening the database connection
+pools) and then invokes the handler with an API Gateway event for GET /collections. The import time, time to first
+response, and total time are reported as percentiles across runs.
+
+The database connection is configured by the same environment variables as the Lambda function, e.g. for a local pgstac:
+
+    POSTGRES_HOST_READER=localhost POSTGRES_HOST_WRITER=localhost POSTGRES_PORT=5432 POSTGRES_DBNAME=postgres \\
+        POSTGRES_USER=postgres POSTGRES_PASS=<password> python benchmarks/api_cold_start.py --runs 20
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+
+API_SRC = Path(__file__).parent.parent / 'apps' / 'api' / 'src'
+
+EVENT = {
+    'version': '2.0',
+    'routeKey': '$default',
+    'rawPath': '/collections',
+    'rawQueryString': '',
+    'headers': {'host': 'localhost', 'x-forwarded-proto': 'https', 'x-forwarded-port': '443'},
+    'requestContext': {
+        'accountId': 'benchmark',
+        'apiId': 'benchmark',
+        'domainName': 'localhost',
+        'domainPrefix': 'localhost',
+        'http': {
+            'method': 'GET',
+            'path': '/collections',
+            'protocol': 'HTTP/1.1',
+            'sourceIp': '127.0.0.1',
+            'userAgent': 'benchmark',
+        },
+        'requestId': 'benchmark',
+        'routeKey': '$default',
+        'stage': '$default',
+        'time': '01/Jan/2024:00:00:00 +0000',
+        'timeEpoch': 1704067200000,
+    },
+    'isBase64Encoded': False,
+}
+
+
+def cold_start() -> dict:
+    """Import the API and handle one request, returning the timings in seconds. Runs in a fresh process."""
+    start = time.perf_counter()
+    sys.path.insert(0, str(API_SRC))
+    import api
+
+    imported = time.perf_counter()
+    response = api.handler(EVENT, None)
+    responded = time.perf_counter()
+
+    assert response['statusCode'] == 200, response
+    return {'import': imported - start, 'first_response': responded - imported, 'total': responded - start}
+
+
+def percentiles(values: list[float]) -> dict:
+    if len(values) < 2:
+        return {'p50': values[0], 'p99': values[0], 'max': values[0]}
+    quantiles = statistics.quantiles(values, n=100, method='inclusive')
+    return {'p50': statistics.median(values), 'p99': quantiles[98], 'max': max(values)}
+
+
+def main():
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--runs', type=int, help='Number of cold starts to measure', default=10)
+    parser.add_argument('--output-file', type=Path, help='Path for a JSON file of the results')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(cold_start()))
+        return
+
+    runs = []
+    for run in range(1, args.runs + 1):
+        output = subprocess.run(
+            [sys.executable, '-W', 'ignore', __file__, '--child'], check=True, capture_output=True, text=True
+        ).stdout
+        runs.append(json.loads(output.splitlines()[-1]))
+        print(f'Run {run}/{args.runs}: {runs[-1]["total"]:.3f}s', file=sys.stderr)
+
+    results = {name: percentiles([run[name] for run in runs]) for name in ['import', 'first_response', 'total']}
+    for name, result in results.items():
+        print(f'{name}: ' + ', '.join(f'{key}={value:.3f}s' for key, value in result.items()))
+    if args.output_file:
+        args.output_file.write_text(json.dumps({'runs': runs, 'results': results}, indent=2) + '\n')
+
+
+if __name__ == '__main__':
+    main()
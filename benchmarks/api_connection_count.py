@@ -0,0 +1,107 @@
+"""Check that the number of database connections stays bounded as the API Lambda function scales out.
+
+Each worker process stands in for a Lambda execution environment: it imports apps/api/src/api.py, with its own
+connection pools, and invokes the handler one request at a time in a loop for --duration seconds, with the response
+cache disabled so that every request queries the database. Meanwhile, the number of client connections to the database
+is sampled from pg_stat_activity. The maximum is reported, and the script exits with an error if it exceeds
+--max-connections.
+
+The workers connect to the database with the same environment variables as the Lambda function, and the samples are
+taken with the PGHOST, PGPORT, PGDATABASE, PGUSER, and PGPASSWORD environment variables, which should point at the
+database itself rather than a connection pooler in front of it. For example, with the pgstac database and pgbouncer
+started by benchmarks/connection_pooling/docker-compose.yml:
+
+    POSTGRES_HOST_READER=localhost POSTGRES_HOST_WRITER=localhost POSTGRES_PORT=6432 POSTGRES_DBNAME=postgis \\
+        POSTGRES_USER=username POSTGRES_PASS=password \\
+        PGHOST=localhost PGPORT=5439 PGDATABASE=postgis PGUSER=username PGPASSWORD=password \\
+        python benchmarks/api_connection_count.py --workers 50 --max-connections 10
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from pathlib import Path
+
+from api_cold_start import API_SRC, EVENT
+
+
+SEARCH_EVENT = {
+    **EVENT,
+    'rawPath': '/search',
+    'rawQueryString': 'collections=glo-30-hand&limit=10',
+    'requestContext': {**EVENT['requestContext'], 'http': {**EVENT['requestContext']['http'], 'path': '/search'}},
+}
+
+
+def handle_requests(duration: float, results: multiprocessing.Queue) -> None:
+    """Import the API and handle requests one at a time for duration seconds, as a Lambda execution environment does."""
+    os.environ['RESPONSE_CACHE_TTL'] = '0'
+    sys.path.insert(0, str(API_SRC))
+    import api
+
+    requests = errors = 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        response = api.handler(SEARCH_EVENT, None)
+        requests += 1
+        if response['statusCode'] != 200:
+            errors += 1
+    results.put({'requests': requests, 'errors': errors})
+
+
+def count_connections(conn) -> int:
+    """Return the number of client connections to the database, other than the one used to count them."""
+    return conn.execute(
+        "SELECT count(*) FROM pg_stat_activity WHERE backend_type = 'client backend' AND pid <> pg_backend_pid()"
+    ).fetchone()[0]
+
+
+def main():
+    import psycopg
+
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--workers', type=int, help='Number of concurrent Lambda execution environments', default=50)
+    parser.add_argument('--duration', type=float, help='Seconds for each worker to handle requests', default=30)
+    parser.add_argument('--interval', type=float, help='Seconds between samples of the connection count', default=0.1)
+    parser.add_argument('--max-connections', type=int, help='Fail if the connection count ever exceeds this')
+    parser.add_argument('--output-file', type=Path, help='Path for a JSON file of the results')
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    workers = [context.Process(target=handle_requests, args=(args.duration, results)) for _ in range(args.workers)]
+
+    samples = []
+    with psycopg.connect(autocommit=True) as conn:
+        baseline = count_connections(conn)
+        for worker in workers:
+            worker.start()
+        while any(worker.is_alive() for worker in workers):
+            samples.append(count_connections(conn) - baseline)
+            time.sleep(args.interval)
+    worker_results = [results.get() for worker in workers if worker.exitcode == 0]
+    if len(worker_results) < len(workers):
+        sys.exit(f'{len(workers) - len(worker_results)} of {len(workers)} workers failed')
+
+    summary = {
+        'workers': args.workers,
+        'requests': sum(result['requests'] for result in worker_results),
+        'errors': sum(result['errors'] for result in worker_results),
+        'max_connections': max(samples, default=0),
+        'mean_connections': sum(samples) / len(samples) if samples else 0,
+    }
+    print(', '.join(f'{name}={value:g}' for name, value in summary.items()))
+    if args.output_file:
+        args.output_file.write_text(json.dumps({**summary, 'samples': samples}, indent=2) + '\n')
+
+    if args.max_connections is not None and summary['max_connections'] > args.max_connections:
+        sys.exit(f'{summary["max_connections"]} database connections exceeds the maximum of {args.max_connections}')
+    if summary['errors']:
+        sys.exit(f'{summary["errors"]} of {summary["requests"]} requests failed')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""Compare reading a bulk export of the coherence catalog from NDJSON against reading it from GeoParquet.
+
+Synthetic coherence items for a grid of tiles, created by generate_synthetic_items.py, are written both as NDJSON and as
+GeoParquet (as written by create_coherence_items.py --geoparquet), then each file is read back in a few typical ways:
+every item, only the IDs and hrefs of one product type, and only the items in a bounding box. The file sizes and the
+fastest of --repeat runs of each read are reported.
+
+Run with: python benchmarks/catalog_read.py --bbox 0 0 10 10
+"""
+
+import argparse
+import json
+import tempfile
+import timeit
+from pathlib import Path
+
+import generate_synthetic_items
+
+import asf_stac_util
+from asf_stac_util import geoparquet
+
+
+# generate_synthetic_items adds the collections directories to sys.path
+create_coherence_items = generate_synthetic_items.create_coherence_items
+
+PRODUCT_TYPE = 'COH12'
+
+
+def read_ndjson(path: Path) -> int:
+    with path.open() as f:
+        return sum(1 for line in f if json.loads(line))
+
+
+def read_ndjson_product(path: Path) -> int:
+    hrefs = []
+    with path.open() as f:
+        for line in f:
+            stac_item = json.loads(line)
+            if stac_item['properties']['sar:product_type'] == PRODUCT_TYPE:
+                hrefs.append((stac_item['id'], stac_item['assets']['data']['href']))
+    return len(hrefs)
+
+
+def read_ndjson_bbox(path: Path, bbox: list[float]) -> int:
+    count = 0
+    with path.open() as f:
+        for line in f:
+            xmin, ymin, xmax, ymax = json.loads(line)['bbox']
+            count += xmin <= bbox[2] and xmax >= bbox[0] and ymin <= bbox[3] and ymax >= bbox[1]
+    return count
+
+
+def read_geoparquet(path: Path) -> int:
+    import pyarrow.parquet as pq
+
+    return pq.read_table(path).num_rows
+
+
+def read_geoparquet_product(path: Path) -> int:
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(path, format='parquet')
+    table = dataset.to_table(columns=['id', 'data_href'], filter=ds.field('sar:product_type') == PRODUCT_TYPE)
+    return table.num_rows
+
+
+def read_geoparquet_bbox(path: Path, bbox: list[float]) -> int:
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(path, format='parquet')
+    intersects = (
+        (ds.field('bbox', 'xmin') <= bbox[2])
+        & (ds.field('bbox', 'xmax') >= bbox[0])
+        & (ds.field('bbox', 'ymin') <= bbox[3])
+        & (ds.field('bbox', 'ymax') >= bbox[1])
+    )
+    return dataset.to_table(filter=intersects).num_rows
+
+
+def main():
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument(
+        '--bbox',
+        type=int,
+        nargs=4,
+        metavar=('MIN_LON', 'MIN_LAT', 'MAX_LON', 'MAX_LAT'),
+        help='Grid of 1x1 degree tiles to create items for',
+        default=[0, 0, 10, 10],
+    )
+    parser.add_argument('-r', '--repeat', type=int, help='Number of runs, of which the fastest is reported', default=3)
+    parser.add_argument('--output-file', type=Path, help='Path for a JSON file of the results')
+    args = parser.parse_args()
+
+    min_lon, min_lat, max_lon, max_lat = args.bbox
+    query_bbox = [min_lon, min_lat, (min_lon + max_lon) / 2, (min_lat + max_lat) / 2]
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        ndjson_file = Path(temp_dir) / 'items.ndjson'
+        geoparquet_file = Path(temp_dir) / 'items.parquet'
+        stac_items = generate_synthetic_items.generate_stac_items(args.bbox, [create_coherence_items.COLLECTION_ID])
+        with geoparquet.GeoParquetWriter(geoparquet_file, create_coherence_items.GEOPARQUET_PROPERTIES) as writer:
+            item_count = asf_stac_util.write_ndjson(writer.write_items(stac_items), ndjson_file)
+
+        benchmarks = {
+            'all items': (lambda: read_ndjson(ndjson_file), lambda: read_geoparquet(geoparquet_file)),
+            f'{PRODUCT_TYPE} ids and hrefs': (
+                lambda: read_ndjson_product(ndjson_file),
+                lambda: read_geoparquet_product(geoparquet_file),
+            ),
+            'items in bbox': (
+                lambda: read_ndjson_bbox(ndjson_file, query_bbox),
+                lambda: read_geoparquet_bbox(geoparquet_file, query_bbox),
+            ),
+        }
+        results = {
+            'items': item_count,
+            'ndjson_bytes': ndjson_file.stat().st_size,
+            'geoparquet_bytes': geoparquet_file.stat().st_size,
+            'reads': {},
+        }
+        print(
+            f'{item_count} items: NDJSON {results["ndjson_bytes"] / 1e6:.2f} MB, '
+            f'GeoParquet {results["geoparquet_bytes"] / 1e6:.2f} MB'
+        )
+        for name, (ndjson_read, geoparquet_read) in benchmarks.items():
+            assert ndjson_read() == geoparquet_read(), name
+            ndjson_seconds = min(timeit.repeat(ndjson_read, number=1, repeat=args.repeat))
+            geoparquet_seconds = min(timeit.repeat(geoparquet_read, number=1, repeat=args.repeat))
+            results['reads'][name] = {'ndjson_seconds': ndjson_seconds, 'geoparquet_seconds': geoparquet_seconds}
+            print(
+                f'{name}: NDJSON {ndjson_seconds:.3f}s, GeoParquet {geoparquet_seconds:.3f}s '
+                f'({ndjson_seconds / geoparquet_seconds:.0f}x faster)'
+            )
+
+    if args.output_file:
+        args.output_file.write_text(json.dumps(results, indent=2) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+"""Generate synthetic coherence and HAND STAC items for capacity planning, without accessing S3.
+
+Items are created by the same create_stac_item functions as the real datasets, from synthetic S3 keys for each 1x1
+degree tile in a grid, so they have the same shape, geometries, and property values as the real items. Coherence items
+can be repeated for several years, to simulate the catalog growing over time. For example, to write the items for the
+whole globe to a file:
+
+    python benchmarks/generate_synthetic_items.py --bbox -180 -90 180 90 --land-fraction 0.3 -o synthetic.ndjson
+
+or to load the coherence items for 2020 through 2024 directly into pgstac:
+
+    python benchmarks/generate_synthetic_items.py --collections sentinel-1-global-coherence --years 2020 2024 \\
+        --load upsert
+"""
+
+import argparse
+import itertools
+import random
+import sys
+from collections.abc import Collection, Iterable, Iterator
+from datetime import datetime
+from pathlib import Path
+
+
+REPO = Path(__file__).parent.parent
+sys.path[:0] = [str(REPO / 'collections' / 'sentinel-1-global-coherence'), str(REPO / 'collections' / 'glo-30-hand')]
+
+import create_coherence_items  # noqa: E402
+import create_hand_items  # noqa: E402
+
+import asf_stac_util  # noqa: E402
+import asf_stac_util.tiles  # noqa: E402
+from asf_stac_util import pgstac  # noqa: E402
+
+
+# The regional bucket URLs that get_s3_url of each item creation script returns, without looking up the bucket locations
+COHERENCE_URL = 'https://sentinel-1-global-coherence-earthbigdata.s3.us-west-2.amazonaws.com/'
+HAND_URL = f'https://{create_hand_items.BUCKET}.s3.us-west-2.amazonaws.com/'
+
+COLLECTION_IDS = [create_coherence_items.COLLECTION_ID, create_hand_items.COLLECTION_ID]
+
+# The year of the seasons in create_coherence_items.SEASONS
+COHERENCE_YEAR = 2020
+
+COHERENCE_SEASONS = ['winter', 'spring', 'summer', 'fall']
+COHERENCE_STATIC_PRODUCTS = ['inc', 'lsmap']
+COHERENCE_CO_POL_PRODUCTS = ['AMP', 'COH06', 'COH12', 'COH18', 'COH24', 'COH36', 'COH48', 'rho', 'rmse', 'tau']
+COHERENCE_CROSS_POL_PRODUCTS = ['AMP']
+
+# Polar tiles were acquired in HH and HV rather than VV and VH
+POLAR_LATITUDE = 60
+
+
+def tiles(bbox: list[int], land_fraction: float = 1.0, seed: int = 0) -> Iterator[tuple[int, int]]:
+    """Yield the (latitude, longitude) of the lower left corner of each 1x1 degree tile in bbox.
+
+    If land_fraction is less than 1, only that fraction of the tiles is yielded, chosen at random.
+    """
+    rng = random.Random(seed)
+    min_lon, min_lat, max_lon, max_lat = bbox
+    for lat in range(min_lat, max_lat):
+        for lon in range(min_lon, max_lon):
+            if rng.random() < land_fraction:
+                yield lat, lon
+
+
+def coherence_s3_keys(min_lat: int, min_lon: int) -> list[str]:
+    tile = asf_stac_util.tiles.coherence_tile(min_lat, min_lon)
+    co_pol, cross_pol = ('hh', 'hv') if abs(min_lat + 0.5) >= POLAR_LATITUDE else ('vv', 'vh')
+
+    keys = [f'data/tiles/{tile}/{tile}_124D_{product}.tif' for product in COHERENCE_STATIC_PRODUCTS]
+    for season in COHERENCE_SEASONS:
+        keys += [f'data/tiles/{tile}/{tile}_{season}_{co_pol}_{product}.tif' for product in COHERENCE_CO_POL_PRODUCTS]
+        keys += [
+            f'data/tiles/{tile}/{tile}_{season}_{cross_pol}_{product}.tif' for product in COHERENCE_CROSS_POL_PRODUCTS
+        ]
+    return keys
+
+
+def hand_s3_key(min_lat: int, min_lon: int) -> str:
+    return f'{create_hand_items.PREFIX}{asf_stac_util.tiles.hand_item_id(min_lat, min_lon)}.tif'
+
+
+def shift_years(stac_item: dict, year: int) -> dict:
+    """Move the datetimes of a coherence item from COHERENCE_YEAR to year, adding the year to the item ID."""
+    if year == COHERENCE_YEAR:
+        return stac_item
+    properties = stac_item['properties']
+    for name, value in properties.items():
+        if isinstance(value, datetime):
+            properties[name] = value.replace(year=value.year + year - COHERENCE_YEAR)
+    stac_item['id'] = f'{stac_item["id"]}_{year}'
+    return stac_item
+
+
+def generate_stac_items(
+    bbox: list[int],
+    collections: Collection[str] = tuple(COLLECTION_IDS),
+    years: Iterable[int] = (COHERENCE_YEAR,),
+    land_fraction: float = 1.0,
+    seed: int = 0,
+) -> Iterator[dict]:
+    """Yield the items of the given collections for each tile in bbox, with the coherence items repeated for each year."""
+    for lat, lon in tiles(bbox, land_fraction, seed):
+        if create_coherence_items.COLLECTION_ID in collections:
+            for year in years:
+                for s3_key in coherence_s3_keys(lat, lon):
+                    yield shift_years(create_coherence_items.create_stac_item(s3_key, COHERENCE_URL), year)
+        if create_hand_items.COLLECTION_ID in collections:
+            yield create_hand_items.create_stac_item(hand_s3_key(lat, lon), HAND_URL)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        '--bbox',
+        type=int,
+        nargs=4,
+        metavar=('MIN_LON', 'MIN_LAT', 'MAX_LON', 'MAX_LAT'),
+        help='Grid of tiles to create items for (default: -10 -10 10 10)',
+        default=[-10, -10, 10, 10],
+    )
+    parser.add_argument(
+        '--collections',
+        nargs='+',
+        choices=COLLECTION_IDS,
+        help='Collections to create items for (default: all)',
+        default=COLLECTION_IDS,
+    )
+    parser.add_argument(
+        '--years',
+        type=int,
+        nargs=2,
+        metavar=('FIRST_YEAR', 'LAST_YEAR'),
+        help=f'Range of years to repeat the coherence items for (default: {COHERENCE_YEAR} {COHERENCE_YEAR})',
+        default=[COHERENCE_YEAR, COHERENCE_YEAR],
+    )
+    parser.add_argument(
+        '--land-fraction',
+        type=float,
+        help='Fraction of tiles to create items for, chosen at random (default: 1)',
+        default=1.0,
+    )
+    parser.add_argument('--random-seed', type=int, help='Seed for choosing tiles (default: 0)', default=0)
+    parser.add_argument('-n', '--number-of-items', type=int, help='Maximum number of items to create')
+    parser.add_argument(
+        '-o',
+        '--output-file',
+        type=Path,
+        help='Path for the output file, or "-" to write to stdout (default: synthetic.ndjson)',
+        default='synthetic.ndjson',
+    )
+    parser.add_argument(
+        '--load',
+        choices=pgstac.LOAD_METHODS,
+        help='Load the items directly into pgstac using the given method, rather than writing them to the output file. '
+        'The database connection is configured by the PGHOST, PGPORT, PGDATABASE, PGUSER, '
+        'and PGPASSWORD environment variables.',
+    )
+    parser.add_argument(
+        '--batch-size', type=int, help='Number of items to load into pgstac per batch (default: 10000)', default=10000
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    years = list(range(args.years[0], args.years[1] + 1))
+    stac_items = generate_stac_items(args.bbox, args.collections, years, args.land_fraction, args.random_seed)
+    stac_items = itertools.islice(stac_items, args.number_of_items)
+    asf_stac_util.output_stac_items(stac_items, args.output_file, args.load, args.batch_size)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""Compare the throughput of asf_stac_util.jsonify_stac_item against the original implementation, which defined a new
+JSONEncoder subclass on every call.
+
+Run with: python benchmarks/jsonify_stac_item.py
+"""
+
+import argparse
+import io
+import json
+import timeit
+from datetime import datetime, timezone
+
+import asf_stac_util
+
+
+STAC_ITEM = {
+    'type': 'Feature',
+    'stac_version': '1.0.0',
+    'id': 'N00E005_fall_vh_AMP',
+    'properties': {
+        'tile': 'N00E005',
+        'sar:instrument_mode': 'IW',
+        'sar:frequency_band': 'C',
+        'sar:product_type': 'AMP',
+        'start_datetime': datetime(2020, 9, 1, tzinfo=timezone.utc),
+        'end_datetime': datetime(2020, 11, 30, tzinfo=timezone.utc),
+        'season': 'fall',
+        'datetime': datetime(2020, 10, 16, 0, tzinfo=timezone.utc),
+        'sar:polarizations': ['VH'],
+    },
+    'geometry': {
+        'type': 'Polygon',
+        'coordinates': (((6.0, -1.0), (6.0, 0.0), (5.0, 0.0), (5.0, -1.0), (6.0, -1.0)),),
+    },
+    'assets': {
+        'data': {
+            'href': 'https://sentinel-1-global-coherence-earthbigdata.s3.us-west-2.amazonaws.com/'
+            'data/tiles/N00E005/N00E005_fall_vh_AMP.tif',
+            'type': 'image/tiff; application=geotiff',
+        },
+    },
+    'bbox': (5.0, -1.0, 6.0, 0.0),
+    'stac_extensions': ['https://stac-extensions.github.io/sar/v1.0.0/schema.json'],
+    'collection': 'sentinel-1-global-coherence',
+}
+
+
+def original_jsonify_stac_item(stac_item: dict) -> str:
+    class DateTimeEncoder(json.JSONEncoder):
+        def default(self, obj):
+            if isinstance(obj, datetime) and obj.tzinfo == timezone.utc:
+                return obj.isoformat().removesuffix('+00:00') + 'Z'
+            return json.JSONEncoder.default(self, obj)
+
+    return json.dumps(stac_item, cls=DateTimeEncoder)
+
+
+def original_dump_stac_items(stac_items: list[dict], f: io.StringIO) -> None:
+    for stac_item in stac_items:
+        f.write(original_jsonify_stac_item(stac_item) + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument(
+        '-n', '--number-of-items', type=int, help='Number of items to serialize per run', default=100_000
+    )
+    parser.add_argument('-r', '--repeat', type=int, help='Number of runs, of which the fastest is reported', default=3)
+    args = parser.parse_args()
+
+    assert asf_stac_util.jsonify_stac_item(STAC_ITEM) == original_jsonify_stac_item(STAC_ITEM)
+
+    stac_items = [STAC_ITEM] * args.number_of_items
+    benchmarks = {
+        'original jsonify_stac_item': lambda: [original_jsonify_stac_item(item) for item in stac_items],
+        'jsonify_stac_item': lambda: [asf_stac_util.jsonify_stac_item(item) for item in stac_items],
+        'original write loop': lambda: original_dump_stac_items(stac_items, io.StringIO()),
+        'dump_stac_items': lambda: asf_stac_util.dump_stac_items(stac_items, io.StringIO()),
+    }
+    for name, benchmark in benchmarks.items():
+        seconds = min(timeit.repeat(benchmark, number=1, repeat=args.repeat))
+        print(f'{name}: {args.number_of_items / seconds:,.0f} items/s')
+
+
+if __name__ == '__main__':
+    main()
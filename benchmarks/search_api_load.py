@@ -0,0 +1,282 @@
+"""Load test the STAC API and report the throughput and latency percentiles of each kind of request.
+
+With --seed, a local pgstac database is first loaded with our collections and synthetic coherence and HAND items for a
+grid of tiles, created by generate_synthetic_items.py. With --start-api, the pgstac app is started as `make run-api`
+does, with the extensions enabled in the API Lambda function. Concurrent clients then replay a mix of bbox and point
+searches, searches using the query, sort, and fields extensions, and deep pagination for --duration seconds. For
+example:
+
+    PGHOST=localhost PGPORT=5432 PGDATABASE=postgres PGUSER=postgres PGPASSWORD=<password> \\
+        python benchmarks/search_api_load.py --seed --start-api --output-file results.json
+
+Pass the results of a previous run as --baseline to compare the latencies against it.
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+from urllib.parse import urlparse
+
+import requests
+
+
+REPO = Path(__file__).parent.parent
+COLLECTION_FILES = sorted(REPO.glob('collections/*/*.json'))
+
+
+def seed_database(bbox: list[int]) -> None:
+    import generate_synthetic_items
+
+    import asf_stac_util
+    from asf_stac_util import pgstac
+
+    pgstac.load_collections(json.loads(path.read_text()) for path in COLLECTION_FILES)
+    stac_items = asf_stac_util.with_progress(generate_synthetic_items.generate_stac_items(bbox), 'Seeding STAC items')
+    pgstac.load_stac_items(stac_items, 'upsert')
+
+
+def start_api(port: int) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        'POSTGRES_HOST_READER': os.environ.get('PGHOST', 'localhost'),
+        'POSTGRES_HOST_WRITER': os.environ.get('PGHOST', 'localhost'),
+        'POSTGRES_PORT': os.environ.get('PGPORT', '5432'),
+        'POSTGRES_DBNAME': os.environ.get('PGDATABASE', 'postgres'),
+        'POSTGRES_USER': os.environ.get('PGUSER', 'postgres'),
+        'POSTGRES_PASS': os.environ.get('PGPASSWORD', ''),
+        'ENABLED_EXTENSIONS': 'query,sort,fields,pagination',
+        'APP_PORT': str(port),
+    }
+    return subprocess.Popen([sys.executable, '-m', 'stac_fastapi.pgstac.app'], env=env)
+
+
+def wait_for_api(api_url: str, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            requests.get(api_url, timeout=5).raise_for_status()
+            return
+        except requests.RequestException:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.5)
+
+
+class LoadTest:
+    """Replays a weighted mix of requests against the API, recording the latency of each request by name."""
+
+    def __init__(self, api_url: str, bbox: list[int], pages: int, seed: int):
+        self.api_url = api_url.rstrip('/')
+        self.bbox = bbox
+        self.pages = pages
+        self.seed = seed
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+        self.lock = threading.Lock()
+        self.scenarios = [
+            (self.get_collections, 1),
+            (self.get_collection, 1),
+            (self.search_bbox, 4),
+            (self.search_point, 2),
+            (self.search_query, 2),
+            (self.search_sort, 2),
+            (self.search_fields, 2),
+            (self.search_pages, 1),
+        ]
+
+    def request(self, session: requests.Session, name: str, method: str, url: str, body=None) -> dict:
+        start = time.perf_counter()
+        try:
+            response = session.request(method, url, json=body, timeout=30)
+            response.raise_for_status()
+            result = response.json()
+        except (requests.RequestException, ValueError):
+            with self.lock:
+                self.errors[name] += 1
+            return {}
+        with self.lock:
+            self.latencies[name].append(time.perf_counter() - start)
+        return result
+
+    def random_bbox(self, rng: random.Random, max_size: float) -> list[float]:
+        min_lon, min_lat, max_lon, max_lat = self.bbox
+        width = rng.uniform(0, min(max_size, max_lon - min_lon))
+        height = rng.uniform(0, min(max_size, max_lat - min_lat))
+        lon, lat = rng.uniform(min_lon, max_lon - width), rng.uniform(min_lat, max_lat - height)
+        return [round(lon, 4), round(lat, 4), round(lon + width, 4), round(lat + height, 4)]
+
+    def search(self, session: requests.Session, name: str, body: dict) -> dict:
+        return self.request(session, name, 'POST', f'{self.api_url}/search', body)
+
+    def get_collections(self, session, rng):
+        self.request(session, 'GET /collections', 'GET', f'{self.api_url}/collections')
+
+    def get_collection(self, session, rng):
+        collection = rng.choice(['sentinel-1-global-coherence', 'glo-30-hand'])
+        self.request(session, 'GET /collections/{id}', 'GET', f'{self.api_url}/collections/{collection}')
+
+    def search_bbox(self, session, rng):
+        collection = rng.choice(['sentinel-1-global-coherence', 'glo-30-hand'])
+        body = {'collections': [collection], 'bbox': self.random_bbox(rng, 2.0), 'limit': 100}
+        self.search(session, 'POST /search (bbox)', body)
+
+    def search_point(self, session, rng):
+        collection = rng.choice(['sentinel-1-global-coherence', 'glo-30-hand'])
+        lon, lat = self.random_bbox(rng, 0)[:2]
+        body = {'collections': [collection], 'intersects': {'type': 'Point', 'coordinates': [lon, lat]}, 'limit': 100}
+        self.search(session, 'POST /search (point)', body)
+
+    def search_query(self, session, rng):
+        body = {
+            'collections': ['sentinel-1-global-coherence'],
+            'bbox': self.random_bbox(rng, 2.0),
+            'query': {
+                'season': {'eq': rng.choice(['winter', 'spring', 'summer', 'fall'])},
+                'sar:polarizations': {'eq': [rng.choice(['VV', 'VH'])]},
+            },
+            'limit': 100,
+        }
+        self.search(session, 'POST /search (query)', body)
+
+    def search_sort(self, session, rng):
+        body = {
+            'collections': ['sentinel-1-global-coherence'],
+            'bbox': self.random_bbox(rng, 2.0),
+            'sortby': [{'field': 'properties.datetime', 'direction': 'desc'}],
+            'limit': 100,
+        }
+        self.search(session, 'POST /search (sort)', body)
+
+    def search_fields(self, session, rng):
+        body = {
+            'collections': ['sentinel-1-global-coherence', 'glo-30-hand'],
+            'bbox': self.random_bbox(rng, 2.0),
+            'fields': {'include': ['id', 'collection', 'properties.tile'], 'exclude': ['assets', 'links']},
+            'limit': 100,
+        }
+        self.search(session, 'POST /search (fields)', body)
+
+    def search_pages(self, session, rng):
+        body = {'collections': ['sentinel-1-global-coherence'], 'bbox': self.random_bbox(rng, 10.0), 'limit': 50}
+        page = self.search(session, 'POST /search (page 1)', body)
+        for _ in range(self.pages - 1):
+            next_link = next((link for link in page.get('links', []) if link['rel'] == 'next'), None)
+            if next_link is None:
+                break
+            page = self.request(session, 'POST /search (next page)', 'POST', next_link['href'], next_link['body'])
+
+    def run_client(self, client: int, deadline: float) -> None:
+        rng = random.Random(self.seed + client)
+        scenarios, weights = zip(*self.scenarios)
+        with requests.Session() as session:
+            while time.monotonic() < deadline:
+                rng.choices(scenarios, weights)[0](session, rng)
+
+    def run(self, clients: int, duration: float) -> float:
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=clients) as executor:
+            futures = [executor.submit(self.run_client, client, start + duration) for client in range(clients)]
+            for future in futures:
+                future.result()
+        return time.monotonic() - start
+
+
+def summarize(latencies: list[float], errors: int, elapsed: float) -> dict:
+    summary = {'requests': len(latencies), 'errors': errors, 'throughput': len(latencies) / elapsed}
+    if len(latencies) >= 2:
+        quantiles = statistics.quantiles(latencies, n=100, method='inclusive')
+        summary.update({'p50_ms': quantiles[49] * 1000, 'p95_ms': quantiles[94] * 1000, 'p99_ms': quantiles[98] * 1000})
+    return summary
+
+
+def print_results(results: dict, baseline: Optional[dict] = None) -> None:
+    print(f'{"endpoint":<32}{"requests":>10}{"errors":>8}{"req/s":>9}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}')
+    for name, summary in results['endpoints'].items():
+        line = (
+            f'{name:<32}{summary["requests"]:>10}{summary["errors"]:>8}{summary["throughput"]:>9.1f}'
+            f'{summary.get("p50_ms", 0):>9.1f}{summary.get("p95_ms", 0):>9.1f}{summary.get("p99_ms", 0):>9.1f}'
+        )
+        previous = (baseline or {}).get('endpoints', {}).get(name, {})
+        if previous.get('p95_ms') and summary.get('p95_ms'):
+            line += f'  p95 {(summary["p95_ms"] / previous["p95_ms"] - 1):+.0%} vs. baseline'
+        print(line)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter, allow_abbrev=False
+    )
+    parser.add_argument('--api-url', help='URL of the API to test', default='http://localhost:8000')
+    parser.add_argument('--seed', action='store_true', help='Load synthetic items into the database before testing')
+    parser.add_argument('--start-api', action='store_true', help='Start the pgstac app on the port of --api-url')
+    parser.add_argument(
+        '--bbox',
+        type=int,
+        nargs=4,
+        metavar=('MIN_LON', 'MIN_LAT', 'MAX_LON', 'MAX_LAT'),
+        help='Grid of tiles to seed and to search within (default: -10 -10 10 10)',
+        default=[-10, -10, 10, 10],
+    )
+    parser.add_argument('--clients', type=int, help='Number of concurrent clients (default: 8)', default=8)
+    parser.add_argument('--duration', type=float, help='Seconds to run the test for (default: 60)', default=60.0)
+    parser.add_argument('--pages', type=int, help='Pages to follow for deep pagination (default: 20)', default=20)
+    parser.add_argument('--random-seed', type=int, help='Seed for the request mix (default: 0)', default=0)
+    parser.add_argument('--output-file', type=Path, help='Path for a JSON file of the results')
+    parser.add_argument('--baseline', type=Path, help='Results of a previous run to compare against')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    if args.seed:
+        seed_database(args.bbox)
+
+    api = None
+    if args.start_api:
+        api = start_api(urlparse(args.api_url).port or 8000)
+    try:
+        wait_for_api(args.api_url)
+        load_test = LoadTest(args.api_url, args.bbox, args.pages, args.random_seed)
+        elapsed = load_test.run(args.clients, args.duration)
+    finally:
+        if api is not None:
+            api.terminate()
+            api.wait()
+
+    all_latencies = [latency for latencies in load_test.latencies.values() for latency in latencies]
+    results = {
+        'started': datetime.now(timezone.utc).isoformat(),
+        'parameters': {
+            'bbox': args.bbox,
+            'clients': args.clients,
+            'duration': args.duration,
+            'pages': args.pages,
+            'random_seed': args.random_seed,
+        },
+        'total': summarize(all_latencies, sum(load_test.errors.values()), elapsed),
+        'endpoints': {
+            name: summarize(load_test.latencies[name], load_test.errors[name], elapsed)
+            for name in sorted(set(load_test.latencies) | set(load_test.errors))
+        },
+    }
+
+    baseline = json.loads(args.baseline.read_text()) if args.baseline else None
+    print_results(results, baseline)
+    if args.output_file:
+        args.output_file.write_text(json.dumps(results, indent=2) + '\n')
+
+
+if __name__ == '__main__':
+    main()
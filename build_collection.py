@@ -0,0 +1,61 @@
+"""Build a collection from its items and, with --load, replace the collection and its items in pgstac without downtime.
+
+The extents and summaries of the collection are computed from the items in the NDJSON files created by the item creation
+scripts, in a single pass, using the collection JSON file as a template (see asf_stac_util.collection). With --load, the
+items are loaded into a staging collection (the collection ID with a -staging suffix) during the same pass, then the
+staging collection is promoted in a single transaction, which replaces the content and items of the live collection.
+Searches see the old items until the transaction commits, and the new items after.
+
+The database connection is configured by the PGHOST, PGPORT, PGDATABASE, PGUSER, and PGPASSWORD environment variables.
+"""
+
+import argparse
+import json
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+
+import asf_stac_util
+from asf_stac_util.collection import CollectionBuilder
+
+
+def read_ndjson(paths: Iterable[Path]) -> Iterator[dict]:
+    for path in paths:
+        with path.open() as f:
+            yield from (json.loads(line) for line in f if line.strip())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('collection', type=Path, help='Path to the collection JSON file')
+    parser.add_argument('ndjson_files', type=Path, nargs='+', help='Paths to the NDJSON files of the items')
+    parser.add_argument('--output-file', type=Path, help='Path for the built collection JSON file')
+    parser.add_argument(
+        '--load', action='store_true', help='Load the items into a staging collection, then promote it in pgstac'
+    )
+    parser.add_argument('--batch-size', type=int, help='Number of items to load per batch', default=10000)
+    args = parser.parse_args()
+
+    builder = CollectionBuilder(json.loads(args.collection.read_text()))
+    stac_items = asf_stac_util.with_progress(builder.add_items(read_ndjson(args.ndjson_files)), 'Reading STAC items')
+    if args.load:
+        from asf_stac_util import pgstac
+
+        pgstac.load_staging_collection(builder.template, stac_items, args.batch_size)
+    else:
+        for _ in stac_items:
+            pass
+    collection = builder.build()
+    print(
+        f'{collection["id"]}: {builder.item_count} items, bbox {collection["extent"]["spatial"]["bbox"][0]}, '
+        f'interval {collection["extent"]["temporal"]["interval"][0]}'
+    )
+
+    if args.output_file:
+        args.output_file.write_text(json.dumps(collection, indent=2, ensure_ascii=False) + '\n')
+    if args.load:
+        count = pgstac.promote_staging_collection(collection)
+        print(f'{collection["id"]}: promoted {count} items from {pgstac.staging_collection_id(collection["id"])}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,50 +1,322 @@
 import argparse
+import contextlib
+import functools
+import itertools
+import json
+import math
+import random
+import sqlite3
+import sys
+import time
 import urllib.parse
+from collections import deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timezone
 from pathlib import Path, PurePath
+from typing import Optional
 
 import boto3
 from osgeo import gdal
 from shapely import geometry
 
 import asf_stac_util
+import asf_stac_util.s3
+from asf_stac_util import checkpoint, geoparquet, pgstac, profiling, shards, tiles, validation
+from asf_stac_util.profiling import profiler
 
 
 gdal.SetConfigOption('GDAL_DISABLE_READDIR_ON_OPEN', 'EMPTY_DIR')
 
 s3 = boto3.client('s3')
 
+BUCKET = 'glo-30-hand'
+PREFIX = 'v1/2021/'
+
+DEM_BUCKET = 'copernicus-dem-30m'
+
+# HAND items have no properties other than their datetimes, which are always columns of the GeoParquet snapshot
+GEOPARQUET_PROPERTIES: dict[str, str] = {}
+
 COLLECTION_ID = 'glo-30-hand'
 
 
+class GdalInfoCache:
+    """SQLite cache of gdal_info output, keyed by S3 key and ETag.
+
+    New entries are committed every commit_every writes, so that an interrupted run keeps most of its entries. The least
+    recently used entries are evicted when the cache is closed, so that at most max_entries remain.
+    """
+
+    def __init__(self, path: Path, max_entries: int = 100_000, commit_every: int = 100):
+        self.max_entries = max_entries
+        self.commit_every = commit_every
+        self._uncommitted = 0
+        # The cache may be used from a background thread when loading items directly into pgstac
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS gdal_info '
+            '(s3_key TEXT PRIMARY KEY, etag TEXT NOT NULL, gdal_info_output TEXT NOT NULL, last_used REAL NOT NULL)'
+        )
+        self._connection.execute('CREATE INDEX IF NOT EXISTS gdal_info_last_used ON gdal_info (last_used)')
+
+    def __enter__(self) -> 'GdalInfoCache':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def get(self, s3_key: str, etag: str) -> Optional[dict]:
+        row = self._connection.execute(
+            'SELECT gdal_info_output FROM gdal_info WHERE s3_key = ? AND etag = ?', (s3_key, etag)
+        ).fetchone()
+        if row is None:
+            return None
+        self._connection.execute('UPDATE gdal_info SET last_used = ? WHERE s3_key = ?', (time.time(), s3_key))
+        return json.loads(row[0])
+
+    def put(self, s3_key: str, etag: str, gdal_info_output: dict) -> None:
+        self._connection.execute(
+            'INSERT OR REPLACE INTO gdal_info VALUES (?, ?, ?, ?)',
+            (s3_key, etag, json.dumps(gdal_info_output), time.time()),
+        )
+        self._uncommitted += 1
+        if self._uncommitted >= self.commit_every:
+            self._connection.commit()
+            self._uncommitted = 0
+
+    def close(self) -> None:
+        self._connection.execute(
+            'DELETE FROM gdal_info WHERE s3_key IN '
+            '(SELECT s3_key FROM gdal_info ORDER BY last_used DESC LIMIT -1 OFFSET ?)',
+            (self.max_entries,),
+        )
+        self._connection.commit()
+        self._connection.close()
+
+
 def get_s3_url() -> str:
-    bucket = 'glo-30-hand'
-    location = s3.get_bucket_location(Bucket=bucket)['LocationConstraint']
-    return f'https://{bucket}.s3.{location}.amazonaws.com/'
+    location = s3.get_bucket_location(Bucket=BUCKET)['LocationConstraint']
+    return f'https://{BUCKET}.s3.{location}.amazonaws.com/'
 
 
-def write_stac_items(s3_keys: list[str], s3_url: str, output_file: Path) -> None:
-    with output_file.open('w') as f:
-        for count, s3_key in enumerate(s3_keys, start=1):
-            print(f'Creating STAC items: {count}/{len(s3_keys)}', end='\r')
-            gdal_info_output = gdal_info(s3_key, s3_url)
+def get_etags() -> dict[str, str]:
+    # HAND file names are split into shards by latitude at their underscores
+    return {obj.key: obj.etag for obj in asf_stac_util.s3.list_objects(BUCKET, PREFIX, delimiter='_')}
+
+
+def create_stac_items(
+    s3_keys: Iterable[str],
+    s3_url: str,
+    failed_keys: list[str],
+    workers: int = 1,
+    retries: int = 3,
+    offline_geometry: bool = False,
+    cache: Optional[GdalInfoCache] = None,
+    etags: Optional[dict[str, str]] = None,
+) -> Iterator[dict]:
+    """Yield a STAC item for each S3 key, appending the keys whose GeoTIFF header could not be read to failed_keys."""
+    if offline_geometry:
+        results = ((s3_key, None) for s3_key in s3_keys)
+    else:
+        results = fetch_gdal_info(s3_keys, s3_url, workers, retries, cache, etags)
+    for s3_key, gdal_info_output in results:
+        if gdal_info_output is None and not offline_geometry:
+            failed_keys.append(s3_key)
+            profiler.count('items_failed')
+            continue
+        with profiler.stage('create_stac_item'):
             stac_item = create_stac_item(s3_key, s3_url, gdal_info_output)
-            f.write(asf_stac_util.jsonify_stac_item(stac_item) + '\n')
+        profiler.count('items_created')
+        yield stac_item
 
 
-def get_dem_url(hand_item_id: str) -> str:
+def write_shard(
+    key_file: Path,
+    shard_file: Path,
+    s3_url: str,
+    workers: int,
+    retries: int,
+    offline_geometry: bool,
+    dem_keys: Optional[frozenset[str]] = None,
+) -> list[str]:
+    failed_keys: list[str] = []
+    missing_dem_ids: list[str] = []
+    s3_keys = asf_stac_util.read_s3_keys(str(key_file))
+    stac_items = create_stac_items(s3_keys, s3_url, failed_keys, workers, retries, offline_geometry)
+    if dem_keys is not None:
+        stac_items = verify_dem_links(stac_items, dem_keys, missing_dem_ids)
+    asf_stac_util.write_ndjson(stac_items, shard_file)
+    report_missing_dems(missing_dem_ids)
+    return failed_keys
+
+
+def fetch_gdal_info(
+    s3_keys: Iterable[str],
+    s3_url: str,
+    workers: int = 1,
+    retries: int = 3,
+    cache: Optional[GdalInfoCache] = None,
+    etags: Optional[dict[str, str]] = None,
+) -> Iterator[tuple[str, Optional[dict]]]:
+    """Yield (s3_key, gdal_info_output) pairs in the same order as s3_keys.
+
+    Requests are spread across a pool of worker threads, with at most a few requests per worker in flight at once.
+    The gdal_info_output is None for keys that still failed after all retries.
+
+    If a cache is given, keys whose ETag (from etags) matches the cached entry are not requested,
+    and the output for all other keys with a known ETag is added to the cache.
+    """
+    if etags is None:
+        etags = {}
+
+    def next_result() -> tuple[str, Optional[dict]]:
+        s3_key, future, is_cached = pending.popleft()
+        gdal_info_output = future.result()
+        if cache and not is_cached and gdal_info_output is not None and etags.get(s3_key) is not None:
+            cache.put(s3_key, etags[s3_key], gdal_info_output)
+        return s3_key, gdal_info_output
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending: deque[tuple[str, Future, bool]] = deque()
+        for s3_key in s3_keys:
+            etag = etags.get(s3_key)
+            cached_output = cache.get(s3_key, etag) if cache and etag is not None else None
+            if cached_output is not None:
+                profiler.count('gdal_info_cache_hits')
+                future = Future()
+                future.set_result(cached_output)
+                pending.append((s3_key, future, True))
+            else:
+                future = executor.submit(gdal_info_with_retries, s3_key, s3_url, retries)
+                pending.append((s3_key, future, False))
+            if len(pending) >= workers * 4:
+                yield next_result()
+        while pending:
+            yield next_result()
+
+
+def gdal_info_with_retries(s3_key: str, s3_url: str, retries: int, backoff: float = 1.0) -> Optional[dict]:
+    for attempt in range(retries + 1):
+        try:
+            gdal_info_output = gdal_info(s3_key, s3_url)
+        except RuntimeError as e:
+            print(f'\ngdal.Info failed for {s3_key}: {e}', file=sys.stderr)
+            gdal_info_output = None
+        if gdal_info_output is not None:
+            return gdal_info_output
+        if attempt < retries:
+            profiler.count('gdal_info_retries')
+            time.sleep(backoff * 2**attempt)
+    print(f'\nGiving up on {s3_key} after {retries + 1} attempts', file=sys.stderr)
+    return None
+
+
+def get_dem_key(hand_item_id: str) -> str:
     dem_id = hand_item_id.replace('HAND', 'DEM')
-    return f'https://copernicus-dem-30m.s3.eu-central-1.amazonaws.com/{dem_id}/{dem_id}.tif'
+    return f'{dem_id}/{dem_id}.tif'
+
+
+def get_dem_url(hand_item_id: str) -> str:
+    return f'https://{DEM_BUCKET}.s3.eu-central-1.amazonaws.com/{get_dem_key(hand_item_id)}'
+
+
+def load_dem_keys(source: str) -> frozenset[str]:
+    """Return the keys of the DEM GeoTIFFs listed by list-dem-objects, or listed from an s3://bucket/prefix URL."""
+    return frozenset(asf_stac_util.read_s3_keys(source, suffix='_DEM.tif'))
+
+
+def verify_dem_links(
+    stac_items: Iterable[dict], dem_keys: frozenset[str], missing_dem_ids: list[str]
+) -> Iterator[dict]:
+    """Yield the STAC items, removing the related DEM link of each item whose DEM is not in dem_keys.
+
+    The IDs of the items without a DEM are appended to missing_dem_ids.
+    """
+    for stac_item in stac_items:
+        if get_dem_key(stac_item['id']) not in dem_keys:
+            stac_item['links'] = [link for link in stac_item['links'] if link['rel'] != 'related']
+            missing_dem_ids.append(stac_item['id'])
+            profiler.count('dem_links_missing')
+        yield stac_item
+
+
+def report_missing_dems(missing_dem_ids: list[str]) -> None:
+    if missing_dem_ids:
+        print(
+            f'{len(missing_dem_ids)} HAND tiles have no matching DEM, so their items have no related DEM link: '
+            f'{sorted(missing_dem_ids)}',
+            file=sys.stderr,
+        )
 
 
 def gdal_info(s3_key: str, s3_url: str) -> dict:
     url = f'/vsicurl/{urllib.parse.urljoin(s3_url, s3_key)}'
-    return gdal.Info(url, format='json')
+    profiler.count('gdal_info_requests')
+    with profiler.stage('gdal_info'):
+        return gdal.Info(url, format='json')
+
+
+def tile_latitude(s3_key: str) -> float:
+    min_lat, _ = tiles.parse_hand_item_id(PurePath(s3_key).stem)
+    return min_lat
+
 
+def geometry_from_item_id(item_id: str) -> dict:
+    """Compute the geometry that gdal reports as the wgs84Extent of a HAND GeoTIFF, without reading the GeoTIFF.
 
-def create_stac_item(s3_key: str, s3_url: str, gdal_info_output: dict) -> dict:
+    Item IDs encode the lower left corner of their 1x1 degree tile, e.g. Copernicus_DSM_COG_10_N02_00_W062_00_HAND.
+    Pixel centers lie on the tile boundaries, so the raster extent is shifted half a pixel up and to the left.
+    """
+    min_x, min_y, max_x, max_y = tiles.hand_bounds(*tiles.parse_hand_item_id(item_id))
+
+    return {
+        'type': 'Polygon',
+        'coordinates': [
+            [
+                [min_x, max_y],
+                [min_x, min_y],
+                [max_x, min_y],
+                [max_x, max_y],
+                [min_x, max_y],
+            ]
+        ],
+    }
+
+
+def check_offline_geometry(s3_keys: list[str], s3_url: str, sample_size: int) -> list[str]:
+    """Compare geometry_from_item_id against gdal for a random sample of s3_keys and return the keys that differ."""
+    mismatched_keys = []
+    sample = random.sample(s3_keys, min(sample_size, len(s3_keys)))
+    for count, s3_key in enumerate(sample, start=1):
+        print(f'Checking offline geometry: {count}/{len(sample)}', end='\r')
+        expected = gdal_info(s3_key, s3_url)['wgs84Extent']
+        actual = geometry_from_item_id(PurePath(s3_key).stem)
+        if not geometries_are_close(actual, expected):
+            print(f'\nGeometry mismatch for {s3_key}: expected {expected}, got {actual}', file=sys.stderr)
+            mismatched_keys.append(s3_key)
+    print()
+    return mismatched_keys
+
+
+def geometries_are_close(a: dict, b: dict, abs_tol: float = 1e-7) -> bool:
+    a_coords = [coord for ring in a['coordinates'] for point in ring for coord in point]
+    b_coords = [coord for ring in b['coordinates'] for point in ring for coord in point]
+    return (
+        a['type'] == b['type']
+        and len(a_coords) == len(b_coords)
+        and all(math.isclose(x, y, abs_tol=abs_tol) for x, y in zip(a_coords, b_coords))
+    )
+
+
+def create_stac_item(s3_key: str, s3_url: str, gdal_info_output: Optional[dict] = None) -> dict:
     item_id = PurePath(s3_key).stem
-    item_geometry = gdal_info_output['wgs84Extent']
+    with profiler.stage('geometry'):
+        if gdal_info_output is None:
+            item_geometry = geometry_from_item_id(item_id)
+        else:
+            item_geometry = gdal_info_output['wgs84Extent']
+        item_bbox = geometry.shape(item_geometry).bounds
     return {
         'type': 'Feature',
         'stac_version': '1.0.0',
@@ -61,7 +333,7 @@ def create_stac_item(s3_key: str, s3_url: str, gdal_info_output: dict) -> dict:
                 'type': 'image/tiff; application=geotiff',
             },
         },
-        'bbox': geometry.shape(item_geometry).bounds,
+        'bbox': item_bbox,
         'stac_extensions': [],
         'collection': COLLECTION_ID,
         'links': [
@@ -78,20 +350,127 @@ def create_stac_item(s3_key: str, s3_url: str, gdal_info_output: dict) -> dict:
 
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
-    parser.add_argument('s3_objects', type=Path, help='Path to a text file containing the list of S3 objects')
-    parser.add_argument('-o', '--output-file', type=Path, help='Path for the output file', default='glo-30-hand.ndjson')
+    parser.add_argument(
+        's3_objects',
+        help='Path to a text file containing the list of S3 objects, '
+        '"-" to read the list from stdin, or an s3://bucket/prefix URL to list the S3 objects from',
+    )
     parser.add_argument('-n', '--number-of-items', type=int, help='Number of items to create')
-    return parser.parse_args()
+    asf_stac_util.add_output_arguments(parser, default_output_file='glo-30-hand.ndjson')
+    parser.add_argument(
+        '-w', '--workers', type=int, help='Number of threads for fetching GeoTIFF headers concurrently', default=1
+    )
+    parser.add_argument(
+        '-r', '--retries', type=int, help='Number of times to retry fetching a GeoTIFF header on failure', default=3
+    )
+    parser.add_argument(
+        '--cache',
+        type=Path,
+        help='Path to a SQLite file for caching GeoTIFF headers between runs. '
+        'Only objects that are new or changed since the previous run are read. '
+        'Cannot be used with --offline-geometry or --shards.',
+    )
+    parser.add_argument(
+        '--cache-max-entries', type=int, help='Maximum number of GeoTIFF headers to keep in the cache', default=100_000
+    )
+    parser.add_argument(
+        '--offline-geometry',
+        action='store_true',
+        help='Compute item geometries from the tile names rather than by reading each GeoTIFF header',
+    )
+    parser.add_argument(
+        '--check-offline-geometry',
+        type=int,
+        metavar='SAMPLE_SIZE',
+        help='Compare offline geometries against gdal for a random sample of S3 objects, rather than creating items',
+    )
+    parser.add_argument(
+        '--dem-objects',
+        help='Path to the list of DEM objects written by list-dem-objects, or an s3://bucket/prefix URL to list them '
+        'from. The related DEM link is only added to the items whose DEM is in the list, and the HAND tiles '
+        'without a DEM are reported at the end.',
+    )
+    profiling.add_profile_arguments(parser)
+    validation.add_validate_arguments(parser)
+    args = parser.parse_args()
+    if args.cache and (args.offline_geometry or args.shards):
+        parser.error('--cache cannot be used with --offline-geometry or --shards')
+    asf_stac_util.check_output_arguments(parser, args)
+    return args
 
 
 def main():
     args = parse_args()
 
-    with args.s3_objects.open() as f:
-        s3_keys = f.read().splitlines()[: args.number_of_items]
+    with profiling.profile(args.profile, args.profile_output):
+        s3_keys = itertools.islice(asf_stac_util.read_s3_keys(args.s3_objects, suffix='.tif'), args.number_of_items)
+        s3_url = get_s3_url()
+
+        if args.check_offline_geometry:
+            mismatched_keys = check_offline_geometry(list(s3_keys), s3_url, args.check_offline_geometry)
+            if mismatched_keys:
+                sys.exit(f'Offline geometry differs from gdal for {len(mismatched_keys)} S3 objects')
+            return
+
+        failed_keys: list[str] = []
+        missing_dem_ids: list[str] = []
+        dem_keys = load_dem_keys(args.dem_objects) if args.dem_objects else None
+        report = validation.ValidationReport() if args.validate else None
+        cache_context = GdalInfoCache(args.cache, args.cache_max_entries) if args.cache else contextlib.nullcontext()
+        parquet_context = (
+            geoparquet.GeoParquetWriter(args.geoparquet, GEOPARQUET_PROPERTIES)
+            if args.geoparquet
+            else contextlib.nullcontext()
+        )
+        with cache_context as cache, parquet_context as parquet_writer:
+            etags = get_etags() if args.cache else None
+
+            def create_items(keys: Iterable[str]) -> Iterator[dict]:
+                stac_items = create_stac_items(
+                    keys, s3_url, failed_keys, args.workers, args.retries, args.offline_geometry, cache, etags
+                )
+                if dem_keys is not None:
+                    stac_items = verify_dem_links(stac_items, dem_keys, missing_dem_ids)
+                if report:
+                    stac_items = validation.validate_stac_items(stac_items, report, args.processes)
+                if parquet_writer:
+                    stac_items = parquet_writer.write_items(stac_items)
+                return stac_items
 
-    s3_url = get_s3_url()
-    write_stac_items(s3_keys, s3_url, args.output_file)
+            if args.sync:
+                pgstac.sync_stac_items(
+                    COLLECTION_ID, s3_keys, create_items, args.delete_stale, args.load or 'insert', args.batch_size
+                )
+            elif args.shards:
+                write_shard_kwargs = {
+                    's3_url': s3_url,
+                    'workers': args.workers,
+                    'retries': args.retries,
+                    'offline_geometry': args.offline_geometry,
+                    'dem_keys': dem_keys,
+                }
+                failed_keys = shards.write_shards(
+                    s3_keys,
+                    args.output_file,
+                    args.shards,
+                    shards.get_shard_function(args.partition_by, args.shards, tile_latitude),
+                    functools.partial(write_shard, **write_shard_kwargs),
+                    args.processes,
+                )
+                if report:
+                    shard_files = [shards.shard_path(args.output_file, shard) for shard in range(args.shards)]
+                    validation.validate_ndjson(shard_files, report, args.processes)
+            elif asf_stac_util.uses_checkpoint(args):
+                failed_keys = checkpoint.write_stac_items(s3_keys, create_items, args.output_file, args.resume)
+            else:
+                asf_stac_util.output_stac_items(create_items(s3_keys), args.output_file, args.load, args.batch_size)
+        report_missing_dems(missing_dem_ids)
+        if report:
+            validation.print_report(report, args.validation_report)
+        if failed_keys:
+            sys.exit(f'Failed to create {len(failed_keys)} STAC items: {failed_keys}')
+        if report and report.invalid_items:
+            sys.exit(f'{report.invalid_items} of {report.items_validated} STAC items are invalid')
 
 
 if __name__ == '__main__':
@@ -1,5 +1,10 @@
 import argparse
+import contextlib
+import functools
+import itertools
+import sys
 import urllib.parse
+from collections.abc import Iterable, Iterator
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from pathlib import Path, PurePath
@@ -8,6 +13,8 @@ import boto3
 from shapely import geometry
 
 import asf_stac_util
+from asf_stac_util import checkpoint, geoparquet, pgstac, profiling, shards, validation
+from asf_stac_util.profiling import profiler
 
 
 s3 = boto3.client('s3')
@@ -38,6 +45,16 @@ SEASONS = {
 }
 
 COLLECTION_ID = 'sentinel-1-global-coherence'
+# Columns of the GeoParquet snapshot, in addition to the ID, datetimes, data asset href, geometry, and bbox
+GEOPARQUET_PROPERTIES = {
+    'tile': 'string',
+    'season': 'string',
+    'sar:instrument_mode': 'string',
+    'sar:frequency_band': 'string',
+    'sar:polarizations': 'list<string>',
+    'sar:product_type': 'string',
+}
+
 SAR_INSTRUMENT_MODE = 'IW'
 SAR_FREQUENCY_BAND = 'C'
 
@@ -66,16 +83,30 @@ def get_s3_url() -> str:
     return f'https://{bucket}.s3.{location}.amazonaws.com/'
 
 
-def write_stac_items(s3_keys: list[str], s3_url: str, output_file: Path) -> None:
-    with output_file.open('w') as f:
-        for count, s3_key in enumerate(s3_keys, start=1):
-            print(f'Creating STAC items: {count}/{len(s3_keys)}', end='\r')
+def create_stac_items(s3_keys: Iterable[str], s3_url: str) -> Iterator[dict]:
+    for s3_key in s3_keys:
+        with profiler.stage('create_stac_item'):
             stac_item = create_stac_item(s3_key, s3_url)
-            f.write(asf_stac_util.jsonify_stac_item(stac_item) + '\n')
+        profiler.count('items_created')
+        yield stac_item
+
+
+def write_shard(key_file: Path, shard_file: Path, s3_url: str) -> list[str]:
+    stac_items = create_stac_items(asf_stac_util.read_s3_keys(str(key_file)), s3_url)
+    asf_stac_util.write_ndjson(stac_items, shard_file)
+    return []
+
+
+def tile_latitude(s3_key: str) -> float:
+    tile = PurePath(s3_key).stem.split('_')[0]
+    _, (_, min_y, _, _) = tile_geometry(tile)
+    return min_y
 
 
 def create_stac_item(s3_key: str, s3_url: str) -> dict:
     metadata = parse_s3_key(s3_key)
+    with profiler.stage('geometry'):
+        item_geometry, item_bbox = tile_geometry(metadata.tile)
     item = {
         'type': 'Feature',
         'stac_version': '1.0.0',
@@ -88,14 +119,14 @@ def create_stac_item(s3_key: str, s3_url: str) -> dict:
             'start_datetime': SEASONS['winter']['start_datetime'],
             'end_datetime': SEASONS['fall']['end_datetime'],
         },
-        'geometry': geometry.mapping(metadata.bbox),
+        'geometry': dict(item_geometry),
         'assets': {
             'data': {
                 'href': urllib.parse.urljoin(s3_url, s3_key),
                 'type': 'image/tiff; application=geotiff',
             },
         },
-        'bbox': metadata.bbox.bounds,
+        'bbox': item_bbox,
         'stac_extensions': ['https://stac-extensions.github.io/sar/v1.0.0/schema.json'],
         'collection': COLLECTION_ID,
     }
@@ -143,6 +174,17 @@ def parse_s3_key(s3_key: str) -> ItemMetadata:
     return metadata
 
 
+@functools.cache
+def tile_geometry(tile: str) -> tuple[dict, tuple[float, float, float, float]]:
+    """Return the GeoJSON geometry and bbox for a tile, computed once per tile.
+
+    Each tile has several items (one per season, polarization, and product), which all share the same geometry.
+    """
+    bbox = bounding_box_from_tile(tile)
+    return geometry.mapping(bbox), bbox.bounds
+
+
+@functools.cache
 def bounding_box_from_tile(tile: str) -> geometry.Polygon:
     # "Tiles in the data set are labeled by the upper left coordinate of each 1x1 degree tile"
     # http://sentinel-1-global-coherence-earthbigdata.s3-website-us-west-2.amazonaws.com/#organization
@@ -164,22 +206,72 @@ def bounding_box_from_tile(tile: str) -> geometry.Polygon:
 
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
-    parser.add_argument('s3_objects', type=Path, help='Path to a text file containing the list of S3 objects')
     parser.add_argument(
-        '-o', '--output-file', type=Path, help='Path for the output file', default='sentinel-1-global-coherence.ndjson'
+        's3_objects',
+        help='Path to a text file containing the list of S3 objects, '
+        '"-" to read the list from stdin, or an s3://bucket/prefix URL to list the S3 objects from',
     )
     parser.add_argument('-n', '--number-of-items', type=int, help='Number of items to create')
-    return parser.parse_args()
+    asf_stac_util.add_output_arguments(parser, default_output_file='sentinel-1-global-coherence.ndjson')
+    profiling.add_profile_arguments(parser)
+    validation.add_validate_arguments(parser)
+    args = parser.parse_args()
+    asf_stac_util.check_output_arguments(parser, args)
+    return args
 
 
 def main():
     args = parse_args()
 
-    with args.s3_objects.open() as f:
-        s3_keys = f.read().splitlines()[: args.number_of_items]
-
-    s3_url = get_s3_url()
-    write_stac_items(s3_keys, s3_url, args.output_file)
+    with profiling.profile(args.profile, args.profile_output):
+        s3_keys = itertools.islice(asf_stac_util.read_s3_keys(args.s3_objects, suffix='.tif'), args.number_of_items)
+        s3_url = get_s3_url()
+        report = validation.ValidationReport() if args.validate else None
+        parquet_context = (
+            geoparquet.GeoParquetWriter(args.geoparquet, GEOPARQUET_PROPERTIES)
+            if args.geoparquet
+            else contextlib.nullcontext()
+        )
+        with parquet_context as parquet_writer:
+
+            def create_items(keys: Iterable[str]) -> Iterator[dict]:
+                stac_items = create_stac_items(keys, s3_url)
+                if report:
+                    stac_items = validation.validate_stac_items(stac_items, report, args.processes)
+                if parquet_writer:
+                    stac_items = parquet_writer.write_items(stac_items)
+                return stac_items
+
+            if args.sync:
+                pgstac.sync_stac_items(
+                    COLLECTION_ID,
+                    s3_keys,
+                    create_items,
+                    args.delete_stale,
+                    args.load or 'insert',
+                    args.batch_size,
+                )
+            elif args.shards:
+                shards.write_shards(
+                    s3_keys,
+                    args.output_file,
+                    args.shards,
+                    shards.get_shard_function(args.partition_by, args.shards, tile_latitude),
+                    functools.partial(write_shard, s3_url=s3_url),
+                    args.processes,
+                )
+                if report:
+                    shard_files = [shards.shard_path(args.output_file, shard) for shard in range(args.shards)]
+                    validation.validate_ndjson(shard_files, report, args.processes)
+            elif asf_stac_util.uses_checkpoint(args):
+                checkpoint.write_stac_items(s3_keys, create_items, args.output_file, args.resume)
+            else:
+                asf_stac_util.output_stac_items(create_items(s3_keys), args.output_file, args.load, args.batch_size)
+
+        if report:
+            validation.print_report(report, args.validation_report)
+            if report.invalid_items:
+                sys.exit(f'{report.invalid_items} of {report.items_validated} STAC items are invalid')
 
 
 if __name__ == '__main__':
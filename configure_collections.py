@@ -0,0 +1,165 @@
+"""Configure the queryables and partitioning of each collection in pgstac, based on its collection JSON file.
+
+Each key in a collection's summaries is registered as a queryable for that collection, which makes pgstac create a
+BTREE index on that property in each of the collection's partitions. A collection whose temporal extent is closed is a
+static dataset, so it is kept in a single partition; a collection whose temporal extent is open-ended is partitioned by
+year as it grows.
+
+The database connection is configured by the PGHOST, PGPORT, PGDATABASE, PGUSER, and PGPASSWORD environment variables.
+"""
+
+import argparse
+import json
+import statistics
+import time
+from pathlib import Path
+from typing import Optional
+
+
+# Representative searches from benchmarks/search_api_load.py, for comparing timings before and after configuring
+BENCHMARK_SEARCHES = {
+    'season and polarization': {
+        'collections': ['sentinel-1-global-coherence'],
+        'query': {'season': {'eq': 'fall'}, 'sar:polarizations': {'eq': ['VV']}},
+        'limit': 100,
+    },
+    'product type': {
+        'collections': ['sentinel-1-global-coherence'],
+        'query': {'sar:product_type': {'eq': 'COH12'}},
+        'limit': 100,
+    },
+    'tile': {
+        'collections': ['sentinel-1-global-coherence'],
+        'query': {'tile': {'eq': 'N01E005'}},
+        'limit': 100,
+    },
+    'bbox': {
+        'collections': ['sentinel-1-global-coherence', 'glo-30-hand'],
+        'bbox': [5.2, 0.2, 5.8, 0.8],
+        'limit': 100,
+    },
+}
+
+WRAPPERS = {'string': 'to_text', 'number': 'to_float', 'integer': 'to_int', 'array': 'to_text_array'}
+
+
+def queryable_definition(summary) -> dict:
+    """Return the JSON Schema of a property from its summary in a collection.
+
+    A summary is either a list of the property's values, a range with a minimum and maximum, or a JSON Schema.
+    """
+    if isinstance(summary, list):
+        if all(isinstance(value, list) for value in summary):
+            values = sorted({value for values in summary for value in values})
+            return {'type': 'array', 'items': {'type': 'string', 'enum': values}}
+        return {'type': 'string', 'enum': sorted(summary)}
+    if 'minimum' in summary and 'maximum' in summary and 'type' not in summary:
+        return {'type': 'number', **summary}
+    return summary
+
+
+def get_queryables(collection: dict) -> list[dict]:
+    queryables = []
+    for name, summary in collection.get('summaries', {}).items():
+        definition = queryable_definition(summary)
+        queryables.append(
+            {
+                'name': name,
+                'definition': definition,
+                'property_wrapper': WRAPPERS.get(definition.get('type'), 'to_text'),
+            }
+        )
+    return queryables
+
+
+def get_partition_trunc(collection: dict) -> Optional[str]:
+    intervals = collection['extent']['temporal']['interval']
+    if any(end is None for _, end in intervals):
+        return 'year'
+    return None
+
+
+def configure_collection(db, collection: dict) -> None:
+    """Register the collection's queryables and set its partitioning, if the collection is already in the database."""
+    connection = db.connect()
+    with connection.transaction():
+        for queryable in get_queryables(collection):
+            connection.execute(
+                'DELETE FROM queryables WHERE name = %s AND collection_ids = %s',
+                [queryable['name'], [collection['id']]],
+            )
+            connection.execute(
+                'INSERT INTO queryables (name, collection_ids, definition, property_wrapper, property_index_type) '
+                "VALUES (%s, %s, %s::jsonb, %s, 'BTREE')",
+                [
+                    queryable['name'],
+                    [collection['id']],
+                    json.dumps(queryable['definition']),
+                    queryable['property_wrapper'],
+                ],
+            )
+            print(f'{collection["id"]}: registered queryable {queryable["name"]} ({queryable["property_wrapper"]})')
+
+    partition_trunc = get_partition_trunc(collection)
+    updated = connection.execute(
+        'UPDATE collections SET partition_trunc = %s WHERE id = %s AND partition_trunc IS DISTINCT FROM %s',
+        [partition_trunc, collection['id'], partition_trunc],
+    ).rowcount
+    if updated:
+        print(f'{collection["id"]}: repartitioned by {partition_trunc or "collection only"}')
+
+
+def time_searches(db, runs: int) -> dict[str, float]:
+    """Return the median time in seconds of each benchmark search, after one warm-up run."""
+    connection = db.connect()
+    timings = {}
+    for name, search in BENCHMARK_SEARCHES.items():
+        durations = []
+        for _ in range(runs + 1):
+            start = time.perf_counter()
+            connection.execute('SELECT search(%s::jsonb)', [json.dumps(search)]).fetchone()
+            durations.append(time.perf_counter() - start)
+        timings[name] = statistics.median(durations[1:])
+    return timings
+
+
+def explain_search(db, search: dict) -> str:
+    connection = db.connect()
+    where = connection.execute('SELECT stac_search_to_where(%s::jsonb)', [json.dumps(search)]).fetchone()[0]
+    plan = connection.execute(f'EXPLAIN ANALYZE SELECT id FROM items WHERE {where} LIMIT {search["limit"]}')
+    return '\n'.join(row[0] for row in plan)
+
+
+def print_timings(before: dict[str, float], after: dict[str, float]) -> None:
+    print(f'{"search":<28}{"before ms":>12}{"after ms":>12}{"speedup":>10}')
+    for name in BENCHMARK_SEARCHES:
+        print(f'{name:<28}{before[name] * 1000:>12.1f}{after[name] * 1000:>12.1f}{before[name] / after[name]:>9.1f}x')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('collections', type=Path, nargs='+', help='Paths to the collection JSON files')
+    parser.add_argument(
+        '--report', action='store_true', help='Time the benchmark searches before and after configuring the collections'
+    )
+    parser.add_argument('--runs', type=int, default=5, help='Number of times to run each benchmark search (default: 5)')
+    parser.add_argument('--explain', action='store_true', help='Print the query plan of each benchmark search')
+    args = parser.parse_args()
+
+    from pypgstac.db import PgstacDB
+
+    with PgstacDB() as db:
+        before = time_searches(db, args.runs) if args.report else None
+
+        for path in args.collections:
+            configure_collection(db, json.loads(path.read_text()))
+
+        if args.report:
+            print_timings(before, time_searches(db, args.runs))
+        if args.explain:
+            for name, search in BENCHMARK_SEARCHES.items():
+                print(f'\n{name}:\n{explain_search(db, search)}')
+
+
+if __name__ == '__main__':
+    main()
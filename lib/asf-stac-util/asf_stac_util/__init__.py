@@ -1,12 +1,211 @@
+import argparse
+import functools
 import json
+import queue
+import sys
+import threading
+import time
+from collections.abc import Iterable, Iterator
 from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional, TextIO, TypeVar
+
+
+T = TypeVar('T')
+
+
+class DateTimeEncoder(json.JSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, datetime) and obj.tzinfo == timezone.utc:
+            return format_datetime(obj)
+        return json.JSONEncoder.default(self, obj)
+
+
+# Items share a handful of datetime values, so formatting each one once saves most of the cost of encoding them
+@functools.lru_cache(maxsize=1024)
+def format_datetime(obj: datetime) -> str:
+    """Format a UTC datetime as in STAC items, e.g. 2020-01-01T00:00:00Z."""
+    return obj.isoformat().removesuffix('+00:00') + 'Z'
+
+
+_ENCODER = DateTimeEncoder()
 
 
 def jsonify_stac_item(stac_item: dict) -> str:
-    class DateTimeEncoder(json.JSONEncoder):
-        def default(self, obj):
-            if isinstance(obj, datetime) and obj.tzinfo == timezone.utc:
-                return obj.isoformat().removesuffix('+00:00') + 'Z'
-            return json.JSONEncoder.default(self, obj)
+    return _ENCODER.encode(stac_item)
+
+
+def dump_stac_items(stac_items: Iterable[dict], f: TextIO, chunk_size: int = 1000) -> int:
+    """Write STAC items to a file handle, one per line, in chunks of chunk_size items. Returns the item count."""
+    from asf_stac_util.profiling import profiler
+
+    count = 0
+    lines = []
+    for stac_item in stac_items:
+        with profiler.stage('jsonify'):
+            lines.append(_ENCODER.encode(stac_item))
+        if len(lines) == chunk_size:
+            with profiler.stage('write'):
+                f.write('\n'.join(lines) + '\n')
+            count += len(lines)
+            lines.clear()
+    if lines:
+        with profiler.stage('write'):
+            f.write('\n'.join(lines) + '\n')
+        count += len(lines)
+    profiler.count('items_written', count)
+    return count
+
+
+def read_s3_keys(source: str, suffix: str = '') -> Iterator[str]:
+    """Lazily yield the S3 keys ending with suffix from a source.
+
+    The source is either a path to a text file with one key per line, '-' for stdin,
+    or an s3://bucket/prefix URL to list the keys under. Lines may have further tab-separated fields after the key,
+    such as the size and ETag written by asf_stac_util.s3.
+    """
+    if source.startswith('s3://'):
+        from asf_stac_util import s3
+
+        bucket, _, prefix = source.removeprefix('s3://').partition('/')
+        yield from (obj.key for obj in s3.list_objects(bucket, prefix) if obj.key.endswith(suffix))
+    elif source == '-':
+        yield from _filter_lines(sys.stdin, suffix)
+    else:
+        with Path(source).open() as f:
+            yield from _filter_lines(f, suffix)
+
+
+def _filter_lines(lines: Iterable[str], suffix: str) -> Iterator[str]:
+    for line in lines:
+        key = line.rstrip('\n').split('\t', 1)[0]
+        if key and key.endswith(suffix):
+            yield key
+
+
+def with_progress(iterable: Iterable[T], description: str, interval: float = 1.0) -> Iterator[T]:
+    """Yield from iterable, printing the count and rate to stderr at most once every interval seconds."""
+    start_time = last_print_time = time.monotonic()
+    count = 0
+    for count, obj in enumerate(iterable, start=1):
+        yield obj
+        now = time.monotonic()
+        if now - last_print_time >= interval:
+            print(f'{description}: {count} ({count / (now - start_time):.1f}/s)', end='\r', file=sys.stderr)
+            last_print_time = now
+    elapsed = time.monotonic() - start_time
+    print(f'{description}: {count} ({count / elapsed if elapsed else 0:.1f}/s)', file=sys.stderr)
+
+
+def write_ndjson(stac_items: Iterable[dict], output_file: Path) -> int:
+    """Write STAC items to output_file, one per line, or to stdout if output_file is '-'. Returns the item count."""
+    if str(output_file) == '-':
+        return dump_stac_items(stac_items, sys.stdout)
+    with output_file.open('w', buffering=1024 * 1024) as f:
+        return dump_stac_items(stac_items, f)
+
+
+def prefetch(iterable: Iterable[T], maxsize: int) -> Iterator[T]:
+    """Yield from iterable, which is consumed by a background thread up to maxsize objects ahead."""
+    done = object()
+    buffer: queue.Queue = queue.Queue(maxsize)
+
+    def produce() -> None:
+        try:
+            for obj in iterable:
+                buffer.put(obj)
+        except BaseException as e:
+            buffer.put(e)
+        buffer.put(done)
+
+    threading.Thread(target=produce, daemon=True).start()
+    while (obj := buffer.get()) is not done:
+        if isinstance(obj, BaseException):
+            raise obj
+        yield obj
+
+
+def add_output_arguments(parser: argparse.ArgumentParser, default_output_file: str) -> None:
+    from asf_stac_util import pgstac, shards
+
+    parser.add_argument(
+        '-o',
+        '--output-file',
+        type=Path,
+        help='Path for the output file, or "-" to write to stdout',
+        default=default_output_file,
+    )
+    parser.add_argument(
+        '--load',
+        choices=pgstac.LOAD_METHODS,
+        help='Load the items directly into pgstac using the given method, rather than writing them to the output file. '
+        'The database connection is configured by the PGHOST, PGPORT, PGDATABASE, PGUSER, '
+        'and PGPASSWORD environment variables.',
+    )
+    parser.add_argument(
+        '--batch-size', type=int, help='Number of items to load into pgstac per batch when using --load', default=10000
+    )
+    parser.add_argument(
+        '--shards',
+        type=int,
+        help='Write the items to this many output files using a pool of processes, along with a manifest file '
+        'listing the item count and checksum of each file. Cannot be used with --load or --output-file -.',
+    )
+    parser.add_argument(
+        '--partition-by',
+        choices=shards.PARTITION_METHODS,
+        help='How to assign items to output files when using --shards',
+        default='hash',
+    )
+    parser.add_argument(
+        '--processes',
+        type=int,
+        help='Number of processes to use with --shards or --validate (defaults to the number of CPUs)',
+    )
+    parser.add_argument(
+        '--sync',
+        action='store_true',
+        help='Only create and load the items that are not in pgstac yet, using the --load method (default insert)',
+    )
+    parser.add_argument(
+        '--delete-stale',
+        action='store_true',
+        help='When using --sync, also delete the items in pgstac whose S3 objects no longer exist',
+    )
+    parser.add_argument(
+        '--geoparquet',
+        type=Path,
+        help='Also write the items to this GeoParquet file, with flattened columns, for bulk access to the collection. '
+        'Cannot be used with --sync, --shards, or --resume, which do not create every item in one run.',
+    )
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='Resume an interrupted run from the checkpoint saved next to the output file, appending to the output file',
+    )
+
+
+def check_output_arguments(parser: argparse.ArgumentParser, args: argparse.Namespace) -> None:
+    """Exit with a usage error for combinations of the output arguments that cannot be used together."""
+    if args.shards and (args.load or str(args.output_file) == '-'):
+        parser.error('--shards cannot be used with --load or --output-file -')
+    if args.geoparquet and (args.sync or args.shards or args.resume):
+        parser.error('--geoparquet cannot be used with --sync, --shards, or --resume')
+
+
+def uses_checkpoint(args: argparse.Namespace) -> bool:
+    """Return whether the items are written to an output file, with checkpoints so that the run can be resumed."""
+    return not (args.load or args.sync or args.shards or str(args.output_file) == '-')
+
+
+def output_stac_items(
+    stac_items: Iterable[dict], output_file: Path, load_method: Optional[str] = None, batch_size: int = 10000
+) -> None:
+    """Write STAC items to output_file or, if load_method is given, load them into pgstac, reporting progress."""
+    stac_items = with_progress(stac_items, 'Creating STAC items')
+    if load_method:
+        from asf_stac_util import pgstac
 
-    return json.dumps(stac_item, cls=DateTimeEncoder)
+        pgstac.load_stac_items(stac_items, load_method, batch_size)
+    else:
+        write_ndjson(stac_items, output_file)
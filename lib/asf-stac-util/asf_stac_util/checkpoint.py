@@ -0,0 +1,133 @@
+"""Write STAC items to an output file with periodic checkpoints, so that an interrupted run can resume where it stopped.
+
+Every `interval` items, the output file is flushed and a checkpoint file next to it records how many S3 keys have been
+processed, the size of the output file, and the keys that failed. Items are created in the same order as their S3 keys,
+and each item ID is the file name of its S3 key, so the keys without an item are the ones that failed. With resume,
+the output file is truncated to the size in the checkpoint, which drops any items written after it, and the run
+continues from the next key, appending to the output file. The failed keys are written to a retry list, which can be
+passed back to the item creation script as its list of S3 objects.
+"""
+
+import json
+import os
+import sys
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import asdict, dataclass, field
+from pathlib import Path, PurePath
+from typing import Optional
+
+import asf_stac_util
+
+
+CHECKPOINT_INTERVAL = 1000
+
+
+def checkpoint_path(output_file: Path) -> Path:
+    return output_file.with_name(f'{output_file.name}.checkpoint.json')
+
+
+def retry_list_path(output_file: Path) -> Path:
+    return output_file.with_name(f'{output_file.stem}.failed.txt')
+
+
+@dataclass
+class Checkpoint:
+    keys_done: int = 0
+    last_key: Optional[str] = None
+    output_size: int = 0
+    items_written: int = 0
+    failed_keys: list[str] = field(default_factory=list)
+
+    @classmethod
+    def load(cls, path: Path) -> 'Checkpoint':
+        return cls(**json.loads(path.read_text()))
+
+    def save(self, path: Path) -> None:
+        """Replace the checkpoint file atomically, so that an interruption never leaves a partial checkpoint."""
+        temp_path = path.with_name(f'{path.name}.tmp')
+        temp_path.write_text(json.dumps(asdict(self)))
+        temp_path.replace(path)
+
+
+def skip_done_keys(s3_keys: Iterable[str], checkpoint: Checkpoint) -> Iterator[str]:
+    """Skip the keys processed before the checkpoint, checking that the list of keys has not changed since."""
+    s3_keys = iter(s3_keys)
+    skipped = 0
+    last_key = None
+    for skipped, last_key in zip(range(1, checkpoint.keys_done + 1), s3_keys):
+        pass
+    if skipped != checkpoint.keys_done or last_key != checkpoint.last_key:
+        raise ValueError(
+            f'Key number {checkpoint.keys_done} is {last_key}, but was {checkpoint.last_key} in the checkpoint; '
+            'the list of S3 objects has changed since the interrupted run'
+        )
+    yield from s3_keys
+
+
+def write_stac_items(
+    s3_keys: Iterable[str],
+    create_stac_items: Callable[[Iterable[str]], Iterable[dict]],
+    output_file: Path,
+    resume: bool = False,
+    interval: int = CHECKPOINT_INTERVAL,
+) -> list[str]:
+    """Create the items for s3_keys and write them to output_file, saving a checkpoint every interval items.
+
+    create_stac_items must yield the items in the same order as the keys, skipping keys that fail. Returns the failed
+    keys, including those from before the checkpoint when resuming, which are also written to the retry list.
+    """
+    path = checkpoint_path(output_file)
+    if resume:
+        checkpoint = Checkpoint.load(path)
+        if output_file.stat().st_size < checkpoint.output_size:
+            raise ValueError(f'{output_file} is smaller than when {path} was saved')
+        os.truncate(output_file, checkpoint.output_size)
+        s3_keys = skip_done_keys(s3_keys, checkpoint)
+        print(f'Resuming after {checkpoint.keys_done} S3 keys and {checkpoint.items_written} items', file=sys.stderr)
+    else:
+        checkpoint = Checkpoint()
+
+    pending_keys: deque[str] = deque()
+
+    def track(keys: Iterable[str]) -> Iterator[str]:
+        for key in keys:
+            pending_keys.append(key)
+            yield key
+
+    def complete_key(failed: bool) -> None:
+        key = pending_keys.popleft()
+        if failed:
+            checkpoint.failed_keys.append(key)
+        checkpoint.keys_done += 1
+        checkpoint.last_key = key
+
+    def save(f, batch: list[dict]) -> None:
+        checkpoint.items_written += asf_stac_util.dump_stac_items(batch, f)
+        f.flush()
+        checkpoint.output_size = f.tell()
+        checkpoint.save(path)
+
+    batch: list[dict] = []
+    with output_file.open('a' if resume else 'w') as f:
+        stac_items = asf_stac_util.with_progress(create_stac_items(track(s3_keys)), 'Creating STAC items')
+        for stac_item in stac_items:
+            while pending_keys and PurePath(pending_keys[0]).stem != stac_item['id']:
+                complete_key(failed=True)
+            if not pending_keys:
+                raise ValueError(f'Item {stac_item["id"]} does not match any of the S3 keys passed to create it')
+            complete_key(failed=False)
+            batch.append(stac_item)
+            if len(batch) == interval:
+                save(f, batch)
+                batch = []
+        while pending_keys:
+            complete_key(failed=True)
+        save(f, batch)
+
+    retry_list = retry_list_path(output_file)
+    if checkpoint.failed_keys:
+        retry_list.write_text(''.join(f'{key}\n' for key in checkpoint.failed_keys))
+    elif retry_list.exists():
+        retry_list.unlink()
+    return checkpoint.failed_keys
@@ -0,0 +1,88 @@
+"""Build a collection's extents and summaries from its items, rather than copying them from its static JSON file.
+
+The collection JSON file is a template: its spatial and temporal extents are replaced with the tightest ones that cover
+the items, and each of its summaries that lists the property's values, or gives its minimum and maximum, is replaced
+with the values or range of the items. Summaries given as a JSON Schema (e.g. the pattern of tile names) are kept
+unchanged. The items are read in a single pass, and only the running extents and the distinct summary values are kept in
+memory, so the items can be passed on to be loaded at the same time.
+"""
+
+import copy
+from collections.abc import Iterable, Iterator
+from datetime import datetime
+from typing import Optional
+
+import asf_stac_util
+
+
+def _parse_datetime(value) -> Optional[datetime]:
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def _hashable(value):
+    return tuple(value) if isinstance(value, list) else value
+
+
+class CollectionBuilder:
+    """Accumulate the extents and summaries of the collection described by a template collection from its items."""
+
+    def __init__(self, collection: dict):
+        self.template = collection
+        self.item_count = 0
+        self.bbox = [float('inf'), float('inf'), float('-inf'), float('-inf')]
+        self.start: Optional[datetime] = None
+        self.end: Optional[datetime] = None
+        self.values: dict[str, set] = {}
+        self.ranges: dict[str, list] = {}
+        for name, summary in collection.get('summaries', {}).items():
+            if isinstance(summary, list):
+                self.values[name] = set()
+            elif 'minimum' in summary and 'maximum' in summary and 'type' not in summary:
+                self.ranges[name] = [None, None]
+
+    def add(self, stac_item: dict) -> None:
+        self.item_count += 1
+        xmin, ymin, xmax, ymax = stac_item['bbox']
+        self.bbox = [min(self.bbox[0], xmin), min(self.bbox[1], ymin), max(self.bbox[2], xmax), max(self.bbox[3], ymax)]
+
+        properties = stac_item['properties']
+        start = _parse_datetime(properties.get('start_datetime') or properties.get('datetime'))
+        end = _parse_datetime(properties.get('end_datetime') or properties.get('datetime'))
+        self.start = start if self.start is None else min(self.start, start)
+        self.end = end if self.end is None else max(self.end, end)
+
+        for name, values in self.values.items():
+            if properties.get(name) is not None:
+                values.add(_hashable(properties[name]))
+        for name, value_range in self.ranges.items():
+            value = properties.get(name)
+            if value is not None:
+                value_range[0] = value if value_range[0] is None else min(value_range[0], value)
+                value_range[1] = value if value_range[1] is None else max(value_range[1], value)
+
+    def add_items(self, stac_items: Iterable[dict]) -> Iterator[dict]:
+        """Yield stac_items unchanged, adding each one, so that the items can also be loaded or written elsewhere."""
+        for stac_item in stac_items:
+            self.add(stac_item)
+            yield stac_item
+
+    def build(self) -> dict:
+        """Return a copy of the template collection with the extents and summaries of the items added so far."""
+        if not self.item_count:
+            raise ValueError(f'Collection {self.template["id"]} has no items')
+        collection = copy.deepcopy(self.template)
+        collection['extent'] = {
+            'spatial': {'bbox': [self.bbox]},
+            'temporal': {
+                'interval': [[asf_stac_util.format_datetime(self.start), asf_stac_util.format_datetime(self.end)]]
+            },
+        }
+        for name, values in self.values.items():
+            collection['summaries'][name] = [
+                list(value) if isinstance(value, tuple) else value for value in sorted(values)
+            ]
+        for name, (minimum, maximum) in self.ranges.items():
+            collection['summaries'][name] = {**collection['summaries'][name], 'minimum': minimum, 'maximum': maximum}
+        return collection
@@ -0,0 +1,142 @@
+"""Write STAC items to a GeoParquet file, for bulk access to a whole collection without paginating through the API.
+
+Each item is a row, with flattened columns rather than the nested STAC structure: the ID, collection, datetimes, the
+href of the data asset, one column per configured property (e.g. tile or sar:polarizations), the geometry as WKB, and a
+bbox struct column declared as the geometry's bbox covering (GeoParquet 1.1), so that readers can skip row groups
+outside an area of interest. Properties that are not configured are not written.
+
+Rows are buffered and written in row groups of row_group_size items, compressed with zstd, so memory use is bounded by
+the row group size rather than the collection size. Requires pyarrow and shapely.
+"""
+
+import json
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+
+
+DEFAULT_ROW_GROUP_SIZE = 65536
+
+GEOPARQUET_VERSION = '1.1.0'
+
+DATETIME_PROPERTIES = ['datetime', 'start_datetime', 'end_datetime']
+
+
+def get_type(type_name: str):
+    """Return the pyarrow type for the name of a property column type, e.g. "string" or "list<string>"."""
+    import pyarrow as pa
+
+    types = {
+        'string': pa.string(),
+        'list<string>': pa.list_(pa.string()),
+        'int64': pa.int64(),
+        'float64': pa.float64(),
+        'timestamp': pa.timestamp('us', tz='UTC'),
+    }
+    return types[type_name]
+
+
+def geo_metadata(geometry_types: Iterable[str] = ()) -> dict:
+    bbox_covering = {key: ['bbox', key] for key in ['xmin', 'ymin', 'xmax', 'ymax']}
+    return {
+        'version': GEOPARQUET_VERSION,
+        'primary_column': 'geometry',
+        'columns': {
+            'geometry': {
+                'encoding': 'WKB',
+                'geometry_types': list(geometry_types),
+                'covering': {'bbox': bbox_covering},
+            },
+        },
+    }
+
+
+class GeoParquetWriter:
+    """Write STAC items to a GeoParquet file in row groups, with a column for each of properties.
+
+    properties maps the name of each property to write to its type (see get_type).
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        properties: dict[str, str],
+        geometry_types: Iterable[str] = (),
+        row_group_size: int = DEFAULT_ROW_GROUP_SIZE,
+    ):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.properties = [name for name in properties if name not in DATETIME_PROPERTIES]
+        self.row_group_size = row_group_size
+        bbox_type = pa.struct([(key, pa.float64()) for key in ['xmin', 'ymin', 'xmax', 'ymax']])
+        self.schema = pa.schema(
+            [
+                ('id', pa.string()),
+                ('collection', pa.string()),
+                *[(name, get_type('timestamp')) for name in DATETIME_PROPERTIES],
+                ('data_href', pa.string()),
+                *[(name, get_type(properties[name])) for name in self.properties],
+                ('geometry', pa.binary()),
+                ('bbox', bbox_type),
+            ],
+            metadata={b'geo': json.dumps(geo_metadata(geometry_types)).encode()},
+        )
+        self.rows = 0
+        self._writer = pq.ParquetWriter(path, self.schema, compression='zstd')
+        self._columns: dict[str, list] = {name: [] for name in self.schema.names}
+        self._geometries: list[dict] = []
+        self._last_coordinates = None
+        self._last_wkb = b''
+
+    def __enter__(self) -> 'GeoParquetWriter':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def write(self, stac_item: dict) -> None:
+        properties = stac_item['properties']
+        columns = self._columns
+        columns['id'].append(stac_item['id'])
+        columns['collection'].append(stac_item.get('collection'))
+        for name in DATETIME_PROPERTIES:
+            columns[name].append(properties.get(name))
+        columns['data_href'].append(stac_item['assets']['data']['href'])
+        for name in self.properties:
+            columns[name].append(properties.get(name))
+        xmin, ymin, xmax, ymax = stac_item['bbox']
+        columns['bbox'].append({'xmin': xmin, 'ymin': ymin, 'xmax': xmax, 'ymax': ymax})
+        self._geometries.append(stac_item['geometry'])
+        self.rows += 1
+        if len(self._geometries) == self.row_group_size:
+            self.flush()
+
+    def write_items(self, stac_items: Iterable[dict]) -> Iterator[dict]:
+        """Yield stac_items unchanged, writing each one to the file, so that the items can also be written elsewhere."""
+        for stac_item in stac_items:
+            self.write(stac_item)
+            yield stac_item
+
+    def flush(self) -> None:
+        """Write the buffered items as a row group."""
+        import pyarrow as pa
+
+        if not self._geometries:
+            return
+        self._columns['geometry'] = [self._to_wkb(geometry) for geometry in self._geometries]
+        self._writer.write_table(pa.Table.from_pydict(self._columns, schema=self.schema))
+        self._columns = {name: [] for name in self.schema.names}
+        self._geometries = []
+
+    def _to_wkb(self, geometry: dict) -> bytes:
+        # Consecutive items often share a geometry, e.g. the coherence items of a tile, so reuse the last WKB
+        if geometry['coordinates'] is not self._last_coordinates:
+            from shapely import geometry as shapely_geometry
+
+            self._last_coordinates = geometry['coordinates']
+            self._last_wkb = shapely_geometry.shape(geometry).wkb
+        return self._last_wkb
+
+    def close(self) -> None:
+        self.flush()
+        self._writer.close()
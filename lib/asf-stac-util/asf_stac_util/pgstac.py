@@ -0,0 +1,245 @@
+"""Helpers for loading STAC items into a pgstac database.
+
+These require pypgstac, which is imported when first needed so that the rest of asf_stac_util does not depend on it.
+The database connection is configured from the standard libpq environment variables (PGHOST, PGUSER, etc.).
+
+After loading or deleting items, the helpers mark the affected collections as updated, which the API checks to clear its
+response cache (see apps/api/src/api.py). Run `python -m asf_stac_util.pgstac` to do the same after loading items by
+other means, e.g. `pypgstac load`.
+"""
+
+import argparse
+import json
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path, PurePath
+from typing import Optional
+
+import asf_stac_util
+from asf_stac_util import shards
+from asf_stac_util.profiling import profiler
+
+
+LOAD_METHODS = ['insert', 'upsert', 'ignore']
+
+# Create the partitions of the live collection that the staging collection's items will be copied into, grouped the same
+# way as pgstac's repartition function groups them
+CHECK_PARTITIONS_SQL = """
+SELECT check_partition(
+    %(collection_id)s,
+    tstzrange(min(datetime), max(datetime), '[]'),
+    tstzrange(min(end_datetime), max(end_datetime), '[]')
+)
+FROM items
+WHERE collection = %(staging_id)s
+GROUP BY CASE WHEN %(partition_trunc)s::text IS NULL THEN '-infinity'::timestamptz
+    ELSE date_trunc(%(partition_trunc)s::text, datetime) END
+"""
+
+COPY_STAGING_ITEMS_SQL = """
+INSERT INTO items (id, geometry, collection, datetime, end_datetime, content, private)
+SELECT id, geometry, %(collection_id)s, datetime, end_datetime, content, private
+FROM items
+WHERE collection = %(staging_id)s
+"""
+
+# Updating a collection's row changes its xmin, which is the version the API checks to clear its response cache
+MARK_UPDATED_SQL = """
+UPDATE collections SET private = coalesce(private, '{}'::jsonb) || jsonb_build_object('items_updated', now())
+"""
+
+
+def mark_collections_updated(db, collection_ids: Optional[Iterable[str]] = None) -> None:
+    """Record that the items of the given collections, or of every collection if None, have changed."""
+    if collection_ids is None:
+        db.connect().execute(MARK_UPDATED_SQL)
+    else:
+        db.connect().execute(MARK_UPDATED_SQL + 'WHERE id = ANY(%s)', [sorted(collection_ids)])
+
+
+def load_stac_items(stac_items: Iterable[dict], method: str = 'upsert', batch_size: int = 10000) -> None:
+    """Load STAC items into pgstac in batches of batch_size items.
+
+    Items are created in a background thread while the previous batch is written to the database.
+    """
+    from pypgstac.db import PgstacDB
+    from pypgstac.load import Loader, Methods
+
+    collection_ids: set[str] = set()
+    lines = _jsonify_stac_items(stac_items, collection_ids)
+    with PgstacDB() as db:
+        loader = Loader(db=db)
+        loader.load_items(asf_stac_util.prefetch(lines, batch_size), insert_mode=Methods(method), chunksize=batch_size)
+        mark_collections_updated(db, collection_ids)
+
+
+def _jsonify_stac_items(stac_items: Iterable[dict], collection_ids: set[str]) -> Iterator[str]:
+    for stac_item in stac_items:
+        collection_ids.add(stac_item['collection'])
+        with profiler.stage('jsonify'):
+            line = asf_stac_util.jsonify_stac_item(stac_item)
+        profiler.count('items_loaded')
+        yield line
+
+
+def load_ndjson(path: Path, method: str = 'upsert', batch_size: int = 10000) -> None:
+    from pypgstac.db import PgstacDB
+    from pypgstac.load import Loader, Methods
+
+    with PgstacDB() as db:
+        loader = Loader(db=db)
+        loader.load_items(str(path), insert_mode=Methods(method), chunksize=batch_size)
+        # The file is read by pypgstac, so its collections are not known
+        mark_collections_updated(db)
+
+
+def load_collections(collections: Iterable[dict], method: str = 'upsert') -> None:
+    from pypgstac.db import PgstacDB
+    from pypgstac.load import Loader, Methods
+
+    with PgstacDB() as db:
+        loader = Loader(db=db)
+        loader.load_collections(iter(collections), insert_mode=Methods(method))
+
+
+def load_shards(
+    manifest: Path, method: str = 'upsert', processes: Optional[int] = None, batch_size: int = 10000
+) -> None:
+    """Verify the shards listed in a manifest, then load them concurrently, each over its own database connection."""
+    shard_files = shards.verify_manifest(manifest)
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = {
+            executor.submit(load_ndjson, shard_file, method, batch_size): shard_file for shard_file in shard_files
+        }
+        for future in as_completed(futures):
+            future.result()
+            print(f'Loaded {futures[future]}')
+
+
+@dataclass(frozen=True)
+class SyncPlan:
+    missing_keys: list[str]
+    stale_ids: list[str]
+    unchanged: int
+
+
+def plan_sync(s3_keys: Iterable[str], existing_ids: set[str]) -> SyncPlan:
+    """Compare S3 keys against the IDs of the items already in the database.
+
+    Item IDs are the stem of their S3 key, e.g. data/tiles/N00E005/N00E005_124D_inc.tif has ID N00E005_124D_inc.
+    """
+    missing_keys = []
+    seen_ids = set()
+    for s3_key in s3_keys:
+        item_id = PurePath(s3_key).stem
+        if item_id in existing_ids:
+            seen_ids.add(item_id)
+        else:
+            missing_keys.append(s3_key)
+    stale_ids = sorted(existing_ids - seen_ids)
+    return SyncPlan(missing_keys=missing_keys, stale_ids=stale_ids, unchanged=len(seen_ids))
+
+
+def get_item_ids(collection_id: str) -> set[str]:
+    from pypgstac.db import PgstacDB
+
+    with PgstacDB() as db:
+        return {row[0] for row in db.query('SELECT id FROM items WHERE collection = %s', [collection_id]) if row}
+
+
+def delete_items(collection_id: str, item_ids: list[str]) -> None:
+    from pypgstac.db import PgstacDB
+
+    with PgstacDB() as db:
+        db.connect().execute('DELETE FROM items WHERE collection = %s AND id = ANY(%s)', [collection_id, item_ids])
+        mark_collections_updated(db, [collection_id])
+
+
+def sync_stac_items(
+    collection_id: str,
+    s3_keys: Iterable[str],
+    create_stac_items: Callable[[list[str]], Iterable[dict]],
+    delete_stale: bool = False,
+    method: str = 'insert',
+    batch_size: int = 10000,
+) -> SyncPlan:
+    """Load items only for the S3 keys that are not in the collection yet, optionally deleting the items whose S3 keys
+    no longer exist, and print a summary of the changes.
+    """
+    plan = plan_sync(s3_keys, get_item_ids(collection_id))
+
+    if plan.missing_keys:
+        stac_items = asf_stac_util.with_progress(create_stac_items(plan.missing_keys), 'Creating STAC items')
+        load_stac_items(stac_items, method, batch_size)
+    if delete_stale and plan.stale_ids:
+        delete_items(collection_id, plan.stale_ids)
+
+    removed = f'{len(plan.stale_ids)} removed' if delete_stale else f'{len(plan.stale_ids)} stale (not removed)'
+    print(f'{collection_id}: {len(plan.missing_keys)} added, {removed}, {plan.unchanged} unchanged')
+    return plan
+
+
+def staging_collection_id(collection_id: str) -> str:
+    return f'{collection_id}-staging'
+
+
+def load_staging_collection(collection: dict, stac_items: Iterable[dict], batch_size: int = 10000) -> None:
+    """Load STAC items into a new staging collection, a copy of collection whose ID has a -staging suffix.
+
+    Any staging collection left over from an earlier run is deleted first. Searches of the live collection are not
+    affected until the staging collection is promoted.
+    """
+    from pypgstac.db import PgstacDB
+
+    staging_id = staging_collection_id(collection['id'])
+    with PgstacDB() as db:
+        connection = db.connect()
+        connection.execute('DELETE FROM collections WHERE id = %s', [staging_id])
+        connection.execute('SELECT create_collection(%s::jsonb)', [json.dumps({**collection, 'id': staging_id})])
+    load_stac_items(
+        (stac_item | {'collection': staging_id} for stac_item in stac_items), method='insert', batch_size=batch_size
+    )
+
+
+def promote_staging_collection(collection: dict) -> int:
+    """Replace the content and items of a collection with collection and the items of its staging collection.
+
+    The collection is created if it does not exist yet. Its items are deleted, the staging collection's items are copied
+    into it, and the staging collection is deleted, all in a single transaction, so searches see either the old items or
+    the new ones, never a mix of both or none. The old rows remain visible to searches until the transaction commits.
+    Returns the number of items promoted.
+    """
+    from pypgstac.db import PgstacDB
+
+    params = {'collection_id': collection['id'], 'staging_id': staging_collection_id(collection['id'])}
+    with PgstacDB() as db:
+        connection = db.connect()
+        with connection.transaction():
+            connection.execute('SELECT upsert_collection(%s::jsonb)', [json.dumps(collection)])
+            params['partition_trunc'] = connection.execute(
+                'SELECT partition_trunc FROM collections WHERE id = %(collection_id)s', params
+            ).fetchone()[0]
+            connection.execute(CHECK_PARTITIONS_SQL, params)
+            connection.execute('DELETE FROM items WHERE collection = %(collection_id)s', params)
+            count = connection.execute(COPY_STAGING_ITEMS_SQL, params).rowcount
+            connection.execute('SELECT delete_collection(%(staging_id)s)', params)
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Mark collections as updated after loading their items with pypgstac, so that the API clears its '
+        'response cache'
+    )
+    parser.add_argument('collection_ids', nargs='*', help='IDs of the collections (defaults to every collection)')
+    args = parser.parse_args()
+
+    from pypgstac.db import PgstacDB
+
+    with PgstacDB() as db:
+        mark_collections_updated(db, args.collection_ids or None)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+"""Timings and counters for the stages of creating STAC items, for finding out where the time goes in a slow run.
+
+Code on the hot path wraps each stage in `with profiler.stage('name'):` and counts events with `profiler.count('name')`.
+Counting is always on, as it costs no more than a dict update under a lock. Stage timings are only recorded when
+enabled, since they cost a pair of clock reads per stage; while disabled, stage() returns a shared no-op context manager.
+Stages may be nested, e.g. the geometry stage is part of the create_stac_item stage.
+
+Stages run by worker processes (e.g. with --shards) are not recorded.
+"""
+
+import argparse
+import cProfile
+import contextlib
+import json
+import statistics
+import sys
+import threading
+import time
+from array import array
+from collections import defaultdict
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Optional
+
+
+PROFILE_MODES = ['counters', 'timings']
+
+_NULL_STAGE = contextlib.nullcontext()
+
+
+class _Stage:
+    """A reusable context manager that records the duration of each use, which may be nested or in several threads."""
+
+    def __init__(self, profiler: 'Profiler', name: str, frame: int):
+        self.profiler = profiler
+        self.name = name
+        self.frame = frame
+        self.durations = array('d')
+        self.local = threading.local()
+
+    def __enter__(self):
+        start = time.perf_counter()
+        if not hasattr(self.local, 'starts'):
+            self.local.starts = []
+        self.local.starts.append(start)
+        if self.profiler.events is not None:
+            self.profiler.record_event('O', self.frame, start)
+
+    def __exit__(self, *exc_info):
+        end = time.perf_counter()
+        self.durations.append(end - self.local.starts.pop())
+        if self.profiler.events is not None:
+            self.profiler.record_event('C', self.frame, end)
+
+
+class Profiler:
+    def __init__(self):
+        self.enabled = False
+        self.counters: dict[str, int] = defaultdict(int)
+        self.stages: dict[str, _Stage] = {}
+        self.events: Optional[dict[int, list[tuple[str, int, float]]]] = None
+        self.lock = threading.Lock()
+
+    def enable(self, record_events: bool = False) -> None:
+        """Start recording stage timings and, if record_events, the start and end of every stage for speedscope."""
+        self.enabled = True
+        if record_events:
+            self.events = defaultdict(list)
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self.lock:
+            self.counters[name] += n
+
+    def stage(self, name: str):
+        if not self.enabled:
+            return _NULL_STAGE
+        stage = self.stages.get(name)
+        if stage is None:
+            with self.lock:
+                stage = self.stages.setdefault(name, _Stage(self, name, len(self.stages)))
+        return stage
+
+    def record_event(self, event_type: str, frame: int, at: float) -> None:
+        self.events[threading.get_ident()].append((event_type, frame, at))
+
+    def summary(self) -> str:
+        lines = []
+        if self.stages:
+            lines.append(f'{"stage":<20}{"count":>10}{"total s":>10}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}')
+            for name, stage in sorted(self.stages.items(), key=lambda item: -sum(item[1].durations)):
+                durations = stage.durations
+                quantiles = (
+                    statistics.quantiles(durations, n=100, method='inclusive')
+                    if len(durations) >= 2
+                    else [durations[0] if durations else 0] * 99
+                )
+                lines.append(
+                    f'{name:<20}{len(durations):>10}{sum(durations):>10.2f}'
+                    f'{quantiles[49] * 1000:>10.3f}{quantiles[94] * 1000:>10.3f}{quantiles[98] * 1000:>10.3f}'
+                )
+        if self.counters:
+            lines.append('  '.join(f'{name}={value}' for name, value in sorted(self.counters.items())))
+        return '\n'.join(lines)
+
+    def speedscope(self, name: str) -> dict:
+        """Return the recorded stage events in the speedscope file format, with a profile per thread."""
+        frames = sorted(self.stages.values(), key=lambda stage: stage.frame)
+        profiles = []
+        for thread, events in sorted(self.events.items()):
+            if not events:
+                continue
+            profiles.append(
+                {
+                    'type': 'evented',
+                    'name': f'Thread {thread}',
+                    'unit': 'seconds',
+                    'startValue': events[0][2],
+                    'endValue': events[-1][2],
+                    'events': [{'type': event_type, 'frame': frame, 'at': at} for event_type, frame, at in events],
+                }
+            )
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'shared': {'frames': [{'name': stage.name} for stage in frames]},
+            'profiles': profiles,
+            'name': name,
+            'exporter': 'asf_stac_util.profiling',
+        }
+
+
+profiler = Profiler()
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        '--profile',
+        nargs='?',
+        const='timings',
+        choices=PROFILE_MODES,
+        help='Print a summary of the time spent in each stage of creating the items ("timings"), or only of the '
+        'number of items, requests, and retries ("counters", which has negligible overhead), to stderr at the end',
+    )
+    parser.add_argument(
+        '--profile-output',
+        type=Path,
+        help='With --profile, also write a cProfile file (e.g. profile.prof) or, with --profile timings and a path '
+        'ending with .speedscope.json, a timeline of the stages in each thread for https://www.speedscope.app',
+    )
+
+
+@contextlib.contextmanager
+def profile(mode: Optional[str], output_file: Optional[Path] = None) -> Iterator[None]:
+    """Profile the body of the with statement in the given mode, printing the summary to stderr at the end."""
+    if mode is None:
+        yield
+        return
+
+    speedscope = mode == 'timings' and output_file is not None and output_file.name.endswith('.speedscope.json')
+    cprofile = cProfile.Profile() if output_file is not None and not output_file.name.endswith('.json') else None
+    if mode == 'timings':
+        profiler.enable(record_events=speedscope)
+    if cprofile:
+        cprofile.enable()
+    try:
+        yield
+    finally:
+        profiler.enabled = False
+        if cprofile:
+            cprofile.disable()
+            cprofile.dump_stats(output_file)
+        if speedscope:
+            output_file.write_text(json.dumps(profiler.speedscope(' '.join(sys.argv))))
+        print(profiler.summary(), file=sys.stderr)
@@ -0,0 +1,153 @@
+"""List the objects under a prefix of a public S3 bucket, paginating several shards of the prefix concurrently.
+
+A single list_objects_v2 paginator returns at most 1000 keys per request, one request at a time, so listing a bucket
+with a million objects takes several minutes. Instead, the prefix is split into shards at its first delimiter (e.g. one
+shard per tile directory), and the shards are paginated by a pool of threads. Objects are yielded grouped by shard, in
+the order of the shards.
+
+Run as a script to write the key, size, and ETag of each object to a tab-separated file, which the item creation
+scripts accept as their list of S3 objects:
+
+    python -m asf_stac_util.s3 s3://sentinel-1-global-coherence-earthbigdata/data/tiles/ --suffix .tif \\
+        --require-parent-prefix > coherence-s3-objects.txt
+"""
+
+import argparse
+import contextlib
+import sys
+from collections import deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path, PurePosixPath
+from typing import Optional
+
+import asf_stac_util
+
+
+@dataclass(frozen=True)
+class S3Object:
+    key: str
+    size: int
+    etag: str
+
+    @classmethod
+    def from_response(cls, obj: dict) -> 'S3Object':
+        return cls(key=obj['Key'], size=obj['Size'], etag=obj['ETag'].strip('"'))
+
+    def to_line(self) -> str:
+        return f'{self.key}\t{self.size}\t{self.etag}'
+
+
+def get_client(max_pool_connections: int = 10):
+    """Return an S3 client for anonymous access to public buckets, with a connection for each listing thread."""
+    import boto3
+    from botocore import UNSIGNED
+    from botocore.config import Config
+
+    return boto3.client('s3', config=Config(signature_version=UNSIGNED, max_pool_connections=max_pool_connections))
+
+
+def list_shards(s3, bucket: str, prefix: str, delimiter: str) -> tuple[list[S3Object], list[str]]:
+    """Return the objects directly under prefix and the prefixes of the shards below it, up to the next delimiter."""
+    objects = []
+    shard_prefixes = []
+    for page in s3.get_paginator('list_objects_v2').paginate(Bucket=bucket, Prefix=prefix, Delimiter=delimiter):
+        objects += [S3Object.from_response(obj) for obj in page.get('Contents', [])]
+        shard_prefixes += [common_prefix['Prefix'] for common_prefix in page.get('CommonPrefixes', [])]
+    return objects, shard_prefixes
+
+
+def list_shard(s3, bucket: str, prefix: str) -> list[S3Object]:
+    return [
+        S3Object.from_response(obj)
+        for page in s3.get_paginator('list_objects_v2').paginate(Bucket=bucket, Prefix=prefix)
+        for obj in page.get('Contents', [])
+    ]
+
+
+def list_objects(bucket: str, prefix: str = '', delimiter: str = '/', workers: int = 16, s3=None) -> Iterator[S3Object]:
+    """Yield every object under prefix, listing the shards of the prefix split at delimiter concurrently.
+
+    If every key under prefix shares the same next shard (e.g. file names that all start with the same word), that shard
+    is split instead. At most a few shards per worker are listed ahead of the consumer.
+    """
+    if s3 is None:
+        s3 = get_client(max_pool_connections=workers)
+
+    objects, shard_prefixes = list_shards(s3, bucket, prefix, delimiter)
+    while len(shard_prefixes) == 1 and not objects:
+        objects, shard_prefixes = list_shards(s3, bucket, shard_prefixes[0], delimiter)
+    yield from objects
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for shard_prefix in shard_prefixes:
+            pending.append(executor.submit(list_shard, s3, bucket, shard_prefix))
+            if len(pending) >= workers * 4:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def dedupe_objects(objects: Iterable[S3Object], require_parent_prefix: bool = False) -> Iterator[S3Object]:
+    """Drop duplicate objects, printing their keys to stderr.
+
+    An object is a duplicate if an earlier object has the same file name, and therefore the same item ID. If
+    require_parent_prefix is set, an object whose file name does not start with the name of its directory (e.g. a
+    coherence tile stored in the directory of another tile) is also dropped.
+    """
+    seen_names = set()
+    for obj in objects:
+        path = PurePosixPath(obj.key)
+        if require_parent_prefix and not path.name.startswith(path.parent.name):
+            print(f'Skipping {obj.key}: file name does not match its directory', file=sys.stderr)
+            continue
+        if path.name in seen_names:
+            print(f'Skipping {obj.key}: duplicate file name', file=sys.stderr)
+            continue
+        seen_names.add(path.name)
+        yield obj
+
+
+def write_objects(objects: Iterable[S3Object], output_file: Optional[Path]) -> int:
+    """Write one tab-separated key, size, and ETag line per object to output_file, or to stdout if it is None."""
+    count = 0
+    with output_file.open('w') if output_file else contextlib.nullcontext(sys.stdout) as f:
+        for count, obj in enumerate(objects, start=1):
+            f.write(obj.to_line() + '\n')
+    return count
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('url', help='s3://bucket/prefix URL to list the objects under')
+    parser.add_argument('--suffix', help='Only list the objects whose keys end with this suffix', default='')
+    parser.add_argument(
+        '--delimiter',
+        help='Split the prefix into shards up to the next occurrence of this string (default: /)',
+        default='/',
+    )
+    parser.add_argument(
+        '--require-parent-prefix',
+        action='store_true',
+        help='Skip objects whose file name does not start with the name of their directory',
+    )
+    parser.add_argument(
+        '-w', '--workers', type=int, help='Number of shards to list concurrently (default: 16)', default=16
+    )
+    parser.add_argument('-o', '--output-file', type=Path, help='Path for the output file (default: stdout)')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    bucket, _, prefix = args.url.removeprefix('s3://').partition('/')
+    objects = list_objects(bucket, prefix, args.delimiter, args.workers)
+    objects = (obj for obj in objects if obj.key.endswith(args.suffix))
+    objects = dedupe_objects(objects, args.require_parent_prefix)
+    write_objects(asf_stac_util.with_progress(objects, 'Listing S3 objects'), args.output_file)
+
+
+if __name__ == '__main__':
+    main()
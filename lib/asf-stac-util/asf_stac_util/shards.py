@@ -0,0 +1,115 @@
+"""Helpers for creating STAC items in parallel as several NDJSON shards, described by a manifest file."""
+
+import hashlib
+import json
+import tempfile
+import zlib
+from collections.abc import Callable, Iterable
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path, PurePath
+from typing import Optional
+
+
+PARTITION_METHODS = ['hash', 'latitude']
+
+
+def shard_by_hash(item_id: str, shards: int) -> int:
+    return zlib.crc32(item_id.encode()) % shards
+
+
+def shard_by_latitude(latitude: float, shards: int) -> int:
+    """Assign each of the equal-height latitude bands between -90 and 90 degrees to a shard."""
+    return min(int((latitude + 90) / 180 * shards), shards - 1)
+
+
+def get_shard_function(partition_by: str, shards: int, latitude_of: Callable[[str], float]) -> Callable[[str], int]:
+    """Return a function that assigns an S3 key to a shard, either by a hash of its item ID or by its latitude."""
+    if partition_by == 'hash':
+        return lambda s3_key: shard_by_hash(PurePath(s3_key).stem, shards)
+    if partition_by == 'latitude':
+        return lambda s3_key: shard_by_latitude(latitude_of(s3_key), shards)
+    raise ValueError(f'Unknown partition method: {partition_by}')
+
+
+def shard_path(output_file: Path, shard: int) -> Path:
+    return output_file.with_name(f'{output_file.stem}.{shard:03d}{output_file.suffix}')
+
+
+def manifest_path(output_file: Path) -> Path:
+    return output_file.with_name(f'{output_file.stem}.manifest.json')
+
+
+def write_shards(
+    s3_keys: Iterable[str],
+    output_file: Path,
+    shards: int,
+    shard_of: Callable[[str], int],
+    write_shard: Callable[[Path, Path], list[str]],
+    processes: Optional[int] = None,
+) -> list[str]:
+    """Create STAC items as shards of output_file using a pool of processes, then write the manifest.
+
+    Each S3 key is assigned to a shard by shard_of. write_shard(key_file, shard_file) is called in a worker process
+    for each shard, to create the items for the S3 keys listed in key_file. It must be picklable, and returns
+    the S3 keys for which no item could be created.
+
+    Returns the S3 keys for which no item could be created across all shards.
+    """
+    failed_keys = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        key_files = [Path(temp_dir) / f'{shard}.txt' for shard in range(shards)]
+        handles = [key_file.open('w') for key_file in key_files]
+        try:
+            for s3_key in s3_keys:
+                handles[shard_of(s3_key)].write(s3_key + '\n')
+        finally:
+            for handle in handles:
+                handle.close()
+
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            futures = {
+                executor.submit(write_shard, key_file, shard_path(output_file, shard)): shard
+                for shard, key_file in enumerate(key_files)
+            }
+            for future in as_completed(futures):
+                failed_keys.extend(future.result())
+                print(f'Created shard {futures[future] + 1}/{shards}')
+
+    write_manifest(output_file, shards)
+    return failed_keys
+
+
+def write_manifest(output_file: Path, shards: int) -> Path:
+    manifest = {'shards': [describe_shard(shard_path(output_file, shard)) for shard in range(shards)]}
+    manifest['items'] = sum(shard['items'] for shard in manifest['shards'])
+
+    path = manifest_path(output_file)
+    path.write_text(json.dumps(manifest, indent=2) + '\n')
+    print(f'Wrote {manifest["items"]} items in {shards} shards; see {path}')
+    return path
+
+
+def describe_shard(shard_file: Path) -> dict:
+    sha256 = hashlib.sha256()
+    lines = 0
+    with shard_file.open('rb') as f:
+        for line in f:
+            sha256.update(line)
+            lines += 1
+    return {'file': shard_file.name, 'items': lines, 'sha256': sha256.hexdigest()}
+
+
+def verify_manifest(path: Path) -> list[Path]:
+    """Check that each shard listed in the manifest has the expected line count and checksum.
+
+    Returns the paths of the shard files, or raises ValueError for the first shard that does not match.
+    """
+    manifest = json.loads(path.read_text())
+    shard_files = []
+    for expected in manifest['shards']:
+        shard_file = path.with_name(expected['file'])
+        actual = describe_shard(shard_file)
+        if actual != expected:
+            raise ValueError(f'{shard_file} does not match the manifest: expected {expected}, got {actual}')
+        shard_files.append(shard_file)
+    return shard_files
@@ -0,0 +1,49 @@
+"""Names and bounds of the 1x1 degree tiles that both collections are gridded into.
+
+These are shared by the item creation scripts, the API's tile search (which is deployed with asf_stac_util), and the
+synthetic item generator, so that all of them agree on how a tile is named and where its items lie.
+"""
+
+# Longitude pixel spacing (in arcseconds) of the Copernicus DEM grid, which widens towards the poles.
+# Each entry is (upper bound of absolute latitude, pixel spacing). Latitude pixel spacing is always 1 arcsecond.
+# See Table 1 of https://spacedata.copernicus.eu/documents/20123/122407/GEO1988-CopernicusDEM-SPE-002_ProductHandbook_I5.0+%281%29.pdf
+LONGITUDE_PIXEL_SPACING = [(50, 1), (60, 1.5), (70, 2), (80, 3), (85, 5), (90, 10)]
+
+
+def coherence_tile(min_lat: int, min_lon: int) -> str:
+    """Return the name of the coherence tile with the given lower left corner.
+
+    Coherence tiles are labeled by their upper left corner, e.g. N01E005 covers latitudes 0 to 1 and longitudes 5 to 6.
+    """
+    max_lat = min_lat + 1
+    return f'{"N" if max_lat >= 0 else "S"}{abs(max_lat):02d}{"E" if min_lon >= 0 else "W"}{abs(min_lon):03d}'
+
+
+def hand_item_id(min_lat: int, min_lon: int) -> str:
+    """Return the ID of the HAND item with the given lower left corner, e.g. Copernicus_DSM_COG_10_N02_00_W062_00_HAND."""
+    lat = f'{"N" if min_lat >= 0 else "S"}{abs(min_lat):02d}'
+    lon = f'{"E" if min_lon >= 0 else "W"}{abs(min_lon):03d}'
+    return f'Copernicus_DSM_COG_10_{lat}_00_{lon}_00_HAND'
+
+
+def parse_hand_item_id(item_id: str) -> tuple[int, int]:
+    """Return the latitude and longitude of the lower left corner of the tile encoded in a HAND item ID."""
+    _, _, _, _, lat, _, lon, _, _ = item_id.split('_')
+    min_lat = int(lat[1:]) if lat[0] == 'N' else -int(lat[1:])
+    min_lon = int(lon[1:]) if lon[0] == 'E' else -int(lon[1:])
+    return min_lat, min_lon
+
+
+def hand_bounds(min_lat: int, min_lon: int) -> tuple[float, float, float, float]:
+    """Return the (min_x, min_y, max_x, max_y) that gdal reports as the extent of the HAND tile with the given corner.
+
+    Pixel centers lie on the tile boundaries, so the raster extent is shifted half a pixel up and to the left.
+    """
+    abs_lat = min(abs(min_lat), abs(min_lat + 1))
+    lon_spacing = next(spacing for max_abs_lat, spacing in LONGITUDE_PIXEL_SPACING if abs_lat < max_abs_lat)
+    return (
+        round(min_lon - lon_spacing / 3600 / 2, 7),
+        round(min_lat + 1 / 3600 / 2, 7),
+        round(min_lon + 1 - lon_spacing / 3600 / 2, 7),
+        round(min_lat + 1 + 1 / 3600 / 2, 7),
+    )
@@ -0,0 +1,261 @@
+"""Validate STAC items against the STAC item and extension JSON schemas as they are created.
+
+The schemas are vendored in the schemas directory (the STAC 1.0.0 item schema and the GeoJSON schemas it references, as
+bundled with pystac, and the sar v1.0.0 extension schema), so no network access is needed. Each schema is compiled to
+Python code by fastjsonschema once per process, which validates an item more than ten times faster than jsonschema (and
+pystac) interpreting the schema. Items are validated in batches by a pool of processes while they are passed on
+unchanged to the rest of the pipeline, and the errors are aggregated into a report grouped by failure type, e.g. every
+item missing the same required property, rather than stopping at the first invalid item.
+
+A compiled schema stops at the first error, so only the first error of each item against each schema is reported.
+
+Items are validated as the API serves them: the item creation scripts leave out the self, parent, collection, and root
+links, which depend on the API's URL and are added by stac-fastapi when an item is served, so they are added before
+validating. The item schema requires the links, and a collection link for an item with a collection.
+"""
+
+import argparse
+import functools
+import json
+import os
+import sys
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+import asf_stac_util
+
+
+SCHEMA_DIR = Path(__file__).parent / 'schemas'
+ITEM_SCHEMA_URI = 'https://schemas.stacspec.org/v1.0.0/item-spec/json-schema/item.json#'
+
+MAX_EXAMPLES = 5
+
+# Links that stac-fastapi adds to each item it serves, replacing any links with the same rel
+API_LINK_RELS = ['self', 'parent', 'collection', 'root']
+
+
+@dataclass
+class FailureType:
+    count: int = 0
+    message: str = ''
+    item_ids: list[str] = field(default_factory=list)
+
+
+@dataclass
+class ValidationReport:
+    items_validated: int = 0
+    invalid_items: int = 0
+    failures: dict[str, FailureType] = field(default_factory=dict)
+
+    def add(self, item_id: str, errors: list[tuple[str, str]]) -> None:
+        """Count an invalid item's (failure type, message) errors, keeping a few example item IDs of each type."""
+        self.invalid_items += 1
+        for failure_type, message in errors:
+            failure = self.failures.setdefault(failure_type, FailureType(message=message))
+            failure.count += 1
+            if len(failure.item_ids) < MAX_EXAMPLES:
+                failure.item_ids.append(item_id)
+
+    def summary(self) -> str:
+        lines = [f'Validated {self.items_validated} items: {self.invalid_items} invalid']
+        for failure_type, failure in sorted(self.failures.items(), key=lambda item: -item[1].count):
+            lines.append(f'{failure.count:>10}  {failure_type}: {failure.message}')
+            lines.append(f'{"":>10}  e.g. {", ".join(failure.item_ids)}')
+        return '\n'.join(lines)
+
+    def to_dict(self) -> dict:
+        return {
+            'items_validated': self.items_validated,
+            'invalid_items': self.invalid_items,
+            'failures': {
+                failure_type: {'count': failure.count, 'message': failure.message, 'item_ids': failure.item_ids}
+                for failure_type, failure in sorted(self.failures.items(), key=lambda item: -item[1].count)
+            },
+        }
+
+
+@functools.cache
+def get_schemas() -> dict[str, dict]:
+    """Return the vendored schemas, keyed by their $id without the trailing empty fragment."""
+    schemas = [json.loads(path.read_text()) for path in sorted(SCHEMA_DIR.glob('**/*.json'))]
+    return {schema['$id'].removesuffix('#'): schema for schema in schemas}
+
+
+def resolve_schema(uri: str) -> dict:
+    """Resolve a reference to another schema to its vendored copy, rather than downloading it."""
+    return get_schemas()[uri.split('#')[0]]
+
+
+def item_schema(schema: dict) -> dict:
+    """Return the part of an extension schema for items.
+
+    Extension schemas are a oneOf of a schema for items and a schema for collections, so an invalid item fails both, and
+    the error says no more than that. Validating against the item schema alone reports the property that is invalid.
+    """
+    for branch in schema.get('oneOf', []):
+        if branch.get('allOf', [{}])[0].get('properties', {}).get('type', {}).get('const') == 'Feature':
+            return {key: value for key, value in schema.items() if key != 'oneOf'} | {'allOf': branch['allOf']}
+    return schema
+
+
+@functools.cache
+def get_validator(schema_uri: str) -> Optional[Callable[[dict], dict]]:
+    """Return a validator compiled from the vendored schema with the given URI, or None if it is not vendored."""
+    import fastjsonschema
+
+    schema = get_schemas().get(schema_uri.removesuffix('#'))
+    if schema is None:
+        return None
+    return fastjsonschema.compile(item_schema(schema), handlers={'https': resolve_schema})
+
+
+def schema_name(schema_uri: str) -> str:
+    """Return a short name for a schema, e.g. "item" for the STAC item schema or "sar" for the sar extension."""
+    if schema_uri == ITEM_SCHEMA_URI:
+        return 'item'
+    return schema_uri.removeprefix('https://stac-extensions.github.io/').split('/')[0]
+
+
+def failure_type(name: str, error) -> str:
+    """Return the failure type of a validation error, i.e. the schema, the path in the item, and the failed rule.
+
+    Array indexes are omitted from the path, so that e.g. an invalid coordinate of any geometry is the same failure
+    type, and a missing required property is included in the path.
+    """
+    path = [str(part) for part in error.path[1:] if not str(part).isdigit()]
+    if error.rule == 'required' and isinstance(error.value, dict):
+        path += [prop for prop in error.rule_definition if prop not in error.value][:1]
+    return f'{name} {"/".join(path) or "(root)"} {error.rule}'
+
+
+def served_stac_item(stac_item: dict) -> dict:
+    """Return a copy of a STAC item with the links that stac-fastapi adds when serving it, relative to the API's root."""
+    links = [link for link in stac_item.get('links', []) if link.get('rel') not in API_LINK_RELS]
+    links.append({'rel': 'root', 'href': '/', 'type': 'application/json'})
+    if stac_item.get('collection') is None:
+        return {**stac_item, 'links': links}
+    collection_href = f'/collections/{stac_item["collection"]}'
+    links += [
+        {'rel': 'self', 'href': f'{collection_href}/items/{stac_item.get("id")}', 'type': 'application/geo+json'},
+        {'rel': 'parent', 'href': collection_href, 'type': 'application/json'},
+        {'rel': 'collection', 'href': collection_href, 'type': 'application/json'},
+    ]
+    return {**stac_item, 'links': links}
+
+
+def validate_stac_item(stac_item: dict) -> list[tuple[str, str]]:
+    """Return the (failure type, message) of the first error of a STAC item, as served, against each of its schemas.
+
+    The item must already be serialized to JSON types.
+    """
+    import fastjsonschema
+
+    stac_item = served_stac_item(stac_item)
+    errors = []
+    for schema_uri in [ITEM_SCHEMA_URI, *stac_item.get('stac_extensions', [])]:
+        validator = get_validator(schema_uri)
+        if validator is None:
+            errors.append((f'unknown extension {schema_uri}', 'no vendored schema'))
+            continue
+        try:
+            validator(stac_item)
+        except fastjsonschema.JsonSchemaValueException as e:
+            errors.append((failure_type(schema_name(schema_uri), e), e.message))
+    return errors
+
+
+def validate_batch(stac_items: list[dict]) -> list[tuple[str, list[tuple[str, str]]]]:
+    """Return the ID and errors of each invalid item in a batch."""
+    invalid_items = []
+    for stac_item in stac_items:
+        errors = validate_stac_item(json.loads(asf_stac_util.jsonify_stac_item(stac_item)))
+        if errors:
+            invalid_items.append((stac_item.get('id', ''), errors))
+    return invalid_items
+
+
+def validate_stac_items(
+    stac_items: Iterable[dict],
+    report: ValidationReport,
+    processes: Optional[int] = None,
+    batch_size: int = 1000,
+) -> Iterator[dict]:
+    """Yield stac_items unchanged while validating them in batches across a pool of processes, adding to report.
+
+    At most a couple of batches per process are pending at once. The report is complete once the iterator is exhausted.
+    """
+
+    def add_results(future: Future) -> None:
+        for item_id, errors in future.result():
+            report.add(item_id, errors)
+
+    processes = processes or os.cpu_count() or 1
+    with ProcessPoolExecutor(processes) as executor:
+        pending: deque[Future] = deque()
+        batch: list[dict] = []
+        for stac_item in stac_items:
+            batch.append(stac_item)
+            if len(batch) == batch_size:
+                pending.append(executor.submit(validate_batch, batch))
+                report.items_validated += len(batch)
+                batch = []
+                if len(pending) > processes * 2:
+                    add_results(pending.popleft())
+            yield stac_item
+        if batch:
+            pending.append(executor.submit(validate_batch, batch))
+            report.items_validated += len(batch)
+        while pending:
+            add_results(pending.popleft())
+
+
+def validate_ndjson(paths: Iterable[Path], report: ValidationReport, processes: Optional[int] = None) -> None:
+    """Validate the STAC items in NDJSON files, e.g. the shards written with --shards, adding to report."""
+
+    def read_items() -> Iterator[dict]:
+        for path in paths:
+            with path.open() as f:
+                yield from (json.loads(line) for line in f if line.strip())
+
+    for _ in validate_stac_items(read_items(), report, processes):
+        pass
+
+
+def add_validate_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        '--validate',
+        action='store_true',
+        help='Validate the items against the STAC item and extension schemas while creating them, using --processes '
+        'processes, and print a report of the errors grouped by failure type to stderr at the end. Exits with an '
+        'error if any item is invalid, after writing or loading all of the items.',
+    )
+    parser.add_argument('--validation-report', type=Path, help='With --validate, also write the report as JSON')
+
+
+def print_report(report: ValidationReport, report_file: Optional[Path] = None) -> None:
+    """Print the report to stderr and, if report_file is given, write it as JSON."""
+    print(report.summary(), file=sys.stderr)
+    if report_file:
+        report_file.write_text(json.dumps(report.to_dict(), indent=2) + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Validate the STAC items in NDJSON files')
+    parser.add_argument('ndjson_files', type=Path, nargs='+')
+    parser.add_argument('--processes', type=int, help='Number of processes (defaults to the number of CPUs)')
+    parser.add_argument('--validation-report', type=Path, help='Path for a JSON file of the report')
+    args = parser.parse_args()
+
+    report = ValidationReport()
+    validate_ndjson(args.ndjson_files, report, args.processes)
+    print_report(report, args.validation_report)
+    if report.invalid_items:
+        sys.exit(f'{report.invalid_items} of {report.items_validated} STAC items are invalid')
+
+
+if __name__ == '__main__':
+    main()
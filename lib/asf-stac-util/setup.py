@@ -5,6 +5,7 @@ setup(
     name='asf-stac-util',
     license='BSD',
     include_package_data=True,
+    package_data={'asf_stac_util': ['schemas/*/*.json', 'schemas/*/*/*.json']},
     install_requires=[],
     python_requires='~=3.9',
     packages=find_packages(),
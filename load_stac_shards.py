@@ -0,0 +1,21 @@
+import argparse
+from pathlib import Path
+
+from asf_stac_util import pgstac
+
+
+def main():
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('manifest', type=Path, help='Path to the manifest file written alongside the shards')
+    parser.add_argument('--method', choices=pgstac.LOAD_METHODS, default='upsert')
+    parser.add_argument(
+        '--processes', type=int, help='Number of shards to load concurrently (defaults to the number of CPUs)'
+    )
+    parser.add_argument('--batch-size', type=int, default=10000)
+    args = parser.parse_args()
+
+    pgstac.load_shards(args.manifest, args.method, args.processes, args.batch_size)
+
+
+if __name__ == '__main__':
+    main()
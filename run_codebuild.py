@@ -1,35 +1,159 @@
+"""Run one or more CodeBuild projects concurrently and wait for them to finish.
+
+The projects are given as arguments, or as a space- or comma-separated list in the CODEBUILD_PROJECT environment
+variable. Their builds are started together, and the status of every build still in progress is fetched with one
+batch_get_builds call per poll. Polls start MIN_DELAY seconds apart, doubling up to MAX_DELAY while nothing changes, and
+drop back to MIN_DELAY as soon as a build changes status or writes to its log. New lines of each build's CloudWatch log
+are printed as they appear. As soon as any build fails, the other builds are stopped and the script exits with an error.
+A build's log is only printed when it can be read: if reading it fails, e.g. without the logs:GetLogEvents permission, a
+warning is printed and the build is still waited for.
+"""
+
+import argparse
+import functools
 import os
 import sys
 import time
+from collections.abc import Callable, Iterable
+from typing import Optional
 
 import boto3
+from botocore.exceptions import BotoCoreError, ClientError
+
+
+MIN_DELAY = 2.0
+MAX_DELAY = 30.0
+
+
+@functools.cache
+def get_client(service_name: str):
+    return boto3.client(service_name)
+
+
+class LogTail:
+    """Print the events of a build's CloudWatch log stream that have not been printed yet."""
+
+    def __init__(self, logs_client, project_name: str):
+        self.logs_client = logs_client
+        self.project_name = project_name
+        self.next_token: Optional[str] = None
+        self.enabled = True
+
+    def print_new_events(self, build: dict) -> int:
+        """Print the new events of the build's log stream and return how many there were.
+
+        If the log cannot be read for any reason other than the log stream not existing yet, a warning is printed and
+        the log is no longer read, rather than raising an error that would stop the builds.
+        """
+        group_name = build.get('logs', {}).get('groupName')
+        stream_name = build.get('logs', {}).get('streamName')
+        if not self.enabled or not group_name or not stream_name:
+            return 0
+
+        count = 0
+        while True:
+            kwargs = {'nextToken': self.next_token} if self.next_token else {'startFromHead': True}
+            try:
+                response = self.logs_client.get_log_events(logGroupName=group_name, logStreamName=stream_name, **kwargs)
+            except (BotoCoreError, ClientError) as e:
+                # The log stream is created some time after the build starts
+                if not isinstance(e, ClientError) or e.response['Error']['Code'] != 'ResourceNotFoundException':
+                    print(f'Warning: not printing the log of {self.project_name}: {e}', file=sys.stderr)
+                    self.enabled = False
+                return count
+            for event in response['events']:
+                print(f'[{self.project_name}] {event["message"].rstrip()}')
+            count += len(response['events'])
+            if not response['events'] or response['nextForwardToken'] == self.next_token:
+                self.next_token = response['nextForwardToken']
+                return count
+            self.next_token = response['nextForwardToken']
+
+
+def start_builds(codebuild_client, project_names: Iterable[str]) -> dict[str, str]:
+    """Start a build of each project and return the project names keyed by build ID."""
+    projects = {}
+    for project_name in project_names:
+        print(f'Starting CodeBuild for project {project_name}')
+        build = codebuild_client.start_build(projectName=project_name)['build']
+        print(f'Build ID: {build["id"]}')
+        projects[build['id']] = project_name
+    return projects
 
 
-CLIENT = boto3.client('codebuild')
+def stop_builds(codebuild_client, build_ids: Iterable[str]) -> None:
+    for build_id in build_ids:
+        print(f'Stopping build {build_id}')
+        codebuild_client.stop_build(id=build_id)
 
 
-def main() -> None:
-    project_name = os.environ['CODEBUILD_PROJECT']
-    print(f'Starting CodeBuild for project {project_name}')
-    response = CLIENT.start_build(projectName=project_name)
+def wait_for_builds(
+    codebuild_client,
+    logs_client,
+    projects: dict[str, str],
+    min_delay: float = MIN_DELAY,
+    max_delay: float = MAX_DELAY,
+    sleep: Callable[[float], None] = time.sleep,
+) -> dict[str, str]:
+    """Wait for the builds in projects (project names keyed by build ID) to finish, printing their logs.
 
-    build_id = response['build']['id']
-    print(f'Build ID: {build_id}')
+    Returns the final status of each finished build, keyed by build ID. Returns early, without waiting for the builds
+    still in progress, as soon as any build finishes with a status other than SUCCEEDED.
+    """
+    in_progress = list(projects)
+    statuses: dict[str, str] = {}
+    log_tails = {build_id: LogTail(logs_client, project_name) for build_id, project_name in projects.items()}
+    delay = min_delay
+    while in_progress:
+        changed = False
+        for build in codebuild_client.batch_get_builds(ids=in_progress)['builds']:
+            build_id = build['id']
+            changed |= log_tails[build_id].print_new_events(build) > 0
+            status = build['buildStatus']
+            if status != statuses.get(build_id):
+                print(f'Build status of {projects[build_id]}: {status}')
+                statuses[build_id] = status
+                changed = True
+            if status != 'IN_PROGRESS':
+                in_progress.remove(build_id)
+                if status != 'SUCCEEDED':
+                    return statuses
+        if in_progress:
+            delay = min_delay if changed else min(delay * 2, max_delay)
+            sleep(delay)
+    return statuses
 
-    build_status = response['build']['buildStatus']
-    print(f'Build status: {build_status}')
 
-    while build_status == 'IN_PROGRESS':
-        time.sleep(5)
+def parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('project_names', nargs='*', help='CodeBuild projects to run (defaults to $CODEBUILD_PROJECT)')
+    args = parser.parse_args(argv)
+    if not args.project_names:
+        args.project_names = os.environ.get('CODEBUILD_PROJECT', '').replace(',', ' ').split()
+    if not args.project_names:
+        parser.error('no CodeBuild projects given and CODEBUILD_PROJECT is not set')
+    return args
 
-        response = CLIENT.batch_get_builds(ids=[build_id])
-        assert len(response['builds']) == 1
 
-        build_status = response['builds'][0]['buildStatus']
-        print(f'Build status: {build_status}')
+def main(argv: Optional[list[str]] = None) -> None:
+    args = parse_args(argv)
+    codebuild_client = get_client('codebuild')
+    projects = start_builds(codebuild_client, args.project_names)
+    statuses: dict[str, str] = {}
+    try:
+        statuses = wait_for_builds(codebuild_client, get_client('logs'), projects)
+    finally:
+        stop_builds(
+            codebuild_client, [build_id for build_id in projects if statuses.get(build_id) in (None, 'IN_PROGRESS')]
+        )
 
-    if build_status != 'SUCCEEDED':
-        sys.exit(f'CodeBuild failed with status {build_status}')
+    failed = [
+        f'{projects[build_id]} with status {status}'
+        for build_id, status in statuses.items()
+        if status not in ('IN_PROGRESS', 'SUCCEEDED')
+    ]
+    if failed:
+        sys.exit(f'CodeBuild failed: {", ".join(failed)}')
 
 
 if __name__ == '__main__':
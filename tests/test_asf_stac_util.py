@@ -1,6 +1,14 @@
+import io
+import json
 from datetime import datetime, timezone
 
+import boto3
+import pytest
+from moto import mock_aws
+from shapely import geometry
+
 import asf_stac_util
+from asf_stac_util import checkpoint, collection, geoparquet, pgstac, profiling, s3, shards, validation
 
 
 def test_jsonify_stac_item():
@@ -21,3 +29,457 @@ def test_jsonify_stac_item():
         '"dict_field": {"str_field": "bar"}, "list_field": [[1, 2], [3, 4]], "tuple_field": [[1, 2], [3, 4]], '
         '"datetime_field": "2022-11-30T12:00:00Z"}'
     )
+
+
+def test_read_s3_keys(tmp_path):
+    s3_objects = tmp_path / 's3-objects.txt'
+    s3_objects.write_text('a/foo.tif\na/foo.tif.aux.xml\n\nb/bar.tif\n')
+
+    assert list(asf_stac_util.read_s3_keys(str(s3_objects))) == ['a/foo.tif', 'a/foo.tif.aux.xml', 'b/bar.tif']
+    assert list(asf_stac_util.read_s3_keys(str(s3_objects), suffix='.tif')) == ['a/foo.tif', 'b/bar.tif']
+
+    s3_objects.write_text('a/foo.tif\t10\tabc\na/foo.tif.aux.xml\t5\tdef\n')
+    assert list(asf_stac_util.read_s3_keys(str(s3_objects), suffix='.tif')) == ['a/foo.tif']
+
+
+def test_with_progress():
+    assert list(asf_stac_util.with_progress(iter(range(5)), 'Counting')) == [0, 1, 2, 3, 4]
+    assert list(asf_stac_util.with_progress([], 'Counting')) == []
+
+
+def test_write_ndjson(tmp_path):
+    output_file = tmp_path / 'items.ndjson'
+    stac_items = ({'id': str(n), 'datetime': datetime(2022, 11, 30, 12, tzinfo=timezone.utc)} for n in range(3))
+
+    assert asf_stac_util.write_ndjson(stac_items, output_file) == 3
+    assert output_file.read_text() == (
+        '{"id": "0", "datetime": "2022-11-30T12:00:00Z"}\n'
+        '{"id": "1", "datetime": "2022-11-30T12:00:00Z"}\n'
+        '{"id": "2", "datetime": "2022-11-30T12:00:00Z"}\n'
+    )
+
+
+def test_dump_stac_items():
+    f = io.StringIO()
+    assert asf_stac_util.dump_stac_items(({'id': n} for n in range(5)), f, chunk_size=2) == 5
+    assert f.getvalue() == '{"id": 0}\n{"id": 1}\n{"id": 2}\n{"id": 3}\n{"id": 4}\n'
+
+    f = io.StringIO()
+    assert asf_stac_util.dump_stac_items([], f) == 0
+    assert f.getvalue() == ''
+
+
+def test_prefetch():
+    assert list(asf_stac_util.prefetch(iter(range(100)), maxsize=3)) == list(range(100))
+
+    def fail():
+        yield 1
+        raise ValueError('foo')
+
+    prefetched = asf_stac_util.prefetch(fail(), maxsize=3)
+    assert next(prefetched) == 1
+    with pytest.raises(ValueError, match='foo'):
+        next(prefetched)
+
+
+def test_plan_sync():
+    s3_keys = ['data/tiles/N00E005/a.tif', 'data/tiles/N00E005/b.tif', 'data/tiles/N00E006/c.tif']
+    assert pgstac.plan_sync(s3_keys, existing_ids={'b', 'd', 'e'}) == pgstac.SyncPlan(
+        missing_keys=['data/tiles/N00E005/a.tif', 'data/tiles/N00E006/c.tif'],
+        stale_ids=['d', 'e'],
+        unchanged=1,
+    )
+    assert pgstac.plan_sync([], existing_ids=set()) == pgstac.SyncPlan(missing_keys=[], stale_ids=[], unchanged=0)
+
+
+def test_mark_collections_updated():
+    class Connection:
+        def __init__(self):
+            self.queries = []
+
+        def execute(self, query, params=None):
+            self.queries.append((query, params))
+
+    class Db:
+        def __init__(self):
+            self.connection = Connection()
+
+        def connect(self):
+            return self.connection
+
+    collection_ids: set[str] = set()
+    stac_items = [{'id': 'a', 'collection': 'foo'}, {'id': 'b', 'collection': 'bar'}, {'id': 'c', 'collection': 'foo'}]
+    assert len(list(pgstac._jsonify_stac_items(stac_items, collection_ids))) == 3
+    assert collection_ids == {'foo', 'bar'}
+
+    db = Db()
+    pgstac.mark_collections_updated(db, collection_ids)
+    pgstac.mark_collections_updated(db)
+    (query, params), (all_query, all_params) = db.connection.queries
+    assert query.endswith('WHERE id = ANY(%s)')
+    assert params == [['bar', 'foo']]
+    assert all_query == pgstac.MARK_UPDATED_SQL
+    assert all_params is None
+
+
+def test_shard_by_latitude():
+    assert shards.shard_by_latitude(-90, 4) == 0
+    assert shards.shard_by_latitude(-45.5, 4) == 0
+    assert shards.shard_by_latitude(-45, 4) == 1
+    assert shards.shard_by_latitude(0, 4) == 2
+    assert shards.shard_by_latitude(89, 4) == 3
+    assert shards.shard_by_latitude(90, 4) == 3
+
+
+def test_get_shard_function():
+    shard_of = shards.get_shard_function('hash', 3, latitude_of=lambda s3_key: 0)
+    assert shard_of('a/foo.tif') == shard_of('b/foo.tif') == shards.shard_by_hash('foo', 3)
+
+    shard_of = shards.get_shard_function('latitude', 2, latitude_of=lambda s3_key: float(s3_key.split('/')[0]))
+    assert shard_of('-10/foo.tif') == 0
+    assert shard_of('10/foo.tif') == 1
+
+
+def write_shard(key_file, shard_file):
+    s3_keys = list(asf_stac_util.read_s3_keys(str(key_file)))
+    asf_stac_util.write_ndjson(({'id': s3_key} for s3_key in s3_keys if s3_key != 'bad'), shard_file)
+    return [s3_key for s3_key in s3_keys if s3_key == 'bad']
+
+
+def test_write_shards(tmp_path):
+    output_file = tmp_path / 'items.ndjson'
+    s3_keys = [str(n) for n in range(10)] + ['bad']
+
+    failed_keys = shards.write_shards(s3_keys, output_file, 3, lambda s3_key: len(s3_key) % 3, write_shard, processes=2)
+    assert failed_keys == ['bad']
+
+    manifest = json.loads((tmp_path / 'items.manifest.json').read_text())
+    assert manifest['items'] == 10
+    assert [shard['file'] for shard in manifest['shards']] == [
+        'items.000.ndjson',
+        'items.001.ndjson',
+        'items.002.ndjson',
+    ]
+    assert [shard['items'] for shard in manifest['shards']] == [0, 10, 0]
+    assert shards.verify_manifest(tmp_path / 'items.manifest.json') == [
+        tmp_path / 'items.000.ndjson',
+        tmp_path / 'items.001.ndjson',
+        tmp_path / 'items.002.ndjson',
+    ]
+
+    with (tmp_path / 'items.001.ndjson').open('a') as f:
+        f.write('{"id": "extra"}\n')
+    with pytest.raises(ValueError, match='does not match the manifest'):
+        shards.verify_manifest(tmp_path / 'items.manifest.json')
+
+
+@mock_aws
+def test_list_s3_objects(tmp_path):
+    client = boto3.client('s3', region_name='us-east-1')
+    client.create_bucket(Bucket='bucket')
+    keys = [
+        'data/tiles/N00E005/N00E005_fall_vv_COH12.tif',
+        'data/tiles/N00E005/N00E005_fall_vv_COH12.tif.aux.xml',
+        'data/tiles/N00E006/N00E006_fall_vv_COH12.tif',
+        'data/tiles/N00E006/N00E005_fall_vv_COH12.tif',
+        'data/tiles/N01E005/N01E005_fall_vv_COH12.tif',
+        'data/tiles/N01E005/copy/N01E005_fall_vv_COH12.tif',
+        'data/tiles/readme.txt',
+        'other/N00E005_fall_vv_COH12.tif',
+    ]
+    for key in keys:
+        client.put_object(Bucket='bucket', Key=key, Body=key.encode())
+
+    objects = list(s3.list_objects('bucket', 'data/', workers=2, s3=client))
+    assert [obj.key for obj in objects] == [
+        'data/tiles/readme.txt',
+        'data/tiles/N00E005/N00E005_fall_vv_COH12.tif',
+        'data/tiles/N00E005/N00E005_fall_vv_COH12.tif.aux.xml',
+        'data/tiles/N00E006/N00E005_fall_vv_COH12.tif',
+        'data/tiles/N00E006/N00E006_fall_vv_COH12.tif',
+        'data/tiles/N01E005/N01E005_fall_vv_COH12.tif',
+        'data/tiles/N01E005/copy/N01E005_fall_vv_COH12.tif',
+    ]
+    assert objects[0].size == len('data/tiles/readme.txt')
+    assert objects[0].etag == client.head_object(Bucket='bucket', Key='data/tiles/readme.txt')['ETag'].strip('"')
+
+    tifs = [obj for obj in objects if obj.key.endswith('.tif')]
+    assert [obj.key for obj in s3.dedupe_objects(tifs)] == [
+        'data/tiles/N00E005/N00E005_fall_vv_COH12.tif',
+        'data/tiles/N00E006/N00E006_fall_vv_COH12.tif',
+        'data/tiles/N01E005/N01E005_fall_vv_COH12.tif',
+    ]
+    assert [obj.key for obj in s3.dedupe_objects(tifs, require_parent_prefix=True)] == [
+        'data/tiles/N00E005/N00E005_fall_vv_COH12.tif',
+        'data/tiles/N00E006/N00E006_fall_vv_COH12.tif',
+        'data/tiles/N01E005/N01E005_fall_vv_COH12.tif',
+    ]
+
+    objects = list(s3.list_objects('bucket', 'data/tiles/N0', delimiter='_', s3=client))
+    assert len(objects) == 6
+
+    output_file = tmp_path / 's3-objects.txt'
+    assert s3.write_objects(s3.dedupe_objects(tifs), output_file) == 3
+    assert list(asf_stac_util.read_s3_keys(str(output_file))) == [
+        'data/tiles/N00E005/N00E005_fall_vv_COH12.tif',
+        'data/tiles/N00E006/N00E006_fall_vv_COH12.tif',
+        'data/tiles/N01E005/N01E005_fall_vv_COH12.tif',
+    ]
+    assert list(asf_stac_util.read_s3_keys('s3://bucket/other/')) == ['other/N00E005_fall_vv_COH12.tif']
+
+
+def test_profiler():
+    profiler = profiling.Profiler()
+    with profiler.stage('create_stac_item'):
+        pass
+    profiler.count('items_created')
+    profiler.count('items_created', 2)
+    assert profiler.stages == {}
+    assert profiler.counters == {'items_created': 3}
+    assert profiler.summary() == 'items_created=3'
+
+    profiler.enable(record_events=True)
+    for _ in range(3):
+        with profiler.stage('create_stac_item'):
+            with profiler.stage('geometry'):
+                pass
+    with profiler.stage('write'):
+        pass
+    assert [len(profiler.stages[name].durations) for name in ['create_stac_item', 'geometry', 'write']] == [3, 3, 1]
+    summary = profiler.summary().splitlines()
+    assert summary[0].split() == ['stage', 'count', 'total', 's', 'p50', 'ms', 'p95', 'ms', 'p99', 'ms']
+    assert summary[1].split()[:2] == ['create_stac_item', '3']
+    assert summary[-1] == 'items_created=3'
+
+    speedscope = profiler.speedscope('test')
+    assert speedscope['shared']['frames'] == [{'name': 'create_stac_item'}, {'name': 'geometry'}, {'name': 'write'}]
+    [thread_profile] = speedscope['profiles']
+    assert [(event['type'], event['frame']) for event in thread_profile['events']][:4] == [
+        ('O', 0),
+        ('O', 1),
+        ('C', 1),
+        ('C', 0),
+    ]
+    assert len(thread_profile['events']) == 14
+
+
+def test_profile(tmp_path, capsys, monkeypatch):
+    monkeypatch.setattr(profiling, 'profiler', profiling.Profiler())
+    with profiling.profile('timings', tmp_path / 'profile.speedscope.json'):
+        asf_stac_util.dump_stac_items([{'id': 'foo'}, {'id': 'bar'}], io.StringIO())
+    assert not profiling.profiler.enabled
+    assert len(profiling.profiler.stages['jsonify'].durations) == 2
+    assert 'items_written=2' in capsys.readouterr().err
+    assert json.loads((tmp_path / 'profile.speedscope.json').read_text())['shared']['frames'] == [
+        {'name': 'jsonify'},
+        {'name': 'write'},
+    ]
+
+    monkeypatch.setattr(profiling, 'profiler', profiling.Profiler())
+    with profiling.profile('counters', tmp_path / 'profile.prof'):
+        asf_stac_util.dump_stac_items([{'id': 'foo'}], io.StringIO())
+    assert profiling.profiler.stages == {}
+    assert capsys.readouterr().err == 'items_written=1\n'
+    assert (tmp_path / 'profile.prof').stat().st_size > 0
+
+
+def test_write_stac_items_with_checkpoint(tmp_path):
+    output_file = tmp_path / 'items.ndjson'
+    s3_keys = [f'tiles/{name}.tif' for name in 'abcdefgh']
+
+    def create_stac_items(keys, crash_after=None):
+        for key in keys:
+            item_id = key.split('/')[1].removesuffix('.tif')
+            if item_id in ('c', 'h'):
+                continue
+            yield {'id': item_id}
+            if item_id == crash_after:
+                raise ConnectionError('network blip')
+
+    with pytest.raises(ConnectionError):
+        checkpoint.write_stac_items(
+            s3_keys, lambda keys: create_stac_items(keys, crash_after='e'), output_file, interval=3
+        )
+    assert checkpoint.Checkpoint.load(tmp_path / 'items.ndjson.checkpoint.json') == checkpoint.Checkpoint(
+        keys_done=4, last_key='tiles/d.tif', output_size=36, items_written=3, failed_keys=['tiles/c.tif']
+    )
+    with output_file.open('a') as f:
+        f.write('{"id": "partial')
+
+    failed_keys = checkpoint.write_stac_items(s3_keys, create_stac_items, output_file, resume=True, interval=3)
+    assert failed_keys == ['tiles/c.tif', 'tiles/h.tif']
+    assert [json.loads(line)['id'] for line in output_file.read_text().splitlines()] == ['a', 'b', 'd', 'e', 'f', 'g']
+    assert (tmp_path / 'items.failed.txt').read_text() == 'tiles/c.tif\ntiles/h.tif\n'
+
+    with pytest.raises(ValueError, match='has changed'):
+        checkpoint.write_stac_items(s3_keys[1:], create_stac_items, output_file, resume=True)
+
+    assert checkpoint.write_stac_items(s3_keys[:2], create_stac_items, output_file) == []
+    assert output_file.read_text() == '{"id": "a"}\n{"id": "b"}\n'
+    assert not (tmp_path / 'items.failed.txt').exists()
+
+
+def sar_item(item_id: str, **properties) -> dict:
+    return {
+        'type': 'Feature',
+        'stac_version': '1.0.0',
+        'id': item_id,
+        'properties': {
+            'datetime': datetime(2020, 1, 1, tzinfo=timezone.utc),
+            'sar:instrument_mode': 'IW',
+            'sar:frequency_band': 'C',
+            'sar:polarizations': ['VV'],
+            'sar:product_type': 'COH12',
+            **properties,
+        },
+        'geometry': {'type': 'Polygon', 'coordinates': [[[5, 0], [6, 0], [6, 1], [5, 1], [5, 0]]]},
+        'bbox': [5, 0, 6, 1],
+        'links': [],
+        'assets': {'data': {'href': 'https://example.com/foo.tif'}},
+        'stac_extensions': ['https://stac-extensions.github.io/sar/v1.0.0/schema.json'],
+    }
+
+
+def test_validate_stac_item():
+    assert validation.validate_stac_item(json.loads(asf_stac_util.jsonify_stac_item(sar_item('foo')))) == []
+
+    # Items are validated with the links that the API adds, which include a collection link for an item's collection
+    item = json.loads(asf_stac_util.jsonify_stac_item(sar_item('foo')))
+    del item['links']
+    assert validation.validate_stac_item(item) == []
+    assert validation.validate_stac_item({**item, 'collection': 'bar'}) == []
+    assert [link['rel'] for link in validation.served_stac_item({**item, 'collection': 'bar'})['links']] == [
+        'root',
+        'self',
+        'parent',
+        'collection',
+    ]
+
+    item = json.loads(asf_stac_util.jsonify_stac_item(sar_item('foo', **{'sar:frequency_band': 'Z'})))
+    del item['geometry']
+    item['stac_extensions'].append('https://stac-extensions.github.io/foo/v1.0.0/schema.json')
+    assert [failure_type for failure_type, _ in validation.validate_stac_item(item)] == [
+        'item geometry required',
+        'sar properties/sar:frequency_band enum',
+        'unknown extension https://stac-extensions.github.io/foo/v1.0.0/schema.json',
+    ]
+
+    del item['properties']['sar:polarizations']
+    assert validation.validate_stac_item(item)[1] == (
+        'sar properties/sar:polarizations required',
+        "data.properties must contain ['sar:polarizations'] properties",
+    )
+
+
+def test_validate_stac_items(tmp_path):
+    stac_items = [sar_item(str(i), **({'sar:polarizations': ['XX']} if i % 3 == 0 else {})) for i in range(10)]
+    report = validation.ValidationReport()
+    assert list(validation.validate_stac_items(stac_items, report, processes=2, batch_size=4)) == stac_items
+    assert report.items_validated == 10
+    assert report.invalid_items == 4
+    assert report.to_dict()['failures'] == {
+        'sar properties/sar:polarizations enum': {
+            'count': 4,
+            'message': "data.properties.sar:polarizations[0] must be one of ['HH', 'VV', 'HV', 'VH']",
+            'item_ids': ['0', '3', '6', '9'],
+        }
+    }
+
+    ndjson_file = tmp_path / 'items.ndjson'
+    asf_stac_util.write_ndjson(stac_items, ndjson_file)
+    ndjson_report = validation.ValidationReport()
+    validation.validate_ndjson([ndjson_file, ndjson_file], ndjson_report, processes=1)
+    assert ndjson_report.items_validated == 20
+    assert ndjson_report.invalid_items == 8
+
+
+def test_geoparquet_writer(tmp_path):
+    import pyarrow.parquet as pq
+    from shapely import wkb
+
+    stac_items = [sar_item(str(i), tile='N01E005') for i in range(10)]
+    del stac_items[3]['properties']['sar:polarizations']
+    path = tmp_path / 'items.parquet'
+    properties = {'tile': 'string', 'sar:polarizations': 'list<string>'}
+    with geoparquet.GeoParquetWriter(path, properties, row_group_size=4) as writer:
+        assert list(writer.write_items(stac_items)) == stac_items
+
+    parquet_file = pq.ParquetFile(path)
+    assert parquet_file.metadata.num_row_groups == 3
+    assert json.loads(parquet_file.schema_arrow.metadata[b'geo'])['columns']['geometry']['encoding'] == 'WKB'
+
+    table = pq.read_table(path)
+    assert table.column_names == [
+        'id',
+        'collection',
+        'datetime',
+        'start_datetime',
+        'end_datetime',
+        'data_href',
+        'tile',
+        'sar:polarizations',
+        'geometry',
+        'bbox',
+    ]
+    rows = table.to_pylist()
+    assert [row['id'] for row in rows] == [str(i) for i in range(10)]
+    assert rows[0]['datetime'] == datetime(2020, 1, 1, tzinfo=timezone.utc)
+    assert rows[0]['data_href'] == 'https://example.com/foo.tif'
+    assert rows[0]['sar:polarizations'] == ['VV']
+    assert rows[3]['sar:polarizations'] is None
+    assert rows[0]['bbox'] == {'xmin': 5, 'ymin': 0, 'xmax': 6, 'ymax': 1}
+    assert wkb.loads(rows[9]['geometry']).equals(geometry.shape(stac_items[9]['geometry']))
+
+
+def test_collection_builder():
+    template = {
+        'id': 'foo',
+        'extent': {'spatial': {'bbox': [-180.0, -90.0, 180.0, 90.0]}, 'temporal': {'interval': [[None, None]]}},
+        'summaries': {
+            'season': ['spring', 'summer', 'fall', 'winter'],
+            'sar:polarizations': [['VV'], ['VH'], ['HH'], ['HV']],
+            'orbit': {'minimum': 0, 'maximum': 175},
+            'tile': {'type': 'string', 'pattern': '^[NS][0-9]{2}[EW][0-9]{3}$'},
+        },
+    }
+    stac_items = [
+        {
+            'bbox': [5.0, 0.0, 6.0, 1.0],
+            'properties': {
+                'datetime': datetime(2020, 1, 14, 12, tzinfo=timezone.utc),
+                'start_datetime': datetime(2019, 12, 1, tzinfo=timezone.utc),
+                'end_datetime': datetime(2020, 2, 28, tzinfo=timezone.utc),
+                'season': 'winter',
+                'sar:polarizations': ['VV'],
+                'orbit': 124,
+            },
+        },
+        {
+            'bbox': [-1.0, -2.0, 0.0, -1.0],
+            'properties': {'datetime': '2020-10-15T00:00:00Z', 'season': 'fall', 'orbit': 12},
+        },
+        {
+            'bbox': [-1.0, 0.0, 0.0, 1.0],
+            'properties': {'datetime': '2020-06-01T00:00:00Z', 'season': 'fall', 'sar:polarizations': ['VV', 'VH']},
+        },
+    ]
+
+    builder = collection.CollectionBuilder(template)
+    assert list(builder.add_items(iter(stac_items))) == stac_items
+    assert builder.build() == {
+        'id': 'foo',
+        'extent': {
+            'spatial': {'bbox': [[-1.0, -2.0, 6.0, 1.0]]},
+            'temporal': {'interval': [['2019-12-01T00:00:00Z', '2020-10-15T00:00:00Z']]},
+        },
+        'summaries': {
+            'season': ['fall', 'winter'],
+            'sar:polarizations': [['VV'], ['VV', 'VH']],
+            'orbit': {'minimum': 12, 'maximum': 124},
+            'tile': {'type': 'string', 'pattern': '^[NS][0-9]{2}[EW][0-9]{3}$'},
+        },
+    }
+    assert template['extent']['spatial']['bbox'] == [-180.0, -90.0, 180.0, 90.0]
+
+    with pytest.raises(ValueError, match='Collection foo has no items'):
+        collection.CollectionBuilder(template).build()
@@ -0,0 +1,138 @@
+import asyncio
+import contextlib
+import json
+from typing import Optional
+
+import pytest
+from fastapi import FastAPI
+
+import coherence_series
+import response_cache
+
+
+def coherence_item(item_id: str, season: Optional[str] = None, polarization: Optional[str] = None) -> dict:
+    properties = {'tile': 'N01E005', 'sar:product_type': item_id.split('_')[-1]}
+    if season:
+        properties.update(
+            {
+                'season': season,
+                'datetime': f'{season}-datetime',
+                'start_datetime': f'{season}-start',
+                'end_datetime': f'{season}-end',
+                'sar:polarizations': [polarization],
+            }
+        )
+    return {'id': item_id, 'properties': properties, 'assets': {'data': {'href': f'https://foo.com/{item_id}.tif'}}}
+
+
+STAC_ITEMS = [
+    coherence_item('N01E005_fall_vv_COH12', 'fall', 'VV'),
+    coherence_item('N01E005_124D_inc'),
+    coherence_item('N01E005_fall_vh_AMP', 'fall', 'VH'),
+    coherence_item('N01E005_fall_vv_AMP', 'fall', 'VV'),
+    coherence_item('N01E005_winter_vv_AMP', 'winter', 'VV'),
+]
+
+
+def test_tile_from_point():
+    assert coherence_series.tile_from_point(5.5, 0.5) == 'N01E005'
+    assert coherence_series.tile_from_point(5, 0) == 'N01E005'
+    assert coherence_series.tile_from_point(-0.5, -0.5) == 'N00W001'
+    assert coherence_series.tile_from_point(-122.3, -45.1) == 'S45W123'
+    assert coherence_series.tile_from_point(180, 90) == 'N90E179'
+    assert coherence_series.tile_from_point(-180, -90) == 'S89W180'
+
+    with pytest.raises(ValueError):
+        coherence_series.tile_from_point(181, 0)
+
+
+def test_group_series():
+    assert coherence_series.group_series('N01E005', STAC_ITEMS) == {
+        'tile': 'N01E005',
+        'static': {
+            'inc': {'id': 'N01E005_124D_inc', 'href': 'https://foo.com/N01E005_124D_inc.tif'},
+        },
+        'seasons': {
+            'fall': {
+                'datetime': 'fall-datetime',
+                'start_datetime': 'fall-start',
+                'end_datetime': 'fall-end',
+                'polarizations': {
+                    'VH': {
+                        'AMP': {'id': 'N01E005_fall_vh_AMP', 'href': 'https://foo.com/N01E005_fall_vh_AMP.tif'},
+                    },
+                    'VV': {
+                        'AMP': {'id': 'N01E005_fall_vv_AMP', 'href': 'https://foo.com/N01E005_fall_vv_AMP.tif'},
+                        'COH12': {'id': 'N01E005_fall_vv_COH12', 'href': 'https://foo.com/N01E005_fall_vv_COH12.tif'},
+                    },
+                },
+            },
+            'winter': {
+                'datetime': 'winter-datetime',
+                'start_datetime': 'winter-start',
+                'end_datetime': 'winter-end',
+                'polarizations': {
+                    'VV': {
+                        'AMP': {'id': 'N01E005_winter_vv_AMP', 'href': 'https://foo.com/N01E005_winter_vv_AMP.tif'},
+                    },
+                },
+            },
+        },
+    }
+
+
+class FakeConnection:
+    def __init__(self, searches: list):
+        self.searches = searches
+
+    async def fetchval(self, query, search):
+        self.searches.append(json.loads(search))
+        tile = self.searches[-1]['query']['tile']['eq']
+        return {'type': 'FeatureCollection', 'features': STAC_ITEMS if tile == 'N01E005' else []}
+
+
+class FakePool:
+    def __init__(self):
+        self.searches = []
+
+    @contextlib.asynccontextmanager
+    async def acquire(self):
+        yield FakeConnection(self.searches)
+
+
+def get(app, path: str, query: bytes) -> tuple[int, dict]:
+    scope = {
+        'type': 'http',
+        'method': 'GET',
+        'scheme': 'https',
+        'server': ('stac.asf.alaska.edu', 443),
+        'root_path': '',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': query,
+        'headers': [(b'host', b'stac.asf.alaska.edu')],
+    }
+    status, _, body = asyncio.run(response_cache.call_app(app, scope, response_cache.replay_body(b'')))
+    return status, json.loads(body)
+
+
+def test_get_coherence_series():
+    app = FastAPI()
+    app.include_router(coherence_series.router)
+    app.state.readpool = FakePool()
+    path = '/collections/sentinel-1-global-coherence/series'
+
+    status, series = get(app, path, b'lon=5.5&lat=0.5')
+    assert status == 200
+    assert series['tile'] == 'N01E005'
+    assert sorted(series['seasons']) == ['fall', 'winter']
+    assert series['links'][1]['href'] == 'https://stac.asf.alaska.edu/collections/sentinel-1-global-coherence'
+    assert app.state.readpool.searches[-1]['collections'] == ['sentinel-1-global-coherence']
+
+    assert get(app, path, b'tile=N01E005')[1] == series | {
+        'links': [{**series['links'][0], 'href': f'https://stac.asf.alaska.edu{path}?tile=N01E005'}, series['links'][1]]
+    }
+    assert get(app, path, b'tile=N02E005')[0] == 404
+    assert get(app, path, b'tile=foo')[0] == 400
+    assert get(app, path, b'lon=5.5')[0] == 400
+    assert get(app, path, b'lon=500&lat=0')[0] == 400
@@ -0,0 +1,49 @@
+import json
+from pathlib import Path
+
+import configure_collections
+
+
+COLLECTIONS_DIR = Path(__file__).parent.parent / 'collections'
+
+
+def test_queryable_definition():
+    assert configure_collections.queryable_definition(['spring', 'fall']) == {
+        'type': 'string',
+        'enum': ['fall', 'spring'],
+    }
+    assert configure_collections.queryable_definition([['VV'], ['VH'], ['VV', 'VH']]) == {
+        'type': 'array',
+        'items': {'type': 'string', 'enum': ['VH', 'VV']},
+    }
+    assert configure_collections.queryable_definition({'minimum': 0, 'maximum': 100}) == {
+        'type': 'number',
+        'minimum': 0,
+        'maximum': 100,
+    }
+    assert configure_collections.queryable_definition({'type': 'string', 'pattern': '^foo$'}) == {
+        'type': 'string',
+        'pattern': '^foo$',
+    }
+
+
+def test_get_queryables():
+    collection = json.loads(
+        (COLLECTIONS_DIR / 'sentinel-1-global-coherence' / 'sentinel-1-global-coherence.json').read_text()
+    )
+    queryables = {queryable['name']: queryable for queryable in configure_collections.get_queryables(collection)}
+    assert sorted(queryables) == ['sar:polarizations', 'sar:product_type', 'season', 'tile']
+    assert queryables['sar:polarizations']['property_wrapper'] == 'to_text_array'
+    assert queryables['season']['property_wrapper'] == 'to_text'
+    assert queryables['tile']['property_wrapper'] == 'to_text'
+
+    collection = json.loads((COLLECTIONS_DIR / 'glo-30-hand' / 'glo-30-hand.json').read_text())
+    assert configure_collections.get_queryables(collection) == []
+
+
+def test_get_partition_trunc():
+    for path in COLLECTIONS_DIR.glob('*/*.json'):
+        assert configure_collections.get_partition_trunc(json.loads(path.read_text())) is None
+
+    collection = {'extent': {'temporal': {'interval': [['2020-01-01T00:00:00Z', None]]}}}
+    assert configure_collections.get_partition_trunc(collection) == 'year'
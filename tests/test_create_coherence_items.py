@@ -1,9 +1,14 @@
+import json
 from datetime import datetime, timedelta, timezone
 
 import create_coherence_items
+import pytest
 from create_coherence_items import SEASONS
 from shapely import geometry
 
+import asf_stac_util
+from asf_stac_util import validation
+
 
 def test_season_datetime_averages():
     assert (
@@ -159,3 +164,55 @@ def test_bounding_box_from_tile():
     assert create_coherence_items.bounding_box_from_tile('S01E012') == geometry.box(12, -2, 13, -1)
 
     assert create_coherence_items.bounding_box_from_tile('S78W161') == geometry.box(-161, -79, -160, -78)
+
+
+def test_tile_geometry():
+    assert create_coherence_items.tile_geometry('N49E009') == (
+        {
+            'type': 'Polygon',
+            'coordinates': (((10.0, 48.0), (10.0, 49.0), (9.0, 49.0), (9.0, 48.0), (10.0, 48.0)),),
+        },
+        (9.0, 48.0, 10.0, 49.0),
+    )
+    assert create_coherence_items.tile_geometry('N49E009') is create_coherence_items.tile_geometry('N49E009')
+
+
+def test_create_stac_item_shares_tile_geometry():
+    item_a = create_coherence_items.create_stac_item('data/tiles/N00E005/N00E005_fall_vh_AMP.tif', 'foo.com/')
+    item_b = create_coherence_items.create_stac_item('data/tiles/N00E005/N00E005_fall_vv_AMP.tif', 'foo.com/')
+    assert item_a['geometry'] == item_b['geometry']
+    assert item_a['geometry'] is not item_b['geometry']
+
+
+def test_created_stac_items_are_valid():
+    s3_keys = [
+        'data/tiles/N00E005/N00E005_winter_vv_COH12.tif',
+        'data/tiles/S78W078/S78W078_summer_hh_AMP.tif',
+        'data/tiles/N71E028/N71E028_fall_vh_rho.tif',
+    ]
+    for s3_key in s3_keys:
+        stac_item = create_coherence_items.create_stac_item(s3_key, 'https://foo.com/')
+        assert validation.validate_stac_item(json.loads(asf_stac_util.jsonify_stac_item(stac_item))) == []
+
+
+def test_static_stac_items_known_failures():
+    # The static inc and lsmap tiles have no datetime, which the item schema requires alongside start_datetime and
+    # end_datetime, and no polarization, which the sar extension requires. These are known failures of the item model.
+    for s3_key in ['data/tiles/N00E005/N00E005_124D_inc.tif', 'data/tiles/N00E005/N00E005_124D_lsmap.tif']:
+        stac_item = create_coherence_items.create_stac_item(s3_key, 'https://foo.com/')
+        errors = validation.validate_stac_item(json.loads(asf_stac_util.jsonify_stac_item(stac_item)))
+        assert [failure_type for failure_type, _ in errors] == [
+            'item properties anyOf',
+            'sar properties/sar:polarizations required',
+        ]
+
+
+def test_parse_args_rejects_shards_with_other_outputs(monkeypatch):
+    argv = ['create_coherence_items.py', 'coherence-s3-objects.txt', '--shards', '2']
+    for option in [['--load', 'upsert'], ['--output-file', '-'], ['--geoparquet', 'items.parquet']]:
+        monkeypatch.setattr('sys.argv', [*argv, *option])
+        with pytest.raises(SystemExit):
+            create_coherence_items.parse_args()
+
+    monkeypatch.setattr('sys.argv', argv)
+    assert create_coherence_items.parse_args().shards == 2
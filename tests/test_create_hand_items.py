@@ -1,6 +1,12 @@
+import json
 from datetime import datetime, timezone
+from pathlib import Path
 
 import create_hand_items
+import pytest
+
+import asf_stac_util
+from asf_stac_util import validation
 
 
 def test_get_dem_url():
@@ -17,6 +23,30 @@ def test_get_dem_url():
     assert create_hand_items.get_dem_url('Copernicus_DSM_COG_10_S81_00_W132_00_HAND') == expected
 
 
+def test_verify_dem_links(tmp_path):
+    dem_objects = tmp_path / 'dem-s3-objects.txt'
+    dem_objects.write_text(
+        'Copernicus_DSM_COG_10_N00_00_E005_00_DEM/Copernicus_DSM_COG_10_N00_00_E005_00_DEM.tif\t100\tabc\n'
+        'Copernicus_DSM_COG_10_N00_00_E006_00_DEM/AUXFILES/Copernicus_DSM_COG_10_N00_00_E006_00_EDM.tif\t100\tdef\n'
+    )
+    dem_keys = create_hand_items.load_dem_keys(str(dem_objects))
+    assert dem_keys == {'Copernicus_DSM_COG_10_N00_00_E005_00_DEM/Copernicus_DSM_COG_10_N00_00_E005_00_DEM.tif'}
+
+    s3_keys = [
+        'v1/2021/Copernicus_DSM_COG_10_N00_00_E005_00_HAND.tif',
+        'v1/2021/Copernicus_DSM_COG_10_N00_00_E006_00_HAND.tif',
+    ]
+    stac_items = [create_hand_items.create_stac_item(s3_key, 'https://foo.com/') for s3_key in s3_keys]
+    missing_dem_ids: list[str] = []
+    stac_items = list(create_hand_items.verify_dem_links(stac_items, dem_keys, missing_dem_ids))
+
+    assert [link['href'] for link in stac_items[0]['links']] == [
+        create_hand_items.get_dem_url('Copernicus_DSM_COG_10_N00_00_E005_00_HAND')
+    ]
+    assert stac_items[1]['links'] == []
+    assert missing_dem_ids == ['Copernicus_DSM_COG_10_N00_00_E006_00_HAND']
+
+
 def test_gdal_info():
     assert create_hand_items.gdal_info(
         'v1/2021/Copernicus_DSM_COG_10_N02_00_W062_00_HAND.tif',
@@ -35,6 +65,56 @@ def test_gdal_info():
     }
 
 
+def test_geometry_from_item_id():
+    assert create_hand_items.geometry_from_item_id('Copernicus_DSM_COG_10_N02_00_W062_00_HAND') == {
+        'type': 'Polygon',
+        'coordinates': [
+            [
+                [-62.0001389, 3.0001389],
+                [-62.0001389, 2.0001389],
+                [-61.0001389, 2.0001389],
+                [-61.0001389, 3.0001389],
+                [-62.0001389, 3.0001389],
+            ]
+        ],
+    }
+
+    assert create_hand_items.geometry_from_item_id('Copernicus_DSM_COG_10_N00_00_E006_00_HAND') == {
+        'type': 'Polygon',
+        'coordinates': [
+            [
+                [5.9998611, 1.0001389],
+                [5.9998611, 0.0001389],
+                [6.9998611, 0.0001389],
+                [6.9998611, 1.0001389],
+                [5.9998611, 1.0001389],
+            ]
+        ],
+    }
+
+    # longitude pixel spacing is 5 arcseconds between 80 and 85 degrees
+    assert create_hand_items.geometry_from_item_id('Copernicus_DSM_COG_10_S81_00_W132_00_HAND') == {
+        'type': 'Polygon',
+        'coordinates': [
+            [
+                [-132.0006944, -79.9998611],
+                [-132.0006944, -80.9998611],
+                [-131.0006944, -80.9998611],
+                [-131.0006944, -79.9998611],
+                [-132.0006944, -79.9998611],
+            ]
+        ],
+    }
+
+
+def test_geometries_are_close():
+    geometry = create_hand_items.geometry_from_item_id('Copernicus_DSM_COG_10_N02_00_W062_00_HAND')
+    assert create_hand_items.geometries_are_close(geometry, geometry)
+
+    shifted = {'type': 'Polygon', 'coordinates': [[[x + 0.0001, y] for x, y in geometry['coordinates'][0]]]}
+    assert not create_hand_items.geometries_are_close(geometry, shifted)
+
+
 def test_create_stac_item():
     expected = {
         'type': 'Feature',
@@ -99,3 +179,108 @@ def test_create_stac_item():
         )
         == expected
     )
+
+    assert (
+        create_hand_items.create_stac_item('v1/2021/Copernicus_DSM_COG_10_N00_00_E006_00_HAND.tif', 'foo.com/')
+        == expected
+    )
+
+
+def test_created_stac_items_are_valid():
+    for s3_key in [
+        'v1/2021/Copernicus_DSM_COG_10_N00_00_E006_00_HAND.tif',
+        'v1/2021/Copernicus_DSM_COG_10_S78_00_W078_00_HAND.tif',
+    ]:
+        stac_item = create_hand_items.create_stac_item(s3_key, 'https://foo.com/')
+        assert validation.validate_stac_item(json.loads(asf_stac_util.jsonify_stac_item(stac_item))) == []
+
+
+def test_fetch_gdal_info(monkeypatch):
+    def mock_gdal_info(s3_key, s3_url):
+        if s3_key == 'bad.tif':
+            raise RuntimeError('HTTP response code: 503')
+        return {'wgs84Extent': s3_url + s3_key}
+
+    monkeypatch.setattr(create_hand_items, 'gdal_info', mock_gdal_info)
+
+    s3_keys = [f'{n}.tif' for n in range(20)] + ['bad.tif', '20.tif']
+    assert list(create_hand_items.fetch_gdal_info(s3_keys, 'foo.com/', workers=3, retries=0)) == [
+        (s3_key, None if s3_key == 'bad.tif' else {'wgs84Extent': f'foo.com/{s3_key}'}) for s3_key in s3_keys
+    ]
+
+
+def test_gdal_info_cache(tmp_path):
+    cache_file = tmp_path / 'cache.sqlite'
+
+    with create_hand_items.GdalInfoCache(cache_file) as cache:
+        assert cache.get('a.tif', 'etag1') is None
+        cache.put('a.tif', 'etag1', {'wgs84Extent': 'a'})
+        cache.put('b.tif', 'etag2', {'wgs84Extent': 'b'})
+        assert cache.get('a.tif', 'etag1') == {'wgs84Extent': 'a'}
+        assert cache.get('a.tif', 'etag3') is None
+
+    with create_hand_items.GdalInfoCache(cache_file, max_entries=1) as cache:
+        assert cache.get('b.tif', 'etag2') == {'wgs84Extent': 'b'}
+
+    with create_hand_items.GdalInfoCache(cache_file) as cache:
+        assert cache.get('a.tif', 'etag1') is None
+        assert cache.get('b.tif', 'etag2') == {'wgs84Extent': 'b'}
+
+
+def test_gdal_info_cache_without_close(tmp_path):
+    cache_file = tmp_path / 'cache.sqlite'
+
+    # An interrupted run never closes the cache, which discards only the entries since the last commit
+    cache = create_hand_items.GdalInfoCache(cache_file, commit_every=2)
+    for name in ['a', 'b', 'c']:
+        cache.put(f'{name}.tif', 'etag', {'wgs84Extent': name})
+    cache._connection.close()
+
+    with create_hand_items.GdalInfoCache(cache_file) as cache:
+        assert cache.get('a.tif', 'etag') == {'wgs84Extent': 'a'}
+        assert cache.get('b.tif', 'etag') == {'wgs84Extent': 'b'}
+        assert cache.get('c.tif', 'etag') is None
+
+
+def test_fetch_gdal_info_with_cache(monkeypatch, tmp_path):
+    requested_keys = []
+
+    def mock_gdal_info(s3_key, s3_url):
+        requested_keys.append(s3_key)
+        return {'wgs84Extent': s3_key}
+
+    monkeypatch.setattr(create_hand_items, 'gdal_info', mock_gdal_info)
+
+    s3_keys = ['a.tif', 'b.tif', 'c.tif']
+    expected = [(s3_key, {'wgs84Extent': s3_key}) for s3_key in s3_keys]
+
+    with create_hand_items.GdalInfoCache(tmp_path / 'cache.sqlite') as cache:
+        etags = {'a.tif': '1', 'b.tif': '1', 'c.tif': '1'}
+        assert list(create_hand_items.fetch_gdal_info(s3_keys, 'foo.com/', cache=cache, etags=etags)) == expected
+        assert requested_keys == ['a.tif', 'b.tif', 'c.tif']
+
+        etags = {'a.tif': '1', 'b.tif': '2', 'c.tif': '1'}
+        assert list(create_hand_items.fetch_gdal_info(s3_keys, 'foo.com/', cache=cache, etags=etags)) == expected
+        assert requested_keys == ['a.tif', 'b.tif', 'c.tif', 'b.tif']
+
+
+def test_parse_args_rejects_cache(monkeypatch):
+    for option in [['--offline-geometry'], ['--shards', '2']]:
+        monkeypatch.setattr('sys.argv', ['create_hand_items.py', 'hand-s3-objects.txt', '--cache', 'cache.db', *option])
+        with pytest.raises(SystemExit):
+            create_hand_items.parse_args()
+
+    monkeypatch.setattr('sys.argv', ['create_hand_items.py', 'hand-s3-objects.txt', '--cache', 'cache.db'])
+    assert create_hand_items.parse_args().cache == Path('cache.db')
+
+
+def test_parse_args_rejects_shards_with_other_outputs(monkeypatch):
+    for option in [['--load', 'upsert'], ['--output-file', '-'], ['-o', '-']]:
+        monkeypatch.setattr('sys.argv', ['create_hand_items.py', 'hand-s3-objects.txt', '--shards', '2', *option])
+        with pytest.raises(SystemExit):
+            create_hand_items.parse_args()
+
+    monkeypatch.setattr(
+        'sys.argv', ['create_hand_items.py', 'hand-s3-objects.txt', '--shards', '2', '-o', 'out.ndjson']
+    )
+    assert create_hand_items.parse_args().shards == 2
@@ -0,0 +1,64 @@
+from datetime import datetime, timezone
+from pathlib import PurePath
+
+import create_coherence_items
+import generate_synthetic_items
+
+from asf_stac_util import tiles
+
+
+def test_tiles():
+    assert list(generate_synthetic_items.tiles([-1, 0, 1, 2])) == [(0, -1), (0, 0), (1, -1), (1, 0)]
+    assert (
+        0.24 * 360 * 180
+        < len(list(generate_synthetic_items.tiles([-180, -90, 180, 90], land_fraction=0.25)))
+        < 0.26 * 360 * 180
+    )
+
+
+def test_coherence_tile():
+    for lat, lon in [(0, 0), (-1, 5), (-30, -120), (45, 179), (-90, -180)]:
+        tile = tiles.coherence_tile(lat, lon)
+        assert create_coherence_items.bounding_box_from_tile(tile).bounds == (lon, lat, lon + 1, lat + 1)
+
+
+def test_hand_s3_key():
+    assert generate_synthetic_items.hand_s3_key(2, -62) == 'v1/2021/Copernicus_DSM_COG_10_N02_00_W062_00_HAND.tif'
+    for lat, lon in [(0, 0), (-1, 5), (-30, -120), (45, 179), (-90, -180)]:
+        item_id = PurePath(generate_synthetic_items.hand_s3_key(lat, lon)).stem
+        assert tiles.parse_hand_item_id(item_id) == (lat, lon)
+
+
+def test_coherence_s3_keys():
+    keys = generate_synthetic_items.coherence_s3_keys(0, 5)
+    assert len(keys) == 46
+    assert keys[:3] == [
+        'data/tiles/N01E005/N01E005_124D_inc.tif',
+        'data/tiles/N01E005/N01E005_124D_lsmap.tif',
+        'data/tiles/N01E005/N01E005_winter_vv_AMP.tif',
+    ]
+    assert 'data/tiles/N01E005/N01E005_fall_vh_AMP.tif' in keys
+
+    assert 'data/tiles/S69W050/S69W050_summer_hh_COH12.tif' in generate_synthetic_items.coherence_s3_keys(-70, -50)
+
+
+def test_generate_stac_items():
+    stac_items = list(generate_synthetic_items.generate_stac_items([0, 0, 2, 1]))
+    assert len(stac_items) == 2 * (46 + 1)
+    assert stac_items[-1]['id'] == 'Copernicus_DSM_COG_10_N00_00_E001_00_HAND'
+    assert stac_items[-1]['assets']['data']['href'] == (
+        'https://glo-30-hand.s3.us-west-2.amazonaws.com/v1/2021/Copernicus_DSM_COG_10_N00_00_E001_00_HAND.tif'
+    )
+
+    stac_items = list(
+        generate_synthetic_items.generate_stac_items(
+            [0, 0, 2, 1], collections=['sentinel-1-global-coherence'], years=[2020, 2021]
+        )
+    )
+    assert len(stac_items) == 2 * 2 * 46
+    assert len({stac_item['id'] for stac_item in stac_items}) == len(stac_items)
+
+    stac_item = next(stac_item for stac_item in stac_items if stac_item['id'] == 'N01E000_winter_vv_COH12_2021')
+    assert stac_item['properties']['start_datetime'] == datetime(2020, 12, 1, tzinfo=timezone.utc)
+    assert stac_item['properties']['datetime'] == datetime(2021, 1, 14, 12, tzinfo=timezone.utc)
+    assert stac_item['properties']['end_datetime'] == datetime(2021, 2, 28, tzinfo=timezone.utc)
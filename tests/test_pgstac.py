@@ -0,0 +1,90 @@
+"""Integration tests of asf_stac_util.pgstac against a pgstac database, run by `make test-pgstac`.
+
+They are skipped unless PGSTAC_INTEGRATION_TESTS is set, and connect with the PGHOST, PGPORT, PGDATABASE, PGUSER, and
+PGPASSWORD environment variables. They create and delete their own test collections.
+"""
+
+import os
+from datetime import datetime, timezone
+from typing import Optional
+
+import pytest
+
+from asf_stac_util import pgstac
+
+
+pytestmark = pytest.mark.skipif(
+    not os.environ.get('PGSTAC_INTEGRATION_TESTS'), reason='requires a pgstac database, see make test-pgstac'
+)
+
+
+def execute(query: str, params: Optional[list] = None) -> list[tuple]:
+    from pypgstac.db import PgstacDB
+
+    with PgstacDB() as db:
+        cursor = db.connect().execute(query, params)
+        return cursor.fetchall() if cursor.description else []
+
+
+def stac_collection(collection_id: str, description: str) -> dict:
+    return {
+        'type': 'Collection',
+        'stac_version': '1.0.0',
+        'id': collection_id,
+        'description': description,
+        'license': 'proprietary',
+        'links': [],
+        'extent': {
+            'spatial': {'bbox': [[-180.0, -90.0, 180.0, 90.0]]},
+            'temporal': {'interval': [['2019-01-01T00:00:00Z', None]]},
+        },
+    }
+
+
+def stac_item(item_id: str, collection_id: str, item_datetime: datetime) -> dict:
+    return {
+        'type': 'Feature',
+        'stac_version': '1.0.0',
+        'id': item_id,
+        'collection': collection_id,
+        'properties': {'datetime': item_datetime},
+        'geometry': {'type': 'Point', 'coordinates': [5.5, 0.5]},
+        'bbox': [5.5, 0.5, 5.5, 0.5],
+        'assets': {},
+        'links': [],
+        'stac_extensions': [],
+    }
+
+
+def item_ids(collection_id: str) -> list[str]:
+    return [row[0] for row in execute('SELECT id FROM items WHERE collection = %s ORDER BY id', [collection_id])]
+
+
+@pytest.mark.parametrize('partition_trunc', [None, 'year'])
+def test_promote_staging_collection(partition_trunc):
+    collection_id = f'asf-stac-test-{partition_trunc or "none"}'
+    staging_id = pgstac.staging_collection_id(collection_id)
+    execute('DELETE FROM collections WHERE id = ANY(%s)', [[collection_id, staging_id]])
+
+    pgstac.load_collections([stac_collection(collection_id, 'old')])
+    execute('UPDATE collections SET partition_trunc = %s WHERE id = %s', [partition_trunc, collection_id])
+    pgstac.load_stac_items([stac_item('old', collection_id, datetime(2019, 6, 1, tzinfo=timezone.utc))])
+
+    # The new items span two years, so with partition_trunc = 'year' they are copied into two partitions
+    new_items = [
+        stac_item('new-1', collection_id, datetime(2019, 12, 31, tzinfo=timezone.utc)),
+        stac_item('new-2', collection_id, datetime(2020, 1, 1, tzinfo=timezone.utc)),
+    ]
+    try:
+        pgstac.load_staging_collection(stac_collection(collection_id, 'new'), new_items)
+        assert item_ids(collection_id) == ['old']
+        assert item_ids(staging_id) == ['new-1', 'new-2']
+
+        assert pgstac.promote_staging_collection(stac_collection(collection_id, 'new')) == 2
+        assert item_ids(collection_id) == ['new-1', 'new-2']
+        assert execute('SELECT id FROM collections WHERE id = %s', [staging_id]) == []
+        assert execute(
+            "SELECT content->>'description', partition_trunc FROM collections WHERE id = %s", [collection_id]
+        ) == [('new', partition_trunc)]
+    finally:
+        execute('DELETE FROM collections WHERE id = ANY(%s)', [[collection_id, staging_id]])
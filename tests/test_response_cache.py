@@ -0,0 +1,142 @@
+import asyncio
+import json
+
+import response_cache
+
+
+class Clock:
+    def __init__(self):
+        self.time = 0.0
+
+    def __call__(self):
+        return self.time
+
+
+def make_app(calls: list):
+    async def app(scope, receive, send):
+        message = await receive()
+        calls.append((scope['method'], scope['path'], message.get('body', b'')))
+        body = json.dumps({'path': scope['path'], 'calls': len(calls)}).encode()
+        status = 404 if scope['path'] == '/missing' else 200
+        await send(
+            {'type': 'http.response.start', 'status': status, 'headers': [(b'content-type', b'application/json')]}
+        )
+        await send({'type': 'http.response.body', 'body': body})
+
+    return app
+
+
+def request(app, method: str, path: str, query: bytes = b'', body: bytes = b'', headers=()) -> tuple[int, dict, bytes]:
+    scope = {
+        'type': 'http',
+        'method': method,
+        'scheme': 'https',
+        'path': path,
+        'query_string': query,
+        'headers': [(b'host', b'stac.asf.alaska.edu'), *headers],
+    }
+    status, response_headers, response_body = asyncio.run(
+        response_cache.call_app(app, scope, response_cache.replay_body(body))
+    )
+    return status, dict(response_headers), response_body
+
+
+def test_response_cache():
+    clock = Clock()
+    cache = response_cache.ResponseCache(max_entries=2, ttl=10, clock=clock)
+
+    cache.put(('a',), 200, [], b'a')
+    cache.put(('b',), 200, [], b'b')
+    assert cache.get(('a',)).body == b'a'
+
+    cache.put(('c',), 200, [], b'c')
+    assert cache.get(('b',)) is None
+    assert cache.get(('c',)).body == b'c'
+
+    clock.time = 10
+    assert cache.get(('a',)) is None
+    assert len(cache) == 1
+
+    assert cache.hits == 2
+    assert cache.misses == 2
+    assert cache.hit_rate == 0.5
+
+
+def test_request_key():
+    def scope(query=b'', headers=()):
+        return {'method': 'GET', 'path': '/search', 'query_string': query, 'headers': list(headers)}
+
+    assert response_cache.request_key(scope(b'limit=1&bbox=0,0,1,1'), b'') == response_cache.request_key(
+        scope(b'bbox=0,0,1,1&limit=1'), b''
+    )
+    assert response_cache.request_key(scope(), b'{"limit": 1, "bbox": [0, 0, 1, 1]}') == response_cache.request_key(
+        scope(), b'{"bbox":[0,0,1,1],"limit":1}'
+    )
+    assert response_cache.request_key(scope(headers=[(b'host', b'a')]), b'') != response_cache.request_key(
+        scope(headers=[(b'host', b'b')]), b''
+    )
+    assert response_cache.request_key(scope(headers=[(b'user-agent', b'a')]), b'') == response_cache.request_key(
+        scope(headers=[(b'user-agent', b'b')]), b''
+    )
+    assert response_cache.request_key(scope(), b'not json') is None
+
+
+def test_etag_matches():
+    assert response_cache.etag_matches(b'"abc"', b'"abc"')
+    assert response_cache.etag_matches(b'"abc"', b'"def", W/"abc"')
+    assert response_cache.etag_matches(b'"abc"', b'*')
+    assert not response_cache.etag_matches(b'"abc"', b'"def"')
+
+
+def test_response_cache_middleware():
+    calls = []
+    cache = response_cache.ResponseCache(clock=Clock())
+    app = response_cache.ResponseCacheMiddleware(make_app(calls), cache, max_age=30)
+
+    status, headers, body = request(app, 'GET', '/collections')
+    assert status == 200
+    assert headers[b'x-cache'] == b'MISS'
+    assert headers[b'cache-control'] == b'public, max-age=30'
+    assert json.loads(body) == {'path': '/collections', 'calls': 1}
+
+    status, headers, body = request(app, 'GET', '/collections')
+    assert status == 200
+    assert headers[b'x-cache'] == b'HIT'
+    assert json.loads(body) == {'path': '/collections', 'calls': 1}
+    etag = headers[b'etag']
+
+    status, headers, body = request(app, 'GET', '/collections', headers=[(b'if-none-match', etag)])
+    assert status == 304
+    assert headers[b'etag'] == etag
+    assert body == b''
+
+    assert request(app, 'POST', '/search', body=b'{"limit": 1, "ids": ["a"]}')[1][b'x-cache'] == b'MISS'
+    assert request(app, 'POST', '/search', body=b'{"ids": ["a"], "limit": 1}')[1][b'x-cache'] == b'HIT'
+    assert calls[-1] == ('POST', '/search', b'{"limit": 1, "ids": ["a"]}')
+
+    assert request(app, 'GET', '/missing')[0] == 404
+    assert request(app, 'GET', '/missing')[0] == 404
+    assert request(app, 'DELETE', '/collections')[0] == 200
+    assert len(calls) == 5
+
+
+def test_response_cache_middleware_version():
+    calls = []
+    clock = Clock()
+    versions = ['1']
+
+    async def get_version():
+        return versions[-1]
+
+    cache = response_cache.ResponseCache(clock=clock)
+    app = response_cache.ResponseCacheMiddleware(
+        make_app(calls), cache, get_version=get_version, version_check_interval=5
+    )
+
+    assert request(app, 'GET', '/collections')[1][b'x-cache'] == b'MISS'
+    versions.append('2')
+    assert request(app, 'GET', '/collections')[1][b'x-cache'] == b'HIT'
+
+    clock.time = 5
+    assert request(app, 'GET', '/collections')[1][b'x-cache'] == b'MISS'
+    assert request(app, 'GET', '/collections')[1][b'x-cache'] == b'HIT'
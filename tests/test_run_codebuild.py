@@ -0,0 +1,125 @@
+import pytest
+import run_codebuild
+from botocore.exceptions import ClientError
+
+
+class StubCodeBuild:
+    """Return the next of a list of statuses for each build from each batch_get_builds call."""
+
+    def __init__(self, statuses: dict[str, list[str]]):
+        self.statuses = statuses
+        self.calls: list[list[str]] = []
+        self.stopped: list[str] = []
+
+    def start_build(self, projectName: str) -> dict:
+        return {'build': {'id': f'{projectName}:1', 'buildStatus': 'IN_PROGRESS'}}
+
+    def batch_get_builds(self, ids: list[str]) -> dict:
+        self.calls.append(list(ids))
+        builds = []
+        for build_id in ids:
+            statuses = self.statuses[build_id]
+            status = statuses.pop(0) if len(statuses) > 1 else statuses[0]
+            logs = {'groupName': f'/aws/codebuild/{build_id.split(":")[0]}', 'streamName': build_id.split(':')[1]}
+            builds.append({'id': build_id, 'buildStatus': status, 'logs': logs})
+        return {'builds': builds}
+
+    def stop_build(self, id: str) -> dict:
+        self.stopped.append(id)
+        return {'build': {'id': id, 'buildStatus': 'STOPPED'}}
+
+
+class StubLogs:
+    """Return each of a list of event batches once, then no more events."""
+
+    def __init__(self, events: dict[str, list[list[str]]]):
+        self.events = events
+        self.missing = set()
+        self.denied = set()
+        self.calls = 0
+
+    def get_log_events(self, logGroupName: str, logStreamName: str, startFromHead=False, nextToken=None) -> dict:
+        self.calls += 1
+        if logGroupName in self.missing:
+            self.missing.remove(logGroupName)
+            raise ClientError({'Error': {'Code': 'ResourceNotFoundException'}}, 'GetLogEvents')
+        if logGroupName in self.denied:
+            raise ClientError({'Error': {'Code': 'AccessDeniedException'}}, 'GetLogEvents')
+        batches = self.events.get(logGroupName, [])
+        position = int(nextToken or 0)
+        if position < len(batches):
+            return {
+                'events': [{'message': message} for message in batches[position]],
+                'nextForwardToken': str(position + 1),
+            }
+        return {'events': [], 'nextForwardToken': str(position)}
+
+
+def test_wait_for_builds(capsys):
+    codebuild = StubCodeBuild(
+        {
+            'a:1': ['IN_PROGRESS', 'IN_PROGRESS', 'IN_PROGRESS', 'IN_PROGRESS', 'SUCCEEDED'],
+            'b:1': ['IN_PROGRESS', 'SUCCEEDED'],
+        }
+    )
+    logs = StubLogs({'/aws/codebuild/a': [['line 1\n', 'line 2\n']]})
+    logs.missing.add('/aws/codebuild/a')
+    delays: list[float] = []
+
+    statuses = run_codebuild.wait_for_builds(
+        codebuild, logs, {'a:1': 'a', 'b:1': 'b'}, min_delay=1, max_delay=4, sleep=delays.append
+    )
+
+    assert statuses == {'a:1': 'SUCCEEDED', 'b:1': 'SUCCEEDED'}
+    assert codebuild.calls == [['a:1', 'b:1'], ['a:1', 'b:1'], ['a:1'], ['a:1'], ['a:1']]
+    # The log lines and b finishing reset the delay, which then doubles up to max_delay
+    assert delays == [1, 1, 2, 4]
+    assert capsys.readouterr().out.splitlines() == [
+        'Build status of a: IN_PROGRESS',
+        'Build status of b: IN_PROGRESS',
+        '[a] line 1',
+        '[a] line 2',
+        'Build status of b: SUCCEEDED',
+        'Build status of a: SUCCEEDED',
+    ]
+
+
+def test_wait_for_builds_failure():
+    codebuild = StubCodeBuild({'a:1': ['IN_PROGRESS'], 'b:1': ['IN_PROGRESS', 'FAILED'], 'c:1': ['SUCCEEDED']})
+    delays: list[float] = []
+
+    statuses = run_codebuild.wait_for_builds(
+        codebuild, StubLogs({}), {'a:1': 'a', 'b:1': 'b', 'c:1': 'c'}, sleep=delays.append
+    )
+
+    assert statuses == {'a:1': 'IN_PROGRESS', 'b:1': 'FAILED', 'c:1': 'SUCCEEDED'}
+    assert len(codebuild.calls) == 2
+    assert len(delays) == 1
+
+
+def test_wait_for_builds_log_errors(capsys):
+    codebuild = StubCodeBuild({'a:1': ['IN_PROGRESS', 'IN_PROGRESS', 'SUCCEEDED']})
+    logs = StubLogs({})
+    logs.denied.add('/aws/codebuild/a')
+
+    statuses = run_codebuild.wait_for_builds(codebuild, logs, {'a:1': 'a'}, sleep=lambda delay: None)
+
+    # A log that cannot be read is skipped with a warning, without stopping the build or reading it again
+    assert statuses == {'a:1': 'SUCCEEDED'}
+    assert logs.calls == 1
+    assert 'Warning: not printing the log of a' in capsys.readouterr().err
+
+
+def test_main(monkeypatch):
+    codebuild = StubCodeBuild({'a:1': ['IN_PROGRESS'], 'b:1': ['FAILED']})
+    clients = {'codebuild': codebuild, 'logs': StubLogs({})}
+    monkeypatch.setattr(run_codebuild, 'get_client', clients.get)
+    monkeypatch.setenv('CODEBUILD_PROJECT', 'a,b')
+
+    with pytest.raises(SystemExit, match='CodeBuild failed: b with status FAILED'):
+        run_codebuild.main([])
+    assert codebuild.stopped == ['a:1']
+
+    codebuild.statuses = {'c:1': ['SUCCEEDED']}
+    run_codebuild.main(['c'])
+    assert codebuild.stopped == ['a:1']
@@ -0,0 +1,241 @@
+import asyncio
+import gzip
+import json
+import random
+from urllib.parse import parse_qs, urlsplit
+
+import brotli
+import pytest
+from brotli_asgi import BrotliMiddleware
+from create_coherence_items import bounding_box_from_tile
+from create_hand_items import geometry_from_item_id
+from shapely import geometry
+
+import response_cache
+import tile_search
+from asf_stac_util import tiles
+
+
+def test_coherence_tiles():
+    assert tile_search.coherence_tiles((5.5, 0.5, 5.5, 0.5)) == ['N01E005']
+    assert tile_search.coherence_tiles((5.2, 0.2, 6.8, 0.8)) == ['N01E005', 'N01E006']
+    assert tile_search.coherence_tiles((5, 0, 5, 0)) == ['N00E004', 'N00E005', 'N01E004', 'N01E005']
+    assert tile_search.coherence_tiles((-180, -90, -180, -90)) == ['S89W180']
+    assert tile_search.coherence_tiles((180, 90, 180, 90)) == ['N90E179']
+
+
+def test_hand_item_ids():
+    assert tile_search.hand_item_ids((5.5, 0.5, 5.5, 0.5)) == ['Copernicus_DSM_COG_10_N00_00_E005_00_HAND']
+    # Tiles are shifted half a pixel up and to the left, so the corner of a grid cell is inside the tile to its south
+    assert tile_search.hand_item_ids((5, 0, 5, 0)) == ['Copernicus_DSM_COG_10_S01_00_E005_00_HAND']
+    assert tile_search.hand_item_ids((5.9998611, 0.5, 5.9998611, 0.5)) == [
+        'Copernicus_DSM_COG_10_N00_00_E005_00_HAND',
+        'Copernicus_DSM_COG_10_N00_00_E006_00_HAND',
+    ]
+
+
+def test_tile_lookups_match_item_geometries():
+    rng = random.Random(0)
+    for _ in range(500):
+        min_lon, min_lat = rng.uniform(-20, 20), rng.uniform(-88, 88)
+        size = rng.choice([0, 0.0001, 0.5, 2])
+        bbox = (min_lon, min_lat, min_lon + rng.uniform(0, size), min_lat + rng.uniform(0, size))
+        if rng.random() < 0.2:
+            bbox = tuple(float(round(value)) for value in bbox)
+        box = geometry.box(*bbox)
+
+        candidates = [
+            (lat, lon)
+            for lat in range(int(bbox[1]) - 3, int(bbox[3]) + 3)
+            for lon in range(int(bbox[0]) - 3, int(bbox[2]) + 3)
+        ]
+        assert tile_search.coherence_tiles(bbox) == [
+            tiles.coherence_tile(lat, lon)
+            for lat, lon in candidates
+            if bounding_box_from_tile(tiles.coherence_tile(lat, lon)).intersects(box)
+        ]
+        assert sorted(tile_search.hand_item_ids(bbox)) == sorted(
+            tiles.hand_item_id(lat, lon)
+            for lat, lon in candidates
+            if geometry.shape(geometry_from_item_id(tiles.hand_item_id(lat, lon))).intersects(box)
+        )
+
+
+def test_get_tile_lookup():
+    search = {'collections': ['sentinel-1-global-coherence'], 'bbox': [5.2, 0.2, 6.8, 0.8], 'limit': 10}
+    assert tile_search.get_tile_lookup(search) == {'query': {'tile': {'in': ['N01E005', 'N01E006']}}}
+
+    search = {
+        'collections': ['sentinel-1-global-coherence'],
+        'intersects': {'type': 'Point', 'coordinates': [5.5, 0.5]},
+        'query': {'season': {'eq': 'fall'}},
+    }
+    assert tile_search.get_tile_lookup(search) == {'query': {'season': {'eq': 'fall'}, 'tile': {'in': ['N01E005']}}}
+
+    search = {'collections': ['glo-30-hand'], 'bbox': [5.2, 0.2, 5.8, 0.8]}
+    assert tile_search.get_tile_lookup(search) == {'ids': ['Copernicus_DSM_COG_10_N00_00_E005_00_HAND']}
+
+    bbox = [5.2, 0.2, 5.8, 0.8]
+    assert tile_search.get_tile_lookup({'bbox': bbox}) is None
+    assert (
+        tile_search.get_tile_lookup({'collections': ['sentinel-1-global-coherence', 'glo-30-hand'], 'bbox': bbox})
+        is None
+    )
+    assert tile_search.get_tile_lookup({'collections': ['other'], 'bbox': bbox}) is None
+    assert tile_search.get_tile_lookup({'collections': ['glo-30-hand'], 'bbox': bbox, 'ids': ['foo']}) is None
+    assert tile_search.get_tile_lookup({'collections': ['glo-30-hand'], 'bbox': bbox, 'filter': 'foo'}) is None
+    assert tile_search.get_tile_lookup({'collections': ['glo-30-hand'], 'bbox': [0, 0, 10, 10]}) is None
+    assert tile_search.get_tile_lookup({'collections': ['glo-30-hand'], 'bbox': [179.5, 0, -179.5, 1]}) is None
+    assert (
+        tile_search.get_tile_lookup(
+            {
+                'collections': ['glo-30-hand'],
+                'intersects': {'type': 'Polygon', 'coordinates': [[[5, 0], [6, 0], [5, 1]]]},
+            }
+        )
+        is None
+    )
+    assert (
+        tile_search.get_tile_lookup(
+            {'collections': ['sentinel-1-global-coherence'], 'bbox': bbox, 'query': {'tile': {'eq': 'N01E005'}}}
+        )
+        is None
+    )
+
+
+def test_rewrite_query_string():
+    query_string = tile_search.rewrite_query_string(b'collections=glo-30-hand&bbox=5.2,0.2,5.8,0.8&limit=10')
+    assert parse_qs(query_string.decode()) == {
+        'collections': ['glo-30-hand'],
+        'ids': ['Copernicus_DSM_COG_10_N00_00_E005_00_HAND'],
+        'limit': ['10'],
+    }
+
+    query_string = tile_search.rewrite_query_string(b'collections=sentinel-1-global-coherence&bbox=5.2,0.2,5.8,0.8')
+    params = parse_qs(query_string.decode())
+    assert json.loads(params.pop('query')[0]) == {'tile': {'in': ['N01E005']}}
+    assert params == {'collections': ['sentinel-1-global-coherence']}
+
+    assert tile_search.rewrite_query_string(b'collections=glo-30-hand&bbox=foo') is None
+    assert tile_search.rewrite_query_string(b'collections=glo-30-hand') is None
+
+
+class FakeApp:
+    """Respond with the self and next links that stac-fastapi builds from the (possibly rewritten) request."""
+
+    def __init__(self):
+        self.requests = []
+
+    async def __call__(self, scope, receive, send):
+        body = await response_cache.read_body(receive)
+        self.requests.append((scope, body))
+        url = f'http://localhost{scope["path"]}?{scope["query_string"].decode()}'
+        if scope['method'] == 'GET':
+            next_link = {'rel': 'next', 'href': f'{url}&token=next:abc'}
+        else:
+            next_link = {
+                'rel': 'next',
+                'href': url,
+                'method': 'POST',
+                'body': {**json.loads(body), 'token': 'next:abc'},
+            }
+        response = {
+            'type': 'FeatureCollection',
+            'features': [{'type': 'Feature', 'id': f'item-{i}'} for i in range(20)],
+            'links': [{'rel': 'self', 'href': url}, {'rel': 'root', 'href': 'http://localhost/'}, next_link],
+        }
+        response_body = json.dumps(response).encode()
+        headers = [
+            (b'content-type', b'application/geo+json'),
+            (b'content-length', str(len(response_body)).encode()),
+        ]
+        await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': response_body})
+
+
+def request(app, method: str, path: str, query_string: bytes = b'', body: bytes = b'') -> dict:
+    scope = {
+        'type': 'http',
+        'method': method,
+        'path': path,
+        'query_string': query_string,
+        'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())],
+    }
+    _, headers, response_body = asyncio.run(response_cache.call_app(app, scope, response_cache.replay_body(body)))
+    assert dict(headers)[b'content-length'] == str(len(response_body)).encode()
+    return json.loads(response_body)
+
+
+def links(response: dict) -> dict:
+    return {link['rel']: link for link in response['links']}
+
+
+def test_tile_search_middleware():
+    app = FakeApp()
+    middleware = tile_search.TileSearchMiddleware(app)
+
+    body = json.dumps({'collections': ['glo-30-hand'], 'bbox': [5.2, 0.2, 5.8, 0.8], 'limit': 10}).encode()
+    request(middleware, 'POST', '/search', body=body)
+    scope, forwarded_body = app.requests[-1]
+    assert json.loads(forwarded_body) == {
+        'collections': ['glo-30-hand'],
+        'limit': 10,
+        'ids': ['Copernicus_DSM_COG_10_N00_00_E005_00_HAND'],
+    }
+    assert dict(scope['headers'])[b'content-length'] == str(len(forwarded_body)).encode()
+
+    request(middleware, 'GET', '/search', query_string=b'collections=glo-30-hand&bbox=5.2,0.2,5.8,0.8')
+    assert b'bbox' not in app.requests[-1][0]['query_string']
+
+    body = json.dumps({'collections': ['glo-30-hand'], 'bbox': [0, 0, 10, 10]}).encode()
+    request(middleware, 'POST', '/search', body=body)
+    assert app.requests[-1][1] == body
+
+    request(middleware, 'GET', '/collections/glo-30-hand/items', query_string=b'bbox=5.2,0.2,5.8,0.8')
+    assert app.requests[-1][0]['query_string'] == b'bbox=5.2,0.2,5.8,0.8'
+
+
+def test_tile_search_middleware_restores_links():
+    middleware = tile_search.TileSearchMiddleware(FakeApp())
+
+    search = {'collections': ['glo-30-hand'], 'bbox': [5.2, 0.2, 5.8, 0.8], 'limit': 10}
+    response = request(middleware, 'POST', '/search', body=json.dumps(search).encode())
+    assert links(response)['next']['body'] == {**search, 'token': 'next:abc'}
+    assert links(response)['root'] == {'rel': 'root', 'href': 'http://localhost/'}
+
+    query_string = b'collections=glo-30-hand&bbox=5.2,0.2,5.8,0.8&token=prev:xyz'
+    response = request(middleware, 'GET', '/search', query_string=query_string)
+    self_url = urlsplit(links(response)['self']['href'])
+    assert self_url.path == '/search'
+    assert parse_qs(self_url.query) == parse_qs(query_string.decode())
+    assert parse_qs(urlsplit(links(response)['next']['href']).query) == {
+        'collections': ['glo-30-hand'],
+        'bbox': ['5.2,0.2,5.8,0.8'],
+        'token': ['next:abc'],
+    }
+
+    response = request(middleware, 'GET', '/search', query_string=b'collections=glo-30-hand&bbox=0,0,10,10')
+    assert links(response)['self']['href'] == 'http://localhost/search?collections=glo-30-hand&bbox=0,0,10,10'
+
+
+@pytest.mark.parametrize('encoding, decompress', [(b'gzip', gzip.decompress), (b'br', brotli.decompress)])
+def test_tile_search_middleware_restores_compressed_links(encoding, decompress):
+    # The pgstac app compresses its responses with BrotliMiddleware, which falls back to gzip
+    middleware = tile_search.TileSearchMiddleware(BrotliMiddleware(FakeApp()))
+    scope = {
+        'type': 'http',
+        'method': 'GET',
+        'path': '/search',
+        'query_string': b'collections=glo-30-hand&bbox=5.2,0.2,5.8,0.8',
+        'headers': [(b'accept-encoding', encoding)],
+    }
+    _, headers, body = asyncio.run(response_cache.call_app(middleware, scope, response_cache.replay_body(b'')))
+
+    assert dict(headers)[b'content-encoding'] == encoding
+    assert dict(headers)[b'content-length'] == str(len(body)).encode()
+    next_url = urlsplit(links(json.loads(decompress(body)))['next']['href'])
+    assert parse_qs(next_url.query) == {
+        'collections': ['glo-30-hand'],
+        'bbox': ['5.2,0.2,5.8,0.8'],
+        'token': ['next:abc'],
+    }